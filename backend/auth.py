@@ -1,62 +1,314 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from database import SessionLocal
-from models import User
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, upsert_insert
+from models import User, RevokedToken
+
+logger = logging.getLogger(__name__)
 
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 дней
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Кэш аутентифицированных пользователей: get_current_user не ходит в БД на каждый запрос
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# Доверять подписанным claims без проверки пользователя в БД
+AUTH_TRUST_CLAIMS = os.getenv("AUTH_TRUST_CLAIMS", "0") == "1"
+# Как часто воркер перечитывает список отозванных токенов, секунды
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", "30"))
+
+# bcrypt выполняется в отдельном пуле, чтобы всплеск логинов не занимал общий threadpool
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", "64"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+
+class PasswordHasher:
+    """Ограниченный пул для bcrypt со своей очередью и счётчиками.
+
+    Когда в пуле и очереди уже workers + queue_limit задач, новые запросы
+    сразу получают 503, а не копятся бесконечно.
+    """
+
+    def __init__(self, workers: int, queue_limit: int):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    async def run(self, fn, *args):
+        if self.in_flight >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many authentication requests",
+                headers={"Retry-After": "1"},
+            )
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_seconds += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "total_seconds": self.total_seconds,
+        }
+
+
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_LIMIT)
+
+def _checkpw(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
-def get_password_hash(password: str) -> str:
+def _hashpw(password: str) -> str:
     salt = bcrypt.gensalt()
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(_checkpw, plain_password, hashed_password)
+
+async def get_password_hash(password: str) -> str:
+    return await password_hasher.run(_hashpw, password)
+
+@dataclass(frozen=True)
+class Principal:
+    """Аутентифицированный пользователь запроса — без привязки к сессии БД."""
+    id: int
+    email: str = None
+
+
+class UserCache:
+    """TTL + LRU кэш Principal по user_id со счётчиками попаданий."""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # user_id -> (Principal, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int):
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is None or item[1] < time.monotonic():
+                self.misses += 1
+                return None
+            self._items.move_to_end(user_id)
+            self.hits += 1
+            return item[0]
+
+    def put(self, principal: Principal):
+        with self._lock:
+            self._items[principal.id] = (principal, time.monotonic() + self.ttl)
+            self._items.move_to_end(principal.id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """Вызывать при любом изменении или удалении пользователя."""
+        with self._lock:
+            self._items.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+class RevocationList:
+    """Отозванные jti. Источник истины — таблица revoked_tokens, каждый воркер
+    держит её копию в памяти и перечитывает раз в REVOCATION_REFRESH_SECONDS.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._revoked = {}  # jti -> expires_at
+        self._loaded_at = None
+
+    def is_revoked(self, jti: str) -> bool:
+        return jti in self._revoked
+
+    def needs_refresh(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds
+
+    async def refresh(self, db: AsyncSession):
+        rows = await db.execute(select(RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.expires_at > datetime.utcnow()
+        ))
+        self._revoked = dict(rows.all())
+        self._loaded_at = time.monotonic()
+
+    async def revoke(self, db: AsyncSession, jti: str, expires_at: datetime) -> bool:
+        """Добавляет запись в сессию; в память — через remember() после commit.
+
+        False — токен уже отозван (в том числе параллельным запросом).
+        """
+        if not jti or jti in self._revoked:
+            return False
+        inserted = await db.execute(upsert_insert(db, RevokedToken).values(
+            jti=jti, expires_at=expires_at
+        ).on_conflict_do_nothing(index_elements=["jti"]))
+        if inserted.rowcount == 0:
+            return False
+        # Истёкшие записи больше не нужны: токены с ними и так не пройдут проверку exp
+        await db.execute(delete(RevokedToken).filter(RevokedToken.expires_at <= datetime.utcnow()))
+        return True
+
+    def remember(self, jti: str, expires_at: datetime):
+        self._revoked[jti] = expires_at
+
+
+user_cache = UserCache(AUTH_CACHE_TTL_SECONDS, AUTH_CACHE_SIZE)
+revocations = RevocationList(REVOCATION_REFRESH_SECONDS)
+
+def _create_token(user: User, token_type: str, expires_delta: timedelta):
+    now = datetime.utcnow()
+    to_encode = {
+        "sub": str(user.id),
+        "email": user.email,
+        "type": token_type,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + expires_delta,
+    }
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def create_tokens(user: User) -> dict:
+    return {
+        "access_token": _create_token(user, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)),
+        "refresh_token": _create_token(user, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)),
+        "token_type": "bearer",
+    }
+
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str, token_type: str = "access") -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str = payload.get("sub")
         if user_id_str is None:
-            raise credentials_exception
-        
+            raise _credentials_exception()
+
         # Преобразуем строку в int
-        user_id = int(user_id_str)
+        payload["user_id"] = int(user_id_str)
     except (JWTError, ValueError, TypeError) as e:
-        print(f"JWT Error: {e}")
-        raise credentials_exception
-    except Exception as e:
-        print(f"Token validation error: {e}")
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.id == user_id).first()
+        logger.info("JWT error: %s", e)
+        raise _credentials_exception()
+
+    # Токены, выданные до появления refresh, не содержат type и считаются access
+    if payload.get("type", "access") != token_type:
+        raise _credentials_exception()
+    if revocations.is_revoked(payload.get("jti")):
+        raise _credentials_exception()
+    return payload
+
+async def get_user_by_token(token: str) -> Principal:
+    if revocations.needs_refresh():
+        async with AsyncSessionLocal() as db:
+            await revocations.refresh(db)
+    payload = decode_token(token)
+    user_id = payload["user_id"]
+
+    if AUTH_TRUST_CLAIMS:
+        return Principal(id=user_id, email=payload.get("email"))
+
+    principal = user_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    # Сессия БД открывается только при промахе кэша
+    async with AsyncSessionLocal() as db:
+        user = await db.get(User, user_id)
     if user is None:
-        print(f"User with id {user_id} not found in database")
-        raise credentials_exception
-    return user
+        logger.warning("User with id %s not found in database", user_id)
+        raise _credentials_exception()
+    principal = Principal(id=user.id, email=user.email)
+    user_cache.put(principal)
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    return await get_user_by_token(token)
+
+async def rotate_refresh_token(db: AsyncSession, refresh_token: str) -> dict:
+    """Обменивает refresh-токен на новую пару; старый refresh-токен отзывается."""
+    payload = decode_token(refresh_token, "refresh")
+    # Другой воркер мог отозвать токен после нашей последней синхронизации списка
+    if await db.get(RevokedToken, payload["jti"]):
+        raise _credentials_exception()
+    user = await db.get(User, payload["user_id"])
+    if user is None:
+        raise _credentials_exception()
+    expires_at = datetime.utcfromtimestamp(payload["exp"])
+    if not await revocations.revoke(db, payload["jti"], expires_at):
+        # Тот же refresh-токен параллельно уже обменяли
+        await db.rollback()
+        raise _credentials_exception()
+    await db.commit()
+    revocations.remember(payload["jti"], expires_at)
+    return create_tokens(user)
+
+async def revoke_tokens(db: AsyncSession, access_token: str, refresh_token: str = None):
+    payload = decode_token(access_token)
+    revoked = [(payload.get("jti"), datetime.utcfromtimestamp(payload["exp"]))]
+    if refresh_token:
+        refresh_payload = decode_token(refresh_token, "refresh")
+        if refresh_payload["user_id"] != payload["user_id"]:
+            raise _credentials_exception()
+        revoked.append((refresh_payload["jti"], datetime.utcfromtimestamp(refresh_payload["exp"])))
+    # Уже отозванный токен (повторный или параллельный logout) — не ошибка
+    for jti, expires_at in revoked:
+        await revocations.revoke(db, jti, expires_at)
+    await db.commit()
+    # Память обновляется только после commit: при ошибке записи токен не должен
+    # считаться отозванным в одном воркере и действующим в остальных
+    for jti, expires_at in revoked:
+        if jti:
+            revocations.remember(jti, expires_at)
+    user_cache.invalidate(payload["user_id"])
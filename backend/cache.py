@@ -0,0 +1,246 @@
+"""Кэш ответов читающих эндпоинтов.
+
+Значения хранятся в бэкенде по ключу из имени эндпоинта, параметров и, где
+ответ зависит от пользователя, его id. Инвалидация — по тегам: каждый тег
+имеет счётчик поколения, и номер поколения входит в ключ. Пишущий обработчик
+увеличивает поколение тега (cache.invalidate("comments:5")), и все записи
+с этим тегом перестают находиться; старые записи вытесняются LRU или TTL.
+
+Бэкенды:
+    LocalLRUBackend      — в памяти процесса (по умолчанию; годится только
+                           для одного воркера — инвалидация не выходит за процесс);
+    MemorySharedBackend  — заменитель общего кэша для тестов: значения
+                           сериализуются, как при хранении в Redis;
+    RedisBackend         — общий кэш для нескольких воркеров (нужен пакет redis).
+
+Одновременные промахи по одному ключу в процессе ждут одну загрузку.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.encoders import jsonable_encoder
+
+CACHE_URL = os.getenv("CACHE_URL", "")
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "10000"))
+# TTL — только страховка, актуальность обеспечивает инвалидация
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+# Сколько счётчиков поколений держит локальный бэкенд
+CACHE_GENERATIONS_SIZE = int(os.getenv("CACHE_GENERATIONS_SIZE", "100000"))
+# Тот же WEB_CONCURRENCY, что у gunicorn (serve.py)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class CacheBackend:
+    async def get(self, key: str):
+        """Значение или MISSING."""
+        raise NotImplementedError
+
+    async def set(self, key: str, value, ttl: float):
+        raise NotImplementedError
+
+    async def generation(self, tag: str) -> int:
+        raise NotImplementedError
+
+    async def bump(self, tag: str) -> int:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LocalLRUBackend(CacheBackend):
+    """LRU в памяти процесса.
+
+    Поколения тегов хранятся отдельно от записей и тоже ограничены
+    (max_generations, вытесняется давно не увеличенный тег). Номера поколений
+    берутся из одного растущего счётчика, а тег без счётчика получает номер
+    не меньше любого вытесненного: вытеснение не может вернуть тегу номер,
+    под которым лежат устаревшие записи, — в худшем случае его записи
+    перестают находиться.
+    """
+
+    def __init__(self, max_size: int = CACHE_SIZE, max_generations: int = CACHE_GENERATIONS_SIZE):
+        self.max_size = max_size
+        self.max_generations = max_generations
+        self._items = OrderedDict()  # key -> (value, expires_at)
+        self._generations = OrderedDict()  # tag -> поколение, в порядке увеличения
+        self._last_generation = 0
+        self._evicted_generation = 0
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return MISSING
+            if item[1] < time.monotonic():
+                del self._items[key]
+                return MISSING
+            self._items.move_to_end(key)
+            return item[0]
+
+    async def set(self, key, value, ttl):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    async def generation(self, tag):
+        with self._lock:
+            return self._generations.get(tag, self._evicted_generation)
+
+    async def bump(self, tag):
+        with self._lock:
+            self._last_generation += 1
+            self._generations[tag] = self._last_generation
+            self._generations.move_to_end(tag)
+            while len(self._generations) > self.max_generations:
+                _, evicted = self._generations.popitem(last=False)
+                self._evicted_generation = max(self._evicted_generation, evicted)
+            return self._last_generation
+
+    def stats(self):
+        return {"size": len(self._items), "max_size": self.max_size, "generations": len(self._generations)}
+
+
+class MemorySharedBackend(CacheBackend):
+    """Заменитель общего кэша: один словарь на все экземпляры с общим store,
+    значения хранятся сериализованными."""
+
+    def __init__(self, store: dict = None):
+        self.store = {} if store is None else store
+
+    async def get(self, key):
+        item = self.store.get(key)
+        if item is None or item[1] < time.monotonic():
+            return MISSING
+        return json.loads(item[0])
+
+    async def set(self, key, value, ttl):
+        self.store[key] = (json.dumps(value), time.monotonic() + ttl)
+
+    async def generation(self, tag):
+        return int(self.store.get("gen:" + tag, 0))
+
+    async def bump(self, tag):
+        value = int(self.store.get("gen:" + tag, 0)) + 1
+        self.store["gen:" + tag] = value
+        return value
+
+    def stats(self):
+        return {"size": len(self.store)}
+
+
+class RedisBackend(CacheBackend):
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_URL=redis://... requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+
+    async def get(self, key):
+        value = await self._redis.get(key)
+        return MISSING if value is None else json.loads(value)
+
+    async def set(self, key, value, ttl):
+        await self._redis.set(key, json.dumps(value), ex=max(1, int(ttl)))
+
+    async def generation(self, tag):
+        return int(await self._redis.get("gen:" + tag) or 0)
+
+    async def bump(self, tag):
+        # Счётчики без TTL: при политике volatile-* Redis их не вытесняет
+        return await self._redis.incr("gen:" + tag)
+
+
+class Cache:
+    def __init__(self, backend: CacheBackend, ttl: float = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self._inflight = {}  # key -> asyncio.Future
+        self._counters = {}  # имя -> [hits, misses, waits]
+
+    async def _key(self, name: str, params: dict, tags) -> tuple:
+        generations = [await self.backend.generation(tag) for tag in tags]
+        raw = json.dumps([params, generations], sort_keys=True, separators=(",", ":"), default=str)
+        return f"{name}:{raw}", generations
+
+    def _count(self, name: str, index: int):
+        self._counters.setdefault(name, [0, 0, 0])[index] += 1
+
+    async def get_or_load(self, name: str, params: dict, loader, tags=()):
+        """Значение из кэша или результат await loader().
+
+        Значение приводится к JSON-совместимому виду (jsonable_encoder), чтобы
+        все бэкенды отдавали одно и то же. Изменять его нельзя: его получают
+        и другие запросы.
+        """
+        key, generations = await self._key(name, params, tags)
+        value = await self.backend.get(key)
+        if value is not MISSING:
+            self._count(name, 0)
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._count(name, 2)
+            return await asyncio.shield(inflight)
+
+        self._count(name, 1)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = jsonable_encoder(await loader())
+            # Если тег инвалидировали во время загрузки, результат мог устареть — не сохраняем
+            if [await self.backend.generation(tag) for tag in tags] == generations:
+                await self.backend.set(key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Помечаем исключение прочитанным, если ждущих не было
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, *tags: str):
+        for tag in tags:
+            await self.backend.bump(tag)
+
+    def stats(self) -> dict:
+        endpoints = {}
+        for name, (hits, misses, waits) in self._counters.items():
+            lookups = hits + misses + waits
+            endpoints[name] = {
+                "hits": hits, "misses": misses, "stampede_waits": waits,
+                "hit_rate": round((hits + waits) / lookups, 4) if lookups else 0.0,
+            }
+        return {"backend": self.backend.stats(), "endpoints": endpoints}
+
+
+def make_backend(url: str, workers: int = WEB_CONCURRENCY) -> CacheBackend:
+    if not url:
+        if workers > 1:
+            logger.warning("CACHE_URL is empty with %d workers: each worker keeps its own cache and "
+                           "invalidations do not reach the others; set CACHE_URL=redis://...", workers)
+        return LocalLRUBackend(CACHE_SIZE)
+    if url == "memory://":
+        return MemorySharedBackend()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported CACHE_URL: {url}")
+
+
+cache = Cache(make_backend(CACHE_URL))
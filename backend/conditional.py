@@ -0,0 +1,23 @@
+"""Conditional GET: ETag по содержимому ответа и 304 на совпадающий If-None-Match."""
+import hashlib
+import json
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def etag_for(payload) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+
+
+def conditional_json(request: Request, payload, headers: dict = None) -> Response:
+    payload = jsonable_encoder(payload)
+    headers = dict(headers or {})
+    headers["ETag"] = etag_for(payload)
+    if_none_match = request.headers.get("if-none-match", "")
+    # Прокси со сжатием ослабляют ETag до W/"...", сравниваем без префикса
+    if headers["ETag"] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
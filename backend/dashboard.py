@@ -0,0 +1,83 @@
+"""Сводка пользователя для стартового экрана: GET /me/dashboard.
+
+Треки пользователя, открытые задания в них, очередь ревью и активные
+уведомления собираются четырьмя запросами по всем трекам сразу — число
+запросов не зависит от того, во скольких треках пользователь участвует.
+Открытые задания считаются так же, как в GET /tracks/{id}/assignments
+(progress.unlocked), но без кэша progress: один общий запрос дешевле,
+чем поход в кэш по каждому треку.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from models import Track, TrackParticipant, Assignment, Submission, ReviewAllocation
+import notifications
+from progress import reviewed_by, unlocked
+
+
+def tracks_query(user_id: int):
+    return select(
+        Track.id, Track.title, Track.description, Track.quota, Track.started_at, Track.participant_count,
+        TrackParticipant.joined_at
+    ).join(TrackParticipant, TrackParticipant.track_id == Track.id).filter(
+        TrackParticipant.user_id == user_id
+    ).order_by(Track.id)
+
+
+def progress_query(user_id: int):
+    """Как progress.progress_query, но по всем начатым трекам пользователя."""
+    own = aliased(Submission)
+    return select(
+        Assignment, own.id, reviewed_by(user_id, Assignment.id).label("reviewed")
+    ).join(TrackParticipant, and_(
+        TrackParticipant.track_id == Assignment.track_id,
+        TrackParticipant.user_id == user_id
+    )).join(Track, Track.id == Assignment.track_id).outerjoin(own, and_(
+        own.assignment_id == Assignment.id,
+        own.user_id == user_id
+    )).filter(Track.started_at.isnot(None)).order_by(Assignment.track_id, Assignment.order, Assignment.id)
+
+
+def pending_reviews_query(user_id: int):
+    # Индекс (reviewer_id, submission_id) из UniqueConstraint ReviewAllocation
+    return select(
+        Assignment.id, Assignment.track_id, Assignment.title, func.count(ReviewAllocation.id).label("pending")
+    ).join(ReviewAllocation, ReviewAllocation.assignment_id == Assignment.id).filter(
+        ReviewAllocation.reviewer_id == user_id,
+        ReviewAllocation.completed_at.is_(None)
+    ).group_by(Assignment.id, Assignment.track_id, Assignment.title).order_by(Assignment.id)
+
+
+async def load(db: AsyncSession, user_id: int, now: datetime = None) -> dict:
+    tracks = [dict(row._mapping) for row in await db.execute(tracks_query(user_id))]
+
+    progress = {}
+    seen = set()
+    for assn, submission_id, reviewed in await db.execute(progress_query(user_id)):
+        if assn.id in seen:
+            continue
+        seen.add(assn.id)
+        progress.setdefault(assn.track_id, []).append({
+            "id": assn.id,
+            "title": assn.title,
+            "description": assn.description,
+            "deadline_days": assn.deadline_days,
+            "order": assn.order,
+            "submitted": submission_id is not None,
+            "reviewed": bool(reviewed),
+        })
+    for track in tracks:
+        track["assignments"] = unlocked(progress.get(track["id"], []))
+
+    pending_reviews = [
+        {"assignment_id": row.id, "track_id": row.track_id, "title": row.title, "pending": row.pending}
+        for row in await db.execute(pending_reviews_query(user_id))
+    ]
+    return {
+        "tracks": tracks,
+        "pending_reviews": pending_reviews,
+        "notifications": await notifications.get_active(db, user_id, now=now),
+    }
@@ -1,9 +1,148 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import MetaData, create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./app.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Настройки БД берутся из окружения; по умолчанию — локальный SQLite
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))  # секунды ожидания соединения из пула
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Асинхронные драйверы для синхронных URL из DATABASE_URL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def _engine_options(url) -> dict:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return {
+            "connect_args": {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+            "pool_pre_ping": True,
+        }
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() == "postgresql":
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL: читатели не блокируют писателя; busy_timeout вместо мгновенного "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def upsert_insert(db, table):
+    """insert() с поддержкой ON CONFLICT для диалекта сессии (SQLite, PostgreSQL)."""
+    dialect = db.bind.dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects import postgresql
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        from sqlalchemy.dialects import sqlite
+        return sqlite.insert(table)
+    raise NotImplementedError(f"ON CONFLICT is not supported for {dialect}")
+
+
+def make_engine(url):
+    engine = create_engine(url, **_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+def make_async_engine(url):
+    engine = create_async_engine(url, **_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return engine
+
+
+# Движки создаются при первом обращении, а не при импорте: мастер-процесс gunicorn
+# с preload импортирует приложение до fork и не должен открывать соединений
+_engine = None
+_async_engine = None
+
+
+def get_engine():
+    """Синхронный движок — только для миграций Alembic и служебных скриптов."""
+    global _engine
+    if _engine is None:
+        _engine = make_engine(SQLALCHEMY_DATABASE_URL)
+    return _engine
+
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = make_async_engine(async_url(SQLALCHEMY_DATABASE_URL))
+        AsyncSessionLocal.configure(bind=_async_engine)
+    return _async_engine
+
+
+async def dispose_engines():
+    global _engine, _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        AsyncSessionLocal.configure(bind=None)
+    if _engine is not None:
+        _engine.dispose()
+    _engine = _async_engine = None
+
+
+def _reset_after_fork():
+    # Соединения пула, открытые до fork, принадлежат родителю — в дочернем процессе пул начинается пустым
+    for created in (_engine, _async_engine and _async_engine.sync_engine):
+        if created is not None:
+            created.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    def __call__(self, **local_kw):
+        if self.kw.get("bind") is None:
+            get_async_engine()
+        return super().__call__(**local_kw)
+
+
+# Привязывается к async-движку при создании первой сессии.
+# expire_on_commit=False: после commit атрибуты остаются доступны без ленивой подгрузки
+AsyncSessionLocal = _LazyAsyncSessionmaker(autoflush=False, expire_on_commit=False)
 
+# Явные имена ограничений нужны миграциям: в SQLite их меняют через batch-режим
+NAMING_CONVENTION = {
+    "ix": "ix_%(column_0_label)s",
+    "uq": "uq_%(table_name)s_%(column_0_N_name)s",
+    "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
+    "pk": "pk_%(table_name)s",
+}
+Base = declarative_base(metadata=MetaData(naming_convention=NAMING_CONVENTION))
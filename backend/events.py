@@ -0,0 +1,223 @@
+"""In-process pub/sub для push-уведомлений.
+
+Обработчики публикуют события после commit через hub.publish(); подписчики
+(SSE-соединения) получают их из asyncio.Queue. Брокер может доставлять
+сообщения из своего потока, поэтому в event loop они попадают через
+call_soon_threadsafe.
+
+Несколько воркеров uvicorn делят события через Broker: hub.publish() отдаёт
+сообщение брокеру, брокер доставляет его хабу каждого воркера. Брокер
+выбирается по EVENTS_URL:
+    ""          — LocalBroker, только этот процесс;
+    redis://... — RedisBroker, канал Redis pub/sub (нужен пакет redis).
+
+Хаб запускает брокер в start() из lifespan воркера, а не при импорте:
+потоки брокера не переживают fork.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+EVENTS_URL = os.getenv("EVENTS_URL", "")
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "notifications")
+
+
+class Broker:
+    """Транспорт событий между воркерами."""
+
+    def start(self, deliver: Callable[[dict], None]):
+        """deliver вызывается для каждого сообщения, пришедшего в этот воркер."""
+        raise NotImplementedError
+
+    def publish(self, message: dict):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+
+class LocalBroker(Broker):
+    """Брокер для одного процесса (и для тестов): сообщение сразу доставляется."""
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message):
+        if self._deliver:
+            self._deliver(message)
+
+    def stop(self):
+        self._deliver = None
+
+
+class RedisBroker(Broker):
+    """Канал Redis pub/sub: событие получают хабы всех воркеров, включая отправителя.
+
+    Подписка читается в своём потоке; публикация тоже идёт из отдельного
+    потока через очередь, чтобы сетевой вызов не держал event loop. Пока
+    Redis недоступен, события теряются — клиенты перечитают данные при
+    переподключении.
+    """
+
+    def __init__(self, url: str, channel: str = EVENTS_CHANNEL):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("EVENTS_URL=redis://... requires the 'redis' package")
+        self._redis = redis
+        self.url = url
+        self.channel = channel
+        self._client = None
+        self._outbox = None
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self, deliver):
+        self._client = self._redis.Redis.from_url(self.url)
+        self._outbox = queue.SimpleQueue()
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._listen, args=(deliver,), name="events-listen", daemon=True),
+            threading.Thread(target=self._send, name="events-publish", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _listen(self, deliver):
+        pubsub = None
+        while not self._stopping.is_set():
+            try:
+                if pubsub is None:
+                    pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                message = pubsub.get_message(timeout=1.0)
+                if message is not None:
+                    deliver(json.loads(message["data"]))
+            except self._redis.RedisError as e:
+                logger.warning("Event broker subscription failed, reconnecting: %r", e)
+                if pubsub is not None:
+                    pubsub.close()
+                pubsub = None
+                self._stopping.wait(1)
+        if pubsub is not None:
+            pubsub.close()
+
+    def _send(self):
+        while True:
+            message = self._outbox.get()
+            if message is None:
+                return
+            try:
+                self._client.publish(self.channel, json.dumps(message))
+            except self._redis.RedisError as e:
+                logger.warning("Event lost, broker unavailable: %r", e)
+
+    def publish(self, message):
+        if self._outbox is not None:
+            self._outbox.put(message)
+
+    def stop(self):
+        self._stopping.set()
+        if self._outbox is not None:
+            self._outbox.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._threads = []
+        self._outbox = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+def make_broker(url: str) -> Broker:
+    if not url:
+        return LocalBroker()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBroker(url)
+    raise ValueError(f"Unsupported EVENTS_URL: {url}")
+
+
+class Hub:
+    def __init__(self, broker: Broker = None, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)  # user_id -> {asyncio.Queue}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._broker = broker or LocalBroker()
+        self._started = False
+
+    @property
+    def shared(self) -> bool:
+        """События доходят до подписчиков других процессов."""
+        return not isinstance(self._broker, LocalBroker)
+
+    def start(self):
+        if not self._started:
+            self._broker.start(self._deliver)
+            self._started = True
+
+    def stop(self):
+        if self._started:
+            self._broker.stop()
+            self._started = False
+
+    def set_broker(self, broker: Broker):
+        started = self._started
+        self.stop()
+        self._broker = broker
+        if started:
+            self.start()
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    async def subscribe(self, user_id: int) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues is None:
+                return
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_ids: Iterable[int], event: dict):
+        """Вызывать только после commit, иначе клиент перечитает старые данные."""
+        self._broker.publish({"user_ids": list(user_ids), "event": event})
+
+    def _deliver(self, message: dict):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message: dict):
+        event = message["event"]
+        with self._lock:
+            queues = [q for uid in message["user_ids"] for q in self._subscribers.get(uid, ())]
+        for subscriber in queues:
+            try:
+                subscriber.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: событие теряется, клиент перечитает данные при следующем подключении
+                pass
+
+
+hub = Hub(make_broker(EVENTS_URL))
@@ -0,0 +1,104 @@
+"""Проверка планов запросов горячих путей.
+
+Для каждого запроса печатает план и завершается с кодом 1, если хоть один
+из них читает таблицу целиком, а не по индексу. Запускать после миграций:
+    python explain_check.py
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import or_, select, text
+
+import dashboard
+from database import get_engine
+from models import TrackParticipant, Assignment, Submission, Review, Comment, Notification, ScheduledJob
+from progress import progress_query, reviewed_by
+from repo_check import sweep_query
+from review_queue import least_reviewed_query, queue_query
+from scores import leaderboard_query, rank_query
+
+engine = get_engine()
+
+NOW = datetime(2024, 1, 1)
+
+HOT_QUERIES = {
+    "участник трека": select(TrackParticipant.id).filter(
+        TrackParticipant.track_id == 1, TrackParticipant.user_id == 1
+    ),
+    "участники пользователя": select(TrackParticipant.track_id).filter(TrackParticipant.user_id == 1),
+    "задания трека": select(Assignment.id).filter(Assignment.track_id == 1).order_by(
+        Assignment.order, Assignment.id
+    ),
+    "решение пользователя": select(Submission.id).filter(
+        Submission.assignment_id == 1, Submission.user_id == 1
+    ),
+    "ревью решения": select(Review.id).filter(Review.submission_id == 1, Review.reviewer_id == 1),
+    "ревью пользователя по заданию": select(reviewed_by(1, 1)),
+    "прогресс по треку": progress_query(1, 1),
+    "треки пользователя": dashboard.tracks_query(1),
+    "прогресс по всем трекам": dashboard.progress_query(1),
+    "очередь ревью пользователя": dashboard.pending_reviews_query(1),
+    "очередь ревью": queue_query(1, 1),
+    "наименее проверенное решение": least_reviewed_query(1, 1),
+    "лидерборд трека": leaderboard_query(1, 10),
+    "место в лидерборде": rank_query(1, 1, 4.5, 3),
+    "комментарии задания": select(Comment.id).filter(Comment.assignment_id == 1, Comment.id > 1).order_by(
+        Comment.id
+    ).limit(100),
+    "созревшие задачи планировщика": select(ScheduledJob.id).filter(
+        ScheduledJob.due_at <= NOW,
+        or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < NOW)
+    ).order_by(ScheduledJob.due_at).limit(100),
+    "непроверенные ссылки решений": sweep_query(NOW, 500),
+    "активные уведомления": select(Notification.id).filter(
+        Notification.user_id == 1,
+        Notification.available_at <= NOW,
+        or_(Notification.expires_at.is_(None), Notification.expires_at > NOW)
+    ),
+}
+
+
+def _compile(query) -> str:
+    return str(query.compile(engine, compile_kwargs={"literal_binds": True}))
+
+
+def explain(conn, query) -> list:
+    sql = _compile(query)
+    if engine.dialect.name == "sqlite":
+        return [row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+    return [row[0] for row in conn.execute(text(f"EXPLAIN {sql}"))]
+
+
+def is_full_scan(line: str) -> bool:
+    if engine.dialect.name == "sqlite":
+        # "SCAN t USING INDEX ..." — обход индекса, "SCAN t" — обход таблицы
+        return line.startswith("SCAN ") and " USING " not in line and line != "SCAN CONSTANT ROW"
+    return "Seq Scan" in line
+
+
+def prepare(conn):
+    if engine.dialect.name == "postgresql":
+        # На пустых таблицах планировщик и так выберет Seq Scan
+        conn.execute(text("SET enable_seqscan = off"))
+
+
+def main() -> int:
+    failed = []
+    with engine.connect() as conn:
+        prepare(conn)
+        for name, query in HOT_QUERIES.items():
+            plan = explain(conn, query)
+            bad = any(is_full_scan(line) for line in plan)
+            print(f"{'FAIL' if bad else 'ok  '} {name}")
+            for line in plan:
+                print(f"       {line}")
+            if bad:
+                failed.append(name)
+    if failed:
+        print(f"Full table scans: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
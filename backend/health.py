@@ -0,0 +1,79 @@
+"""Готовность воркера и плавная остановка.
+
+/health/live отвечает, пока жив event loop, и не трогает БД: сбой базы не
+должен приводить к перезапуску воркеров. /health/ready — 200, только если
+lifespan завершил старт, воркер не останавливается и БД отвечает на
+SELECT 1 за READY_TIMEOUT_SECONDS.
+
+Остановка (SIGTERM от gunicorn или оркестратора): воркер сразу становится
+not ready, чтобы балансировщик перестал слать ему запросы, но ещё
+DRAIN_SECONDS принимает их. Затем сигнал передаётся серверу (uvicorn):
+он перестаёт принимать соединения, дожидается текущих запросов и
+выполняет shutdown в lifespan. Повторный SIGTERM останавливает сразу.
+"""
+import asyncio
+import logging
+import os
+import signal
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SECONDS = float(os.getenv("DRAIN_SECONDS", "5"))
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "2"))
+
+
+async def _ping(engine):
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+class Lifecycle:
+    def __init__(self, drain_seconds: float = DRAIN_SECONDS):
+        self.drain_seconds = drain_seconds
+        self.started = False
+        self.draining = False
+
+    def install_drain_handler(self, loop: asyncio.AbstractEventLoop):
+        """Перехватывает SIGTERM сервера; вызывать из lifespan, когда сервер уже поставил свой обработчик."""
+        try:
+            previous = signal.getsignal(signal.SIGTERM)
+        except ValueError:
+            return
+        if not callable(previous):
+            # Сервер сигнал не обрабатывает — задерживать нечего
+            return
+
+        def on_sigterm(signum, frame):
+            if self.draining:
+                previous(signum, frame)
+                return
+            self.draining = True
+            logger.info("SIGTERM: draining for %.0f s before shutdown", self.drain_seconds)
+            loop.call_soon_threadsafe(loop.call_later, self.drain_seconds, previous, signum, frame)
+
+        try:
+            signal.signal(signal.SIGTERM, on_sigterm)
+        except ValueError:
+            # Не главный поток (например, TestClient) — сигналы не наши
+            pass
+
+    def status(self) -> str:
+        if self.draining:
+            return "draining"
+        return "ready" if self.started else "starting"
+
+    async def readiness(self, engine) -> str:
+        """"ready" или причина, по которой воркеру не стоит слать запросы."""
+        if self.status() != "ready":
+            return self.status()
+        try:
+            await asyncio.wait_for(_ping(engine), READY_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning("Readiness check failed: %r", e)
+            return "database unavailable"
+        return "ready"
+
+
+lifecycle = Lifecycle()
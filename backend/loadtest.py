@@ -0,0 +1,837 @@
+"""Нагрузочный прогон API.
+
+Засевает базу синтетическими данными заданного масштаба (пакетными INSERT),
+затем виртуальные пользователи гоняют смешанную нагрузку через ASGI-транспорт
+httpx прямо в приложение: вход, список треков, задания трека, запись,
+отправка решений, получение работ на ревью, комментарии и опрос уведомлений.
+Результат — JSON с пропускной способностью, p50/p95/p99 и числом SQL-запросов
+(из X-Query-Count) по операциям. Данные и последовательность операций
+определяются --seed, поэтому прогоны воспроизводимы.
+
+    python loadtest.py run --scale small --out before.json
+    python loadtest.py run --scale medium --concurrency 50 --database-url postgresql://localhost/loadtest
+    python loadtest.py compare before.json after.json --threshold 0.2
+
+Профиль auth — всплеск входов на фоне чтения; --hash-inline возвращает bcrypt
+в путь обработки запроса, как до выделенного пула хеширования:
+    python loadtest.py run --profile auth --hash-inline --out inline.json
+    python loadtest.py run --profile auth --out pool.json
+
+Отдельные сценарии сравнивают новый путь данных с прежним, воспроизведённым
+здесь же (старого кода в приложении больше нет):
+    python loadtest.py bench notifications     # материализованные уведомления против цикла по заданиям, 10k пользователей
+    python loadtest.py bench tracks            # GET /tracks против COUNT на каждый трек, 50k треков и ~1M участников
+
+SSE-поток проверяется на настоящем сервере (uvicorn в отдельном процессе):
+N простаивающих подключений, память сервера на подключение и задержка
+доставки события всем подписчикам после комментария в их треке:
+    python loadtest.py stream --connections 5000 --rounds 5
+
+По умолчанию база — временный файл SQLite; --database-url должен указывать
+на пустую базу, схема создаётся через create_all.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCALES = {
+    "small": {"users": 200, "tracks": 40, "quota": 10, "assignments": 5, "comments": 5},
+    "medium": {"users": 2000, "tracks": 400, "quota": 10, "assignments": 5, "comments": 5},
+    "large": {"users": 20000, "tracks": 4000, "quota": 10, "assignments": 5, "comments": 5},
+}
+PASSWORD = "loadtest-password"
+INSERT_BATCH = 5000
+REVIEWS_PER_SUBMISSION = 2
+
+# Операция -> вес в смешанной нагрузке
+WORKLOAD = {
+    "login": 3,
+    "browse_tracks": 25,
+    "track_assignments": 15,
+    "join_track": 5,
+    "submit": 10,
+    "review_pull": 10,
+    "comments": 12,
+    "notifications": 20,
+}
+# Всплеск входов на фоне чтения: bcrypt не должен задерживать остальные запросы
+AUTH_WORKLOAD = {
+    "login": 30,
+    "browse_tracks": 30,
+    "track_assignments": 15,
+    "comments": 10,
+    "notifications": 15,
+}
+PROFILES = {"mixed": WORKLOAD, "auth": AUTH_WORKLOAD}
+
+
+class Plan:
+    """Что засеяно: по нему виртуальные пользователи выбирают запросы."""
+
+    def __init__(self):
+        self.emails = {}  # user_id -> email
+        self.open_tracks = []
+        self.started_tracks = {}  # user_id -> [track_id]
+        self.open_assignments = {}  # user_id -> [assignment_id] до дедлайна
+        self.closed_assignments = {}  # user_id -> [assignment_id] после дедлайна
+        self.track_assignments = {}  # track_id -> [assignment_id]
+        self.counts = {}  # таблица -> засеяно строк
+
+
+async def seed(session_factory, scale: dict, rng: random.Random) -> Plan:
+    """Заполняет пустую базу пакетными INSERT и возвращает Plan."""
+    from sqlalchemy import insert, select
+    from auth import _hashpw
+    from models import User, Track, TrackParticipant, Assignment, Submission, Review, Comment
+    import notifications
+    import review_queue
+    import scores
+
+    plan = Plan()
+    now = datetime.utcnow()
+    # Один bcrypt-хэш на всех: засев не должен упираться в хэширование
+    hashed = _hashpw(PASSWORD)
+
+    async def insert_rows(db, model, rows):
+        for i in range(0, len(rows), INSERT_BATCH):
+            await db.execute(insert(model), rows[i:i + INSERT_BATCH])
+
+    async with session_factory() as db:
+        if await db.scalar(select(User.id).limit(1)) is not None:
+            raise SystemExit("Database is not empty; loadtest needs an empty database")
+
+        users = [{"id": i, "email": f"user{i}@loadtest.example.com", "hashed_password": hashed}
+                 for i in range(1, scale["users"] + 1)]
+        plan.emails = {u["id"]: u["email"] for u in users}
+        await insert_rows(db, User, users)
+
+        tracks, participants, assignments = [], [], []
+        submissions, reviews, comments = [], [], []
+        closed = []
+        assignment_id = submission_id = 0
+        for track_id in range(1, scale["tracks"] + 1):
+            # Четверть треков ещё набирает участников, остальные идут 0..30 дней
+            started = rng.random() >= 0.25
+            members = rng.sample(range(1, scale["users"] + 1),
+                                 scale["quota"] if started else rng.randint(0, scale["quota"] - 1))
+            started_at = now - timedelta(days=rng.uniform(0, 30)) if started else None
+            tracks.append({"id": track_id, "title": f"Track {track_id}", "description": "Synthetic track",
+                           "quota": scale["quota"], "criteria": "code quality", "created_at": now - timedelta(days=40),
+                           "started_at": started_at, "participant_count": len(members)})
+            participants += [{"track_id": track_id, "user_id": u, "joined_at": now - timedelta(days=35)} for u in members]
+            if not started:
+                plan.open_tracks.append(track_id)
+            for u in members if started else ():
+                plan.started_tracks.setdefault(u, []).append(track_id)
+
+            plan.track_assignments[track_id] = []
+            for order in range(1, scale["assignments"] + 1):
+                assignment_id += 1
+                deadline_days = 7 * order
+                deadline_at = started_at + timedelta(days=deadline_days) if started else None
+                assignments.append({"id": assignment_id, "track_id": track_id, "title": f"Task {order}",
+                                    "description": "Synthetic assignment", "deadline_days": deadline_days,
+                                    "order": order, "deadline_at": deadline_at})
+                plan.track_assignments[track_id].append(assignment_id)
+                if not started:
+                    continue
+                passed = deadline_at < now
+                authors = [u for u in members if rng.random() < (0.9 if passed else 0.5)]
+                for u in members:
+                    (plan.closed_assignments if passed else plan.open_assignments).setdefault(u, []).append(assignment_id)
+                own = {}
+                for u in authors:
+                    submission_id += 1
+                    own[u] = submission_id
+                    submissions.append({"id": submission_id, "assignment_id": assignment_id, "user_id": u,
+                                        "repository_url": f"https://example.com/{u}/{assignment_id}", "status": "valid",
+                                        "submitted_at": deadline_at - timedelta(hours=rng.uniform(1, 100))})
+                if passed:
+                    closed.append(assignment_id)
+                    for u, sid in own.items():
+                        for reviewer in rng.sample([a for a in authors if a != u],
+                                                   min(REVIEWS_PER_SUBMISSION, len(authors) - 1)):
+                            reviews.append({"submission_id": sid, "reviewer_id": reviewer, "score": rng.randint(1, 5),
+                                            "comment": "Looks fine", "created_at": deadline_at + timedelta(hours=1)})
+                for _ in range(scale["comments"]):
+                    comments.append({"assignment_id": assignment_id, "user_id": rng.choice(members),
+                                     "text": "Working on it", "created_at": started_at + timedelta(hours=rng.uniform(0, 24 * 7 * order))})
+
+        await insert_rows(db, Track, tracks)
+        await insert_rows(db, TrackParticipant, participants)
+        await insert_rows(db, Assignment, assignments)
+        await insert_rows(db, Submission, submissions)
+        await insert_rows(db, Review, reviews)
+        await insert_rows(db, Comment, comments)
+        await db.commit()
+
+        # Производное состояние — так же, как его строят планировщик и команды пересчёта
+        random.seed(rng.random())
+        for assignment_id in closed:
+            await review_queue.allocate(db, assignment_id, now)
+        await db.commit()
+        await scores.rebuild(db)
+        await notifications.rebuild(db)
+
+    plan.counts = {"users": len(users), "tracks": len(tracks), "participants": len(participants),
+                   "assignments": len(assignments), "submissions": len(submissions), "reviews": len(reviews),
+                   "comments": len(comments)}
+    return plan
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize(samples: dict, elapsed: float) -> dict:
+    """samples — {операция: [(секунды, статус, SQL-запросы)]}."""
+    result = {}
+    for op, values in sorted(samples.items()):
+        latencies = sorted(v[0] for v in values)
+        queries = [v[2] for v in values if v[2] is not None]
+        statuses = {}
+        for _, status_code, _ in values:
+            statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+        result[op] = {
+            "requests": len(values),
+            "errors": sum(1 for v in values if v[1] >= 500),
+            "status": statuses,
+            "throughput_rps": round(len(values) / elapsed, 2),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+            "queries_mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "queries_max": max(queries) if queries else None,
+        }
+    return result
+
+
+async def run_workload(app, plan: Plan, workload: dict, concurrency: int, requests_per_user: int,
+                       seed_value: int) -> tuple:
+    import httpx
+
+    samples = {}
+    operations, weights = list(workload), list(workload.values())
+
+    async def virtual_user(client, index: int):
+        rng = random.Random(seed_value * 1000 + index)
+        # Пользователи с начатыми треками — чтобы были задания, решения и ревью
+        active = sorted(plan.started_tracks)
+        user_id = rng.choice(active) if active else rng.choice(list(plan.emails))
+        headers = {}
+        last_notifications = None
+
+        async def request(op, method, url, **kwargs):
+            started = time.perf_counter()
+            response = await client.request(method, url, headers=headers, **kwargs)
+            elapsed = time.perf_counter() - started
+            queries = response.headers.get("x-query-count")
+            samples.setdefault(op, []).append((elapsed, response.status_code, int(queries) if queries else None))
+            return response
+
+        async def login():
+            response = await request("login", "POST", "/token",
+                                     data={"username": plan.emails[user_id], "password": PASSWORD})
+            if response.status_code == 200:
+                headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        await login()
+        for _ in range(requests_per_user):
+            op = rng.choices(operations, weights)[0]
+            tracks = plan.started_tracks.get(user_id) or [None]
+            if op == "login":
+                await login()
+            elif op == "browse_tracks":
+                params = {"limit": 50}
+                if rng.random() < 0.3:
+                    params["status"] = "open"
+                await request(op, "GET", "/tracks", params=params)
+            elif op == "track_assignments" and tracks[0]:
+                await request(op, "GET", f"/tracks/{rng.choice(tracks)}/assignments")
+            elif op == "join_track" and plan.open_tracks:
+                await request(op, "POST", f"/tracks/{rng.choice(plan.open_tracks)}/join")
+            elif op == "submit" and plan.open_assignments.get(user_id):
+                assignment_id = rng.choice(plan.open_assignments[user_id])
+                await request(op, "POST", f"/assignments/{assignment_id}/submit",
+                              json={"repository_url": f"https://example.com/{user_id}/{assignment_id}"})
+            elif op == "review_pull" and plan.closed_assignments.get(user_id):
+                await request(op, "GET", f"/assignments/{rng.choice(plan.closed_assignments[user_id])}/review")
+            elif op == "comments" and tracks[0]:
+                assignment_id = rng.choice(plan.track_assignments[rng.choice(tracks)])
+                await request(op, "GET", f"/assignments/{assignment_id}/comments", params={"limit": 50})
+            elif op == "notifications":
+                params = {"since": last_notifications} if last_notifications else {}
+                response = await request(op, "GET", "/notifications", params=params)
+                if response.status_code == 200 and response.json():
+                    last_notifications = max(n["available_at"] for n in response.json())
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(virtual_user(client, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, elapsed
+
+
+async def _hash_inline(fn, *args):
+    return fn(*args)
+
+
+async def run(args) -> dict:
+    # Окружение приложения задаётся до импорта модулей, которые читают его при импорте
+    from database import Base, dispose_engines, get_async_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    import main
+
+    scale = dict(SCALES[args.scale])
+    for name in scale:
+        if getattr(args, name) is not None:
+            scale[name] = getattr(args, name)
+
+    async_engine = get_async_engine()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    plan = await seed(session_factory, scale, rng)
+    seeded = time.perf_counter() - started
+
+    if args.hash_inline:
+        # Прежнее поведение: bcrypt выполняется там же, где обрабатываются запросы
+        import auth
+        auth.password_hasher.run = _hash_inline
+
+    samples, elapsed = await run_workload(main.app, plan, PROFILES[args.profile], args.concurrency,
+                                          args.requests, args.seed)
+    dialect = async_engine.dialect.name
+    await dispose_engines()
+
+    endpoints = summarize(samples, elapsed)
+    total = sum(e["requests"] for e in endpoints.values())
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "database": dialect,
+            "python": platform.python_version(),
+            "scale": args.scale,
+            "profile": args.profile,
+            "hash_inline": args.hash_inline,
+            "dataset": plan.counts,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests_per_user": args.requests,
+            "seed_seconds": round(seeded, 2),
+        },
+        "total": {
+            "requests": total,
+            "errors": sum(e["errors"] for e in endpoints.values()),
+            "seconds": round(elapsed, 2),
+            "throughput_rps": round(total / elapsed, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+class QueryCounter:
+    """Считает SQL-запросы движка между вызовами reset()."""
+
+    def __init__(self, async_engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(async_engine.sync_engine, "after_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+async def _measure(samples: list, counter: QueryCounter, coro):
+    counter.reset()
+    started = time.perf_counter()
+    result = await coro
+    samples.append((time.perf_counter() - started, 200, counter.count))
+    return result
+
+
+async def legacy_notifications(db, user_id: int, now: datetime) -> list:
+    """GET /notifications до материализации: цикл по трекам и заданиям пользователя с двумя запросами на задание."""
+    from sqlalchemy import select
+    from models import Track, TrackParticipant, Assignment, Submission, Review
+
+    result = []
+    tracks = (await db.scalars(select(Track).join(TrackParticipant).filter(
+        TrackParticipant.user_id == user_id, Track.started_at.isnot(None)
+    ))).all()
+    for track in tracks:
+        assignments = (await db.scalars(select(Assignment).filter(
+            Assignment.track_id == track.id
+        ).order_by(Assignment.order))).all()
+        for assn in assignments:
+            deadline = track.started_at + timedelta(days=assn.deadline_days)
+            days_left = (deadline - now).days
+            if 0 <= days_left <= 2:
+                result.append({"type": "deadline_warning", "assignment_id": assn.id})
+            if now > deadline:
+                submission = await db.scalar(select(Submission).filter(
+                    Submission.assignment_id == assn.id, Submission.user_id == user_id
+                ).limit(1))
+                if submission:
+                    review = await db.scalar(select(Review).filter(
+                        Review.submission_id == submission.id, Review.reviewer_id == user_id
+                    ).limit(1))
+                    if not review:
+                        result.append({"type": "code_review", "assignment_id": assn.id})
+    return result
+
+
+async def bench_notifications(session_factory, counter: QueryCounter, plan: Plan, args) -> dict:
+    import notifications
+
+    rng = random.Random(args.seed)
+    users = sorted(plan.started_tracks)
+    samples = {"legacy_loop": [], "materialized": []}
+    started = time.perf_counter()
+    for user_id in rng.sample(users, min(args.samples, len(users))):
+        now = datetime.utcnow()
+        async with session_factory() as db:
+            await _measure(samples["legacy_loop"], counter, legacy_notifications(db, user_id, now))
+        async with session_factory() as db:
+            await _measure(samples["materialized"], counter, notifications.get_active(db, user_id, now=now))
+    return summarize(samples, time.perf_counter() - started)
+
+
+async def seed_catalogue(session_factory, scale: dict, rng: random.Random) -> Plan:
+    """Только треки и участники: три четверти треков набраны и начаты, остальные набирают."""
+    from sqlalchemy import insert
+    from models import User, Track, TrackParticipant
+
+    plan = Plan()
+    now = datetime.utcnow()
+    users = list(range(1, scale["users"] + 1))
+    async with session_factory() as db:
+        for i in range(0, len(users), INSERT_BATCH):
+            await db.execute(insert(User), [{"id": u, "email": f"user{u}@loadtest.example.com", "hashed_password": "-"}
+                                            for u in users[i:i + INSERT_BATCH]])
+        tracks, participants = [], 0
+        for track_id in range(1, scale["tracks"] + 1):
+            started = rng.random() >= 0.25
+            members = rng.sample(users, scale["quota"] if started else rng.randint(0, scale["quota"] - 1))
+            tracks.append({"id": track_id, "title": f"Track {track_id}", "description": "Synthetic track",
+                           "quota": scale["quota"], "criteria": "", "started_at": now if started else None,
+                           "participant_count": len(members)})
+            rows = [{"track_id": track_id, "user_id": u} for u in members]
+            participants += len(rows)
+            if rows:
+                await db.execute(insert(TrackParticipant), rows)
+            if len(tracks) == INSERT_BATCH:
+                await db.execute(insert(Track), tracks)
+                tracks = []
+        if tracks:
+            await db.execute(insert(Track), tracks)
+        await db.commit()
+    plan.emails = {u: f"user{u}@loadtest.example.com" for u in users}
+    plan.counts = {"users": len(users), "tracks": scale["tracks"], "participants": participants}
+    return plan
+
+
+async def legacy_tracks(db) -> list:
+    """GET /tracks до user-003: все треки и отдельный COUNT участников на каждый."""
+    from sqlalchemy import func, select
+    from models import Track, TrackParticipant
+
+    result = []
+    for track in (await db.scalars(select(Track))).all():
+        count = await db.scalar(select(func.count()).select_from(TrackParticipant).filter(
+            TrackParticipant.track_id == track.id
+        ))
+        result.append({"id": track.id, "title": track.title, "description": track.description,
+                       "quota": track.quota, "started_at": track.started_at, "participant_count": count})
+    return result
+
+
+async def bench_tracks(session_factory, counter: QueryCounter, plan: Plan, args) -> dict:
+    import httpx
+    from auth import create_tokens
+    from cache import cache
+    from models import User
+    from pagination import encode_cursor
+    import main
+
+    rng = random.Random(args.seed)
+    samples = {"legacy_all_tracks": [], "first_page": [], "keyset_page": [], "open_filter": [],
+               "cached_page": [], "not_modified": [], "full_walk": []}
+    token = create_tokens(User(id=1, email=plan.emails[1]))["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    started = time.perf_counter()
+
+    # Прежний путь отдаёт весь каталог одним ответом и стоит tracks + 1 запросов — замеров немного
+    for _ in range(args.legacy_samples):
+        async with session_factory() as db:
+            await _measure(samples["legacy_all_tracks"], counter, legacy_tracks(db))
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=600) as client:
+        async def get(op, params, extra=None):
+            response_started = time.perf_counter()
+            response = await client.get("/tracks", params=params, headers={**headers, **(extra or {})})
+            samples[op].append((time.perf_counter() - response_started, response.status_code,
+                                int(response.headers.get("x-query-count", 0))))
+            return response
+
+        await get("first_page", {"limit": 50})
+        samples["first_page"].clear()
+        for _ in range(args.samples):
+            # Кэш ответа сбрасывается, чтобы мерить запрос к БД
+            await cache.invalidate("tracks")
+            await get("first_page", {"limit": 50})
+            await cache.invalidate("tracks")
+            await get("keyset_page", {"limit": 50, "cursor": encode_cursor(rng.randint(1, plan.counts["tracks"]))})
+            await cache.invalidate("tracks")
+            await get("open_filter", {"limit": 50, "status": "open"})
+            await client.get("/tracks", params={"limit": 50}, headers=headers)
+            response = await get("cached_page", {"limit": 50})
+            await get("not_modified", {"limit": 50}, {"If-None-Match": response.headers["etag"]})
+
+        # Весь каталог постранично — тот же объём данных, что у прежнего ответа
+        await cache.invalidate("tracks")
+        walk_started, walk_queries, cursor = time.perf_counter(), 0, None
+        while True:
+            response = await client.get("/tracks", params={"limit": 200, **({"cursor": cursor} if cursor else {})},
+                                         headers=headers)
+            walk_queries += int(response.headers.get("x-query-count", 0))
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        samples["full_walk"].append((time.perf_counter() - walk_started, 200, walk_queries))
+    return summarize(samples, time.perf_counter() - started)
+
+
+# Сценарий -> (масштаб данных по умолчанию, засев, функция замера)
+BENCHES = {
+    "notifications": ({"users": 10000, "tracks": 2000, "quota": 10, "assignments": 5, "comments": 0},
+                      seed, bench_notifications),
+    "tracks": ({"users": 20000, "tracks": 50000, "quota": 25, "assignments": 0, "comments": 0},
+               seed_catalogue, bench_tracks),
+}
+
+
+async def bench(args) -> dict:
+    from database import Base, dispose_engines, get_async_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    import models  # noqa: F401 — таблицы регистрируются в Base.metadata при импорте
+
+    defaults, seeder, measure = BENCHES[args.scenario]
+    scale = {name: getattr(args, name) if getattr(args, name) is not None else value
+             for name, value in defaults.items()}
+
+    async_engine = get_async_engine()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    started = time.perf_counter()
+    plan = await seeder(session_factory, scale, random.Random(args.seed))
+    seeded = time.perf_counter() - started
+    counter = QueryCounter(async_engine)
+    try:
+        endpoints = await measure(session_factory, counter, plan, args)
+    finally:
+        dialect = async_engine.dialect.name
+        await dispose_engines()
+
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "benchmark": args.scenario,
+            "database": dialect,
+            "python": platform.python_version(),
+            "dataset": plan.counts,
+            "seed": args.seed,
+            "seed_seconds": round(seeded, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+async def _http(port: int, method: str, path: str, headers: dict = None, body: bytes = b"") -> int:
+    """Один запрос HTTP/1.1 с Connection: close; возвращает статус."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: loadtest\r\nConnection: close\r\n{head}"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    status_line = await reader.readline()
+    writer.close()
+    return int(status_line.split()[1])
+
+
+async def _wait_server(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await _http(port, "GET", "/health/live") == 200:
+                return
+        except (OSError, IndexError, ValueError):
+            pass
+        await asyncio.sleep(0.1)
+    raise SystemExit("Server did not start")
+
+
+class StreamClient:
+    """Простаивающее SSE-подключение; запоминает, когда пришло каждое событие comment."""
+
+    def __init__(self):
+        self.ready = asyncio.Event()
+        self.received = []  # monotonic-время прихода событий
+        self.writer = None
+
+    async def run(self, port: int, token: str):
+        reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(f"GET /notifications/stream?token={token} HTTP/1.1\r\nHost: loadtest\r\n\r\n".encode())
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            if line.startswith(b"retry:"):
+                self.ready.set()
+            elif line.startswith(b"event: comment"):
+                self.received.append(time.perf_counter())
+
+
+async def stream(args) -> dict:
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from auth import create_tokens
+    from database import Base, dispose_engines, get_async_engine
+    from models import User, Track, TrackParticipant, Assignment
+    from serve import _memory_mb
+
+    # Все подключения — участники одного трека, поэтому комментарий в нём расходится всем
+    n = args.connections
+    async_engine = get_async_engine()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(async_engine, expire_on_commit=False)
+    now = datetime.utcnow()
+    users = [{"id": i, "email": f"user{i}@loadtest.example.com", "hashed_password": "-"} for i in range(1, n + 1)]
+    async with session_factory() as db:
+        await db.execute(insert(User), users)
+        await db.execute(insert(Track), [{"id": 1, "title": "Stream", "description": "", "quota": n, "criteria": "",
+                                          "started_at": now, "participant_count": n}])
+        await db.execute(insert(TrackParticipant), [{"track_id": 1, "user_id": u["id"]} for u in users])
+        await db.execute(insert(Assignment), [{"id": 1, "track_id": 1, "title": "Task", "description": "",
+                                               "deadline_days": 7, "order": 1, "deadline_at": now + timedelta(days=7)}])
+        await db.commit()
+    dialect = async_engine.dialect.name
+    await dispose_engines()
+    tokens = [create_tokens(User(id=u["id"], email=u["email"]))["access_token"] for u in users]
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+         "--backlog", "4096"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    clients, tasks = [], []
+    try:
+        await _wait_server(port)
+        before = _memory_mb(server.pid)
+
+        started = time.perf_counter()
+        for i in range(0, n, 500):
+            batch = [StreamClient() for _ in tokens[i:i + 500]]
+            tasks += [asyncio.create_task(c.run(port, t)) for c, t in zip(batch, tokens[i:i + 500])]
+            await asyncio.wait_for(asyncio.gather(*(c.ready.wait() for c in batch)), 60)
+            clients += batch
+        connected = time.perf_counter() - started
+        await asyncio.sleep(1)
+        after = _memory_mb(server.pid)
+
+        latencies, delivered = [], 0
+        body = json.dumps({"text": "ping"}).encode()
+        auth_headers = {"Authorization": f"Bearer {tokens[0]}", "Content-Type": "application/json"}
+        for round_no in range(args.rounds):
+            sent = time.perf_counter()
+            status = await _http(port, "POST", "/assignments/1/comments", auth_headers, body)
+            if status != 200:
+                raise SystemExit(f"Comment failed with {status}")
+            deadline = time.monotonic() + 30
+            while sum(len(c.received) > round_no for c in clients) < n and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            arrivals = [c.received[round_no] for c in clients if len(c.received) > round_no]
+            delivered += len(arrivals)
+            latencies += [t - sent for t in arrivals]
+            await asyncio.sleep(0.5)
+    finally:
+        for client in clients:
+            if client.writer is not None:
+                client.writer.close()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.terminate()
+        server.wait(30)
+
+    latencies.sort()
+    return {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(),
+            "benchmark": "stream",
+            "database": dialect,
+            "python": platform.python_version(),
+            "connections": n,
+            "rounds": args.rounds,
+        },
+        "connect_seconds": round(connected, 2),
+        "server_rss_mb": {"idle": before["rss_mb"], "connected": after["rss_mb"]},
+        "rss_kb_per_connection": round((after["rss_mb"] - before["rss_mb"]) * 1024 / n, 1),
+        "fanout": {
+            "delivered": delivered,
+            "expected": n * args.rounds,
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Регрессии: рост p95 или среднего числа запросов, падение пропускной способности, новые 5xx."""
+    regressions = []
+    for op, now in current["endpoints"].items():
+        before = baseline["endpoints"].get(op)
+        if before is None:
+            continue
+        checks = [
+            ("p95_ms", now["p95_ms"] > before["p95_ms"] * (1 + threshold)),
+            ("p99_ms", now["p99_ms"] > before["p99_ms"] * (1 + threshold)),
+            ("throughput_rps", now["throughput_rps"] < before["throughput_rps"] * (1 - threshold)),
+            ("queries_mean", (now["queries_mean"] or 0) > (before["queries_mean"] or 0) + 0.5),
+            ("errors", now["errors"] > before["errors"]),
+        ]
+        for metric, regressed in checks:
+            if regressed:
+                regressions.append((op, metric, before[metric], now[metric]))
+    return regressions
+
+
+def _print_report(result: dict):
+    meta = result["meta"]
+    if meta.get("benchmark") == "stream":
+        fanout = result["fanout"]
+        print(f"{meta['connections']} SSE connections in {result['connect_seconds']} s, server RSS "
+              f"{result['server_rss_mb']['idle']} -> {result['server_rss_mb']['connected']} MB "
+              f"({result['rss_kb_per_connection']} KB per connection)", file=sys.stderr)
+        print(f"fan-out {fanout['delivered']}/{fanout['expected']} events: p50 {fanout['p50_ms']} "
+              f"p95 {fanout['p95_ms']} p99 {fanout['p99_ms']} max {fanout['max_ms']} ms", file=sys.stderr)
+        return
+    print(f"{meta['database']}, {meta.get('scale') or meta['benchmark']} {meta['dataset']}, "
+          f"seeded in {meta['seed_seconds']} s", file=sys.stderr)
+    if "total" in result:
+        total = result["total"]
+        print(f"{total['requests']} requests in {total['seconds']} s: {total['throughput_rps']} rps, "
+              f"{total['errors']} errors", file=sys.stderr)
+    for op, e in result["endpoints"].items():
+        print(f"  {op:18} {e['requests']:6} req  p50 {e['p50_ms']:8.2f}  p95 {e['p95_ms']:8.2f}  "
+              f"p99 {e['p99_ms']:8.2f} ms  queries {e['queries_mean']}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for the learning platform API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed a database and run the mixed workload")
+    run_parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    for name in SCALES["small"]:
+        run_parser.add_argument(f"--{name}", type=int, help=f"override {name} of the scale")
+    run_parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed",
+                            help="mixed: all operations; auth: login burst with reads")
+    run_parser.add_argument("--hash-inline", action="store_true",
+                            help="run bcrypt in the request path instead of the bounded executor")
+    run_parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    run_parser.add_argument("--requests", type=int, default=50, help="requests per virtual user")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--database-url", help="empty database (default: temporary SQLite file)")
+    run_parser.add_argument("--out", help="write JSON here instead of stdout")
+
+    bench_parser = commands.add_parser("bench", help="compare a data path with the one it replaced")
+    bench_parser.add_argument("scenario", choices=sorted(BENCHES))
+    for name in SCALES["small"]:
+        bench_parser.add_argument(f"--{name}", type=int, help=f"override {name} of the dataset")
+    bench_parser.add_argument("--samples", type=int, default=200, help="measured calls per path")
+    bench_parser.add_argument("--legacy-samples", type=int, default=3, help="calls of the replaced path where it is slow")
+    bench_parser.add_argument("--seed", type=int, default=1)
+    bench_parser.add_argument("--database-url", help="empty database (default: temporary SQLite file)")
+    bench_parser.add_argument("--out", help="write JSON here instead of stdout")
+
+    stream_parser = commands.add_parser("stream", help="idle SSE connections: memory and fan-out latency")
+    stream_parser.add_argument("--connections", type=int, default=5000)
+    stream_parser.add_argument("--rounds", type=int, default=5, help="events published to all connections")
+    stream_parser.add_argument("--database-url", help="empty database (default: temporary SQLite file)")
+    stream_parser.add_argument("--out", help="write JSON here instead of stdout")
+
+    compare_parser = commands.add_parser("compare", help="flag regressions between two runs")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative change")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold)
+        for op, metric, before, now in regressions:
+            print(f"REGRESSION {op} {metric}: {before} -> {now}")
+        if not regressions:
+            print("No regressions")
+        sys.exit(1 if regressions else 0)
+
+    tmpdir = None
+    if args.database_url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        args.database_url = f"sqlite:///{os.path.join(tmpdir.name, 'loadtest.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    os.environ["QUERY_COUNT_HEADER"] = "1"
+    # Измеряется само приложение: все виртуальные пользователи приходят с одного IP
+    os.environ["RATE_LIMIT_ENABLED"] = "0"
+    os.environ["REPO_FETCHER"] = "fake"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    try:
+        result = asyncio.run({"run": run, "bench": bench, "stream": stream}[args.command](args))
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+    _print_report(result)
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
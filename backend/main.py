@@ -1,72 +1,187 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Query, Request, UploadFile, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from sqlalchemy import case, exists, insert, select
+from datetime import datetime
 from typing import List, Optional
-import random
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
 
-from database import SessionLocal, engine, Base
+from database import AsyncSessionLocal, dispose_engines, get_async_engine, upsert_insert
 from models import User, Track, TrackParticipant, Assignment, Submission, Review, Comment
 from schemas import (
     UserCreate, UserResponse, TrackCreate, TrackResponse, AssignmentResponse,
-    SubmissionCreate, ReviewCreate, CommentCreate
+    SubmissionCreate, ReviewCreate, CommentCreate, RefreshRequest, LogoutRequest
 )
 from auth import (
-    get_password_hash, verify_password, create_access_token,
-    get_current_user, get_db
+    Principal, get_password_hash, verify_password, create_tokens, rotate_refresh_token,
+    revoke_tokens, get_current_user, get_user_by_token, get_db, oauth2_scheme, password_hasher, user_cache
 )
+from cache import cache
+from conditional import conditional_json
+from events import hub
+from health import lifecycle
+from metrics import MetricsMiddleware, query_budget
+import metrics
+from pagination import encode_cursor, decode_cursor
+from ratelimit import AdmissionController, AdmissionMiddleware, pool_pressure, rate_limiter
+import ratelimit
+import dashboard
+import notifications
+import participation
+import progress
+import repo_check
+import review_queue
+import scheduler
+import scores
+import tracks_io
 
-Base.metadata.create_all(bind=engine)
+TRACKS_PAGE_SIZE = 50
+TRACKS_MAX_PAGE_SIZE = 200
+COMMENTS_PAGE_SIZE = 100
+COMMENTS_MAX_PAGE_SIZE = 500
+LEADERBOARD_SIZE = 10
+LEADERBOARD_MAX_SIZE = 100
+# Сколько строк выгрузки комментариев держится в памяти за раз
+COMMENTS_EXPORT_BATCH = 500
 
-app = FastAPI()
+# Бюджеты SQL-запросов маршрутов (metrics.query_budget) включают до двух запросов
+# аутентификации: промах кэша пользователя и обновление списка отозванных токенов
+AUTH_QUERIES = 2
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Интервал keepalive-комментариев в SSE-потоке, секунды
+STREAM_KEEPALIVE = 25
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+metrics.instrument()
+
+# Импорт модуля не создаёт ни движка БД, ни соединений, ни фоновых задач: всё это
+# делает lifespan в каждом воркере, поэтому приложение можно загружать до fork
+job_scheduler = scheduler.Scheduler(AsyncSessionLocal)
+repo_checker = repo_check.RepoChecker(AsyncSessionLocal)
+admission = AdmissionController(pool_pressure(get_async_engine, password_hasher))
+
+router = APIRouter()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_async_engine()
+    lifecycle.install_drain_handler(asyncio.get_running_loop())
+    hub.start()
+    if scheduler.SCHEDULER_ENABLED:
+        job_scheduler.start()
+    if repo_check.REPO_CHECK_ENABLED:
+        repo_checker.start()
+    lifecycle.started = True
+    yield
+    lifecycle.started = False
+    await job_scheduler.stop()
+    await repo_checker.stop()
+    hub.stop()
+    await dispose_engines()
 
-@app.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.email == user.email).first():
+def create_app() -> FastAPI:
+    app = FastAPI(lifespan=lifespan)
+    # Внутри CORS, чтобы отказ 503 тоже получил CORS-заголовки
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag", "X-Next-Cursor", "X-Last-Cursor", "X-Query-Count"],
+    )
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(router)
+    return app
+
+async def write_rate_limit(current_user: Principal = Depends(get_current_user)):
+    # get_current_user кэшируется FastAPI в пределах запроса, повторной аутентификации нет
+    await rate_limiter.hit("write_user", current_user.id, ratelimit.WRITE_USER_LIMIT)
+
+@router.post("/register", response_model=UserResponse, dependencies=[
+    Depends(rate_limiter.per_ip("register_ip", ratelimit.REGISTER_IP_LIMIT)), Depends(query_budget(2))
+])
+async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(User.id).filter(User.email == user.email)):
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = get_password_hash(user.password)
+    hashed = await get_password_hash(user.password)
     db_user = User(email=user.email, hashed_password=hashed)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
     return db_user
 
-@app.post("/token")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+@router.post("/token", dependencies=[
+    Depends(rate_limiter.per_ip("login_ip", ratelimit.LOGIN_IP_LIMIT)), Depends(query_budget(1))
+])
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(),
+                db: AsyncSession = Depends(get_db)):
+    # Лимиты на аккаунт проверяются до bcrypt. Основной — на (email, IP), чтобы перебор
+    # с чужого адреса не запирал владельца; общий на email — против перебора с многих IP
+    account = form_data.username.lower()
+    await rate_limiter.hit("login_account_ip", f"{account}:{ratelimit.client_ip(request)}",
+                           ratelimit.LOGIN_ACCOUNT_IP_LIMIT)
+    await rate_limiter.hit("login_account", account, ratelimit.LOGIN_ACCOUNT_LIMIT)
+    user = await db.scalar(select(User).filter(User.email == form_data.username))
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    access_token = create_access_token(data={"sub": str(user.id)})
-    return {"access_token": access_token, "token_type": "bearer"}
-
-@app.get("/tracks", response_model=List[TrackResponse])
-def get_tracks(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    tracks = db.query(Track).all()
-    result = []
-    for track in tracks:
-        count = db.query(TrackParticipant).filter(TrackParticipant.track_id == track.id).count()
-        result.append({
-            "id": track.id,
-            "title": track.title,
-            "description": track.description,
-            "quota": track.quota,
-            "started_at": track.started_at,
-            "participant_count": count
-        })
-    return result
-
-@app.post("/tracks", response_model=TrackResponse)
-def create_track(track: TrackCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    return create_tokens(user)
+
+@router.post("/token/refresh", dependencies=[Depends(query_budget(4))])
+async def refresh_token(body: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    return await rotate_refresh_token(db, body.refresh_token)
+
+@router.post("/logout", dependencies=[Depends(query_budget(4))])
+async def logout(body: LogoutRequest, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    await revoke_tokens(db, token, body.refresh_token)
+    return {"message": "Logged out"}
+
+@router.get("/tracks", response_model=List[TrackResponse], dependencies=[Depends(query_budget(AUTH_QUERIES + 1))])
+async def get_tracks(request: Request, cursor: Optional[str] = None,
+                     limit: int = Query(TRACKS_PAGE_SIZE, ge=1, le=TRACKS_MAX_PAGE_SIZE),
+                     status_filter: Optional[str] = Query(None, alias="status", pattern="^(open|started)$"),
+                     db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Список общий для всех пользователей; сбрасывается тегом "tracks" при любом изменении треков и участников
+    page = await cache.get_or_load(
+        "tracks", {"cursor": cursor, "limit": limit, "status": status_filter},
+        lambda: load_tracks_page(db, cursor, limit, status_filter), tags=["tracks"]
+    )
+    return conditional_json(request, page["items"], page["headers"])
+
+async def load_tracks_page(db: AsyncSession, cursor: Optional[str], limit: int, status_filter: Optional[str]) -> dict:
+    # Число участников хранится в самом треке, keyset по Track.id
+    query = select(
+        Track.id, Track.title, Track.description, Track.quota, Track.started_at, Track.participant_count
+    )
+    
+    if status_filter == "open":
+        query = query.filter(Track.started_at.is_(None))
+    elif status_filter == "started":
+        query = query.filter(Track.started_at.isnot(None))
+    if cursor:
+        (after_id,) = decode_cursor(cursor, 1)
+        if not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(Track.id > after_id)
+    
+    rows = (await db.execute(query.order_by(Track.id).limit(limit + 1))).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1].id)
+    
+    return {"items": [dict(row._mapping) for row in rows], "headers": headers}
+
+@router.post("/tracks", response_model=TrackResponse, dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 4))])
+async def create_track(track: TrackCreate, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     db_track = Track(
         title=track.title,
         description=track.description,
@@ -74,114 +189,103 @@ def create_track(track: TrackCreate, db: Session = Depends(get_db), current_user
         criteria=track.criteria
     )
     db.add(db_track)
-    db.flush()
+    await db.flush()
     
-    for assn in track.assignments:
-        db_assn = Assignment(
-            track_id=db_track.id,
-            title=assn["title"],
-            description=assn["description"],
-            deadline_days=assn["deadline_days"],
-            order=assn["order"]
-        )
-        db.add(db_assn)
+    if track.assignments:
+        await db.execute(insert(Assignment), [
+            {"track_id": db_track.id, **assn.model_dump()} for assn in track.assignments
+        ])
     
-    db.commit()
-    db.refresh(db_track)
+    await db.commit()
+    await cache.invalidate("tracks")
     return {"id": db_track.id, "title": db_track.title, "description": db_track.description,
             "quota": db_track.quota, "started_at": None, "participant_count": 0}
 
-@app.post("/tracks/{track_id}/join")
-def join_track(track_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    track = db.query(Track).filter(Track.id == track_id).first()
-    if not track:
-        raise HTTPException(status_code=404, detail="Track not found")
-    if track.started_at:
-        raise HTTPException(status_code=400, detail="Track already started")
-    
-    existing = db.query(TrackParticipant).filter(
-        TrackParticipant.track_id == track_id,
-        TrackParticipant.user_id == current_user.id
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Already joined")
-    
-    participant = TrackParticipant(user_id=current_user.id, track_id=track_id)
-    db.add(participant)
+@router.post("/tracks/import", dependencies=[Depends(write_rate_limit)])
+async def import_tracks(file: UploadFile, format: Optional[str] = Query(None, pattern="^(jsonl|csv)$"),
+                        db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Файл уже лежит во временном файле на диске, разбор идёт построчно
+    fmt = format or ("csv" if (file.filename or "").endswith(".csv") else "jsonl")
+    report = await tracks_io.import_tracks(db, tracks_io.read_records(file.file, fmt))
+    if report["tracks"]:
+        await cache.invalidate("tracks")
+    return report
+
+@router.get("/tracks/export")
+async def export_tracks(current_user: Principal = Depends(get_current_user)):
+    # Только каталог: решения и ревью других участников выгружает лишь `python tracks_io.py export`
+    async def lines():
+        async with AsyncSessionLocal() as db:
+            async for chunk in tracks_io.export_lines(db, activity=False):
+                yield chunk
     
-    count = db.query(TrackParticipant).filter(TrackParticipant.track_id == track_id).count() + 1
-    if count >= track.quota:
-        track.started_at = datetime.utcnow()
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/tracks/{track_id}/join", dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 11))])
+async def join_track(track_id: int, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Место и старт трека забираются условными UPDATE по счётчику, см. participation.py
+    try:
+        participant_ids = await participation.join(db, track_id, current_user.id)
+    except participation.JoinError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    db.commit()
+    await db.commit()
+    await cache.invalidate("tracks")
+    if participant_ids:
+        hub.publish(participant_ids, {"type": "track_started", "track_id": track_id})
     return {"message": "Joined successfully"}
 
-@app.post("/tracks/{track_id}/leave")
-def leave_track(track_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    track = db.query(Track).filter(Track.id == track_id).first()
-    if not track:
-        raise HTTPException(status_code=404, detail="Track not found")
-    if track.started_at:
-        raise HTTPException(status_code=400, detail="Cannot leave started track")
+@router.post("/tracks/{track_id}/leave", dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 2))])
+async def leave_track(track_id: int, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    try:
+        await participation.leave(db, track_id, current_user.id)
+    except participation.JoinError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     
-    participant = db.query(TrackParticipant).filter(
-        TrackParticipant.track_id == track_id,
-        TrackParticipant.user_id == current_user.id
-    ).first()
-    if not participant:
-        raise HTTPException(status_code=404, detail="Not a participant")
-    
-    db.delete(participant)
-    db.commit()
+    await db.commit()
+    await cache.invalidate("tracks")
     return {"message": "Left successfully"}
 
-@app.get("/tracks/{track_id}/assignments", response_model=List[AssignmentResponse])
-def get_assignments(track_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    track = db.query(Track).filter(Track.id == track_id).first()
+@router.get("/tracks/{track_id}/assignments", response_model=List[AssignmentResponse], dependencies=[Depends(query_budget(AUTH_QUERIES + 3))])
+async def get_assignments(track_id: int, db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    track = await db.get(Track, track_id)
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
     
-    participant = db.query(TrackParticipant).filter(
+    participant = await db.scalar(select(TrackParticipant.id).filter(
         TrackParticipant.track_id == track_id,
         TrackParticipant.user_id == current_user.id
-    ).first()
+    ))
     if not participant:
         raise HTTPException(status_code=403, detail="Not a participant")
     
     if not track.started_at:
         return []
     
-    assignments = db.query(Assignment).filter(Assignment.track_id == track_id).order_by(Assignment.order).all()
-    
-    # Проверяем доступность заданий
-    result = []
-    for i, assn in enumerate(assignments):
-        if i == 0:
-            result.append(assn)
-        else:
-            prev_assn = assignments[i-1]
-            prev_submission = db.query(Submission).filter(
-                Submission.assignment_id == prev_assn.id,
-                Submission.user_id == current_user.id
-            ).first()
-            if prev_submission:
-                review = db.query(Review).filter(
-                    Review.submission_id == prev_submission.id,
-                    Review.reviewer_id == current_user.id
-                ).first()
-                if review:
-                    result.append(assn)
-                else:
-                    break
-            else:
-                break
-    
-    return result
+    # Цепочка разблокировки считается одним запросом в progress.py
+    return progress.unlocked(await progress.get_progress(db, current_user.id, track_id))
+
+@router.get("/tracks/{track_id}/leaderboard", dependencies=[Depends(query_budget(AUTH_QUERIES + 4))])
+async def get_leaderboard(track_id: int, limit: int = Query(LEADERBOARD_SIZE, ge=1, le=LEADERBOARD_MAX_SIZE),
+                          db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Топ общий для всех и кэшируется до следующего ревью в треке; место пользователя — отдельный запрос по индексу
+    top = await cache.get_or_load(
+        "leaderboard", {"track_id": track_id, "limit": limit},
+        lambda: load_leaderboard_top(db, track_id, limit), tags=[f"leaderboard:{track_id}"]
+    )
+    if top is None:
+        raise HTTPException(status_code=404, detail="Track not found")
+    return {"top": top, "me": await scores.rank_of(db, track_id, current_user.id)}
 
-@app.post("/assignments/{assignment_id}/submit")
-def submit_assignment(assignment_id: int, submission: SubmissionCreate,
-                     db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+async def load_leaderboard_top(db: AsyncSession, track_id: int, limit: int):
+    if await db.get(Track, track_id) is None:
+        return None
+    return await scores.top(db, track_id, limit)
+
+@router.post("/assignments/{assignment_id}/submit", dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 3))])
+async def submit_assignment(assignment_id: int, submission: SubmissionCreate,
+                            db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    assignment = await db.get(Assignment, assignment_id, options=[joinedload(Assignment.track)])
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
@@ -189,32 +293,56 @@ def submit_assignment(assignment_id: int, submission: SubmissionCreate,
     if not assignment.track.started_at:
         raise HTTPException(status_code=400, detail="Track has not started yet")
     
-    deadline = assignment.track.started_at + timedelta(days=assignment.deadline_days)
-    if datetime.utcnow() > deadline:
+    if datetime.utcnow() > assignment.deadline_at:
         raise HTTPException(status_code=400, detail="Deadline passed")
     
-    existing = db.query(Submission).filter(
+    # Повторная отправка обновляет ссылку одним атомарным upsert
+    stmt = upsert_insert(db, Submission).values(
+        assignment_id=assignment_id,
+        user_id=current_user.id,
+        repository_url=submission.repository_url,
+        submitted_at=datetime.utcnow()
+    )
+    # Та же ссылка сохраняет результат проверки, новая — снова pending
+    new_status = case((Submission.repository_url == stmt.excluded.repository_url, Submission.status), else_=repo_check.PENDING)
+    submission_id, submission_status = (await db.execute(stmt.on_conflict_do_update(
+        index_elements=["assignment_id", "user_id"],
+        set_={"repository_url": stmt.excluded.repository_url, "submitted_at": stmt.excluded.submitted_at, "status": new_status}
+    ).returning(Submission.id, Submission.status))).one()
+    await notifications.on_submission(db, current_user.id, assignment)
+    
+    await db.commit()
+    await progress.invalidate(current_user.id, assignment.track_id)
+    # Ссылка проверяется воркерами repo_check после ответа
+    if submission_status == repo_check.PENDING:
+        repo_checker.enqueue(submission_id)
+    hub.publish([current_user.id], {"type": "submission", "assignment_id": assignment_id})
+    return {"message": "Submitted successfully", "submission_id": submission_id, "status": submission_status}
+
+@router.get("/assignments/{assignment_id}/submission", dependencies=[Depends(query_budget(AUTH_QUERIES + 1))])
+async def get_own_submission(assignment_id: int, db: AsyncSession = Depends(get_db),
+                             current_user: Principal = Depends(get_current_user)):
+    # Результат фоновой проверки ссылки: pending, пока воркер repo_check до неё не дошёл
+    submission = await db.scalar(select(Submission).filter(
         Submission.assignment_id == assignment_id,
         Submission.user_id == current_user.id
-    ).first()
-    if existing:
-        existing.repository_url = submission.repository_url
-        existing.submitted_at = datetime.utcnow()
-    else:
-        db_submission = Submission(
-            assignment_id=assignment_id,
-            user_id=current_user.id,
-            repository_url=submission.repository_url
-        )
-        db.add(db_submission)
-    
-    db.commit()
-    return {"message": "Submitted successfully"}
+    ))
+    if submission is None:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    return {
+        "submission_id": submission.id,
+        "repository_url": submission.repository_url,
+        "submitted_at": submission.submitted_at,
+        "status": submission.status,
+        "status_detail": submission.status_detail,
+        "checked_at": submission.checked_at,
+        "repository": json.loads(submission.repository_meta) if submission.repository_meta else None
+    }
 
-@app.get("/assignments/{assignment_id}/review")
-def get_review_assignment(assignment_id: int, db: Session = Depends(get_db),
-                         current_user: User = Depends(get_current_user)):
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+@router.get("/assignments/{assignment_id}/review", dependencies=[Depends(query_budget(AUTH_QUERIES + 8))])
+async def get_review_assignment(assignment_id: int, db: AsyncSession = Depends(get_db),
+                                current_user: Principal = Depends(get_current_user)):
+    assignment = await db.get(Assignment, assignment_id, options=[joinedload(Assignment.track)])
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
@@ -222,125 +350,229 @@ def get_review_assignment(assignment_id: int, db: Session = Depends(get_db),
     if not assignment.track.started_at:
         raise HTTPException(status_code=400, detail="Track has not started yet")
     
-    deadline = assignment.track.started_at + timedelta(days=assignment.deadline_days)
-    if datetime.utcnow() < deadline:
+    if datetime.utcnow() < assignment.deadline_at:
         raise HTTPException(status_code=400, detail="Deadline not passed yet")
     
-    # Получаем случайную работу для ревью
-    submissions = db.query(Submission).filter(
-        Submission.assignment_id == assignment_id,
-        Submission.user_id != current_user.id
-    ).all()
-    
-    if not submissions:
-        raise HTTPException(status_code=404, detail="No submissions to review")
+    # Обычно ревью распределяет планировщик в момент дедлайна
+    if assignment.reviews_allocated_at is None:
+        await review_queue.allocate(db, assignment_id)
+        await db.commit()
     
-    # Проверяем, не ревьюил ли уже
-    reviewed_ids = [r.submission_id for r in db.query(Review).filter(Review.reviewer_id == current_user.id).all()]
-    available = [s for s in submissions if s.id not in reviewed_ids]
-    
-    if not available:
+    submission = await review_queue.next_submission(db, assignment_id, current_user.id)
+    if submission is None:
+        has_submissions = await db.scalar(select(exists().where(
+            Submission.assignment_id == assignment_id,
+            Submission.user_id != current_user.id
+        )))
+        if not has_submissions:
+            raise HTTPException(status_code=404, detail="No submissions to review")
         return {"message": "All submissions reviewed"}
     
-    submission = random.choice(available)
     return {
         "submission_id": submission.id,
         "repository_url": submission.repository_url,
-        "submitted_at": submission.submitted_at
+        "submitted_at": submission.submitted_at,
+        "status": submission.status
     }
 
-@app.post("/submissions/{submission_id}/review")
-def submit_review(submission_id: int, review: ReviewCreate,
-                 db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+@router.post("/submissions/{submission_id}/review", dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 7))])
+async def submit_review(submission_id: int, review: ReviewCreate,
+                        db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    submission = await db.get(Submission, submission_id, options=[joinedload(Submission.assignment)])
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     
     if submission.user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot review own submission")
     
-    existing = db.query(Review).filter(
-        Review.submission_id == submission_id,
-        Review.reviewer_id == current_user.id
-    ).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Already reviewed")
-    
-    db_review = Review(
+    inserted = await db.execute(upsert_insert(db, Review).values(
         submission_id=submission_id,
         reviewer_id=current_user.id,
         score=review.score,
-        comment=review.comment
-    )
-    db.add(db_review)
-    db.commit()
+        comment=review.comment,
+        created_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=["submission_id", "reviewer_id"]))
+    if inserted.rowcount == 0:
+        raise HTTPException(status_code=400, detail="Already reviewed")
+    await review_queue.on_review(db, submission_id, current_user.id)
+    await scores.on_review(db, submission, submission.assignment.track_id, review.score)
+    await notifications.on_review(db, current_user.id, submission.assignment_id)
+    await db.commit()
+    await progress.invalidate(current_user.id, submission.assignment.track_id)
+    await cache.invalidate(f"leaderboard:{submission.assignment.track_id}")
+    hub.publish([submission.user_id, current_user.id], {
+        "type": "review", "assignment_id": submission.assignment_id, "submission_id": submission_id
+    })
     return {"message": "Review submitted"}
 
-@app.get("/assignments/{assignment_id}/comments")
-def get_comments(assignment_id: int, db: Session = Depends(get_db),
-                current_user: User = Depends(get_current_user)):
-    comments = db.query(Comment).filter(Comment.assignment_id == assignment_id).order_by(Comment.created_at).all()
-    return [{"id": c.id, "text": c.text, "user_id": c.user_id, "created_at": c.created_at} for c in comments]
+def comment_cursor(comment: Comment) -> str:
+    return encode_cursor(comment.id)
+
+def decode_comment_cursor(cursor: str) -> int:
+    comment_id, = decode_cursor(cursor, 1)
+    if not isinstance(comment_id, int):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return comment_id
+
+def comment_to_dict(c: Comment) -> dict:
+    return {"id": c.id, "text": c.text, "user_id": c.user_id, "created_at": c.created_at}
+
+@router.get("/assignments/{assignment_id}/comments", dependencies=[Depends(query_budget(AUTH_QUERIES + 1))])
+async def get_comments(assignment_id: int, cursor: Optional[str] = None, since: Optional[datetime] = None,
+                       limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=COMMENTS_MAX_PAGE_SIZE),
+                       db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    page = await cache.get_or_load(
+        "comments", {"assignment_id": assignment_id, "cursor": cursor, "since": since, "limit": limit},
+        lambda: load_comments_page(db, assignment_id, cursor, since, limit),
+        tags=[f"comments:{assignment_id}"]
+    )
+    return JSONResponse(page["items"], headers=page["headers"])
+
+async def load_comments_page(db: AsyncSession, assignment_id: int, cursor: Optional[str],
+                             since: Optional[datetime], limit: int) -> dict:
+    # Keyset по id: cursor — позиция последнего полученного комментария, поэтому тот же
+    # курсор годится и для следующей страницы, и для опроса новых. created_at для этого
+    # не подходит: он ставится до commit, и комментарий, записанный позже соседнего,
+    # может оказаться позади уже выданного курсора
+    query = select(Comment).filter(Comment.assignment_id == assignment_id)
+    if cursor:
+        query = query.filter(Comment.id > decode_comment_cursor(cursor))
+    if since is not None:
+        query = query.filter(Comment.created_at > since)
+    
+    comments = list(await db.scalars(query.order_by(Comment.id).limit(limit + 1)))
+    headers = {}
+    if len(comments) > limit:
+        comments = comments[:limit]
+        headers["X-Next-Cursor"] = comment_cursor(comments[-1])
+    # Позиция, с которой клиент продолжит опрос, даже если новых комментариев нет
+    if comments:
+        headers["X-Last-Cursor"] = comment_cursor(comments[-1])
+    elif cursor:
+        headers["X-Last-Cursor"] = cursor
+    return {"items": [comment_to_dict(c) for c in comments], "headers": headers}
+
+@router.get("/assignments/{assignment_id}/comments/export")
+async def export_comments(assignment_id: int, current_user: Principal = Depends(get_current_user)):
+    """Все комментарии задания в NDJSON, построчно по мере чтения из БД."""
+    async def lines():
+        # Своя сессия: поток живёт дольше обработчика и его зависимостей
+        async with AsyncSessionLocal() as db:
+            result = await db.stream_scalars(select(Comment).filter(
+                Comment.assignment_id == assignment_id
+            ).order_by(Comment.id).execution_options(yield_per=COMMENTS_EXPORT_BATCH))
+            async for batch in result.partitions():
+                yield "".join(json.dumps(jsonable_encoder(comment_to_dict(c))) + "\n" for c in batch)
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-@app.post("/assignments/{assignment_id}/comments")
-def create_comment(assignment_id: int, comment: CommentCreate,
-                  db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+@router.post("/assignments/{assignment_id}/comments", dependencies=[Depends(write_rate_limit), Depends(query_budget(AUTH_QUERIES + 2))])
+async def create_comment(assignment_id: int, comment: CommentCreate,
+                         db: AsyncSession = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     db_comment = Comment(
         assignment_id=assignment_id,
         user_id=current_user.id,
         text=comment.text
     )
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
-    return {"id": db_comment.id, "text": db_comment.text, "user_id": db_comment.user_id,
-            "created_at": db_comment.created_at}
-
-@app.get("/notifications")
-def get_notifications(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    notifications = []
+    await db.commit()
+    await cache.invalidate(f"comments:{assignment_id}")
     
-    # Получаем все треки пользователя
-    tracks = db.query(Track).join(TrackParticipant).filter(
-        TrackParticipant.user_id == current_user.id,
-        Track.started_at.isnot(None)
-    ).all()
+    # Комментарий видят все участники трека, к которому относится задание
+    participant_ids = list(await db.scalars(select(TrackParticipant.user_id).join(
+        Assignment, Assignment.track_id == TrackParticipant.track_id
+    ).filter(Assignment.id == assignment_id)))
+    hub.publish(participant_ids, {"type": "comment", "assignment_id": assignment_id, "comment_id": db_comment.id})
+    return {**comment_to_dict(db_comment), "cursor": comment_cursor(db_comment)}
+
+@router.get("/me/dashboard", dependencies=[Depends(query_budget(AUTH_QUERIES + 4))])
+async def get_dashboard(request: Request, db: AsyncSession = Depends(get_db),
+                        current_user: Principal = Depends(get_current_user)):
+    # Всё для стартового экрана одним ответом; число запросов не растёт с числом треков
+    return conditional_json(request, await dashboard.load(db, current_user.id))
+
+@router.get("/notifications", dependencies=[Depends(query_budget(AUTH_QUERIES + 1))])
+async def get_notifications(since: Optional[datetime] = None, db: AsyncSession = Depends(get_db),
+                            current_user: Principal = Depends(get_current_user)):
+    # Уведомления материализуются в notifications.py, здесь только чтение
+    return await notifications.get_active(db, current_user.id, since=since)
+
+@router.get("/notifications/stream")
+async def stream_notifications(token: str):
+    # EventSource не умеет передавать заголовки, поэтому токен приходит в query
+    user_id = (await get_user_by_token(token)).id
+    queue = await hub.subscribe(user_id)
     
-    for track in tracks:
-        assignments = db.query(Assignment).filter(Assignment.track_id == track.id).order_by(Assignment.order).all()
-        for assn in assignments:
-            # Проверяем, что трек начался (для безопасности)
-            if not track.started_at:
-                continue
-            
-            deadline = track.started_at + timedelta(days=assn.deadline_days)
-            days_left = (deadline - datetime.utcnow()).days
-            
-            # Уведомление за 2 дня до дедлайна
-            if 0 <= days_left <= 2:
-                notifications.append({
-                    "type": "deadline_warning",
-                    "message": f"Assignment '{assn.title}' deadline in {days_left} days",
-                    "assignment_id": assn.id
-                })
-            
-            # Уведомление о начале код-ривью
-            if datetime.utcnow() > deadline:
-                submission = db.query(Submission).filter(
-                    Submission.assignment_id == assn.id,
-                    Submission.user_id == current_user.id
-                ).first()
-                if submission:
-                    review = db.query(Review).filter(
-                        Review.submission_id == submission.id,
-                        Review.reviewer_id == current_user.id
-                    ).first()
-                    if not review:
-                        notifications.append({
-                            "type": "code_review",
-                            "message": f"Code review started for '{assn.title}'",
-                            "assignment_id": assn.id
-                        })
+    async def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(user_id, queue)
     
-    return notifications
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.get("/cache/stats")
+async def cache_stats(current_user: Principal = Depends(get_current_user)):
+    # Попадания и промахи кэша ответов по эндпоинтам текущего воркера
+    return cache.stats()
+
+def collect_app_metrics():
+    samples = []
+    for name, counters in cache.stats()["endpoints"].items():
+        for counter in ("hits", "misses", "stampede_waits"):
+            samples.append((f"response_cache_{counter}_total", "counter", {"endpoint": name}, counters[counter]))
+    auth_cache = user_cache.stats()
+    samples.append(("auth_user_cache_hits_total", "counter", {}, auth_cache["hits"]))
+    samples.append(("auth_user_cache_misses_total", "counter", {}, auth_cache["misses"]))
+    hasher = password_hasher.stats()
+    samples.append(("password_hash_in_flight", "gauge", {}, hasher["in_flight"]))
+    samples.append(("password_hash_rejected_total", "counter", {}, hasher["rejected"]))
+    samples.append(("scheduler_jobs_processed_total", "counter", {}, job_scheduler.processed))
+    samples.append(("scheduler_jobs_failed_total", "counter", {}, job_scheduler.failed))
+    samples.append(("sse_subscribers", "gauge", {}, hub.subscriber_count()))
+    repo_stats = repo_checker.stats()
+    samples.append(("repo_check_queue_depth", "gauge", {}, repo_stats["queued"]))
+    samples.append(("repo_check_dropped_total", "counter", {}, repo_stats["dropped"]))
+    samples.append(("repo_check_fetches_total", "counter", {}, repo_stats["fetches"]))
+    for check_status, count in repo_stats["results"].items():
+        samples.append(("repo_check_results_total", "counter", {"status": check_status}, count))
+    for name, counters in rate_limiter.stats()["limits"].items():
+        for outcome in ("allowed", "limited"):
+            samples.append(("rate_limit_requests_total", "counter", {"limit": name, "outcome": outcome}, counters[outcome]))
+    admission_stats = admission.stats()
+    samples.append(("admission_in_flight", "gauge", {}, admission_stats["in_flight"]))
+    for gauge, value in admission_stats["pressure"].items():
+        samples.append((f"admission_{gauge}", "gauge", {}, value))
+    for kind, count in admission_stats["admitted"].items():
+        samples.append(("admission_admitted_total", "counter", {"class": kind}, count))
+    for shed in admission_stats["shed"]:
+        samples.append(("admission_shed_total", "counter", {"class": shed["class"], "reason": shed["reason"]}, shed["count"]))
+    return samples
+
+metrics.register_collector(collect_app_metrics)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Формат Prometheus; значения — по текущему воркеру
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/health/live")
+async def liveness():
+    # БД не проверяется: при её сбое перезапуск воркеров не поможет
+    return {"status": lifecycle.status()}
+
+@router.get("/health/ready")
+async def readiness():
+    state = await lifecycle.readiness(get_async_engine())
+    return JSONResponse({"status": state}, status_code=200 if state == "ready" else status.HTTP_503_SERVICE_UNAVAILABLE)
 
+# uvicorn main:app; gunicorn загружает приложение через serve.py
+app = create_app()
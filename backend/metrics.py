@@ -0,0 +1,242 @@
+"""Метрики запросов и БД в формате Prometheus.
+
+MetricsMiddleware измеряет каждый HTTP-запрос: время по маршруту (шаблону
+пути, а не конкретному URL), статус, число SQL-запросов и время в БД.
+SQL-запросы считают обработчики событий движка (instrument): запрос
+относится к HTTP-запросу через ContextVar, запросы вне HTTP (планировщик)
+идут с route="background". Запросы дольше SLOW_QUERY_MS пишутся в лог
+вместе с маршрутом.
+
+Бюджет запросов маршрута задаётся зависимостью:
+    @app.get("/tracks", dependencies=[Depends(query_budget(2))])
+При QUERY_BUDGET_MODE=warn превышение пишется в лог, при strict запрос
+падает с QueryBudgetExceeded — так проверка бюджетов ловит N+1
+(python query_budget.py).
+
+Другие модули добавляют свои показатели через register_collector().
+"""
+import bisect
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Заголовок X-Query-Count: сколько SQL-запросов выполнено до отправки заголовков ответа.
+# Отладочный: выдаёт устройство запросов, поэтому по умолчанию выключен
+QUERY_COUNT_HEADER = os.getenv("QUERY_COUNT_HEADER", "0") == "1"
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")  # off | warn | strict
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+BACKGROUND = "background"
+UNMATCHED = "unmatched"
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_seconds", "budget")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.budget = None
+
+    @property
+    def route(self) -> str:
+        # Starlette записывает найденный маршрут в scope при роутинге
+        route = self.scope.get("route")
+        return getattr(route, "path", UNMATCHED)
+
+
+_current = ContextVar("request_stats", default=None)
+
+requests_total = {}  # (method, route, status) -> int
+request_latency = {}  # (method, route) -> Histogram
+request_queries = {}  # (method, route) -> Histogram
+db_queries = {}  # route -> int
+db_seconds = {}  # route -> float
+slow_queries = {}  # route -> int
+budget_violations = {}  # (method, route) -> int
+
+_collectors = []
+
+
+def register_collector(collect):
+    """collect() -> [(имя, тип, {метка: значение}, значение)] на момент выдачи /metrics."""
+    _collectors.append(collect)
+
+
+def current() -> RequestStats:
+    return _current.get()
+
+
+def query_budget(limit: int):
+    """Зависимость FastAPI: не больше limit SQL-запросов на запрос маршрута."""
+    async def set_budget():
+        stats = _current.get()
+        if stats is not None:
+            stats.budget = limit
+    set_budget.query_budget = limit
+    return set_budget
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    route = BACKGROUND
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        route = stats.route
+    db_queries[route] = db_queries.get(route, 0) + 1
+    db_seconds[route] = db_seconds.get(route, 0.0) + elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_queries[route] = slow_queries.get(route, 0) + 1
+        logger.warning("Slow query %.0f ms on %s: %s", elapsed * 1000, route, " ".join(statement.split()))
+
+
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+def instrument(engine=Engine):
+    """Подключает счётчики запросов к движку (синхронному или async).
+
+    По умолчанию — ко всем движкам процесса, в том числе созданным позже.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def _check_budget(method: str, stats: RequestStats):
+    if stats.budget is None or stats.queries <= stats.budget or QUERY_BUDGET_MODE == "off":
+        return
+    key = (method, stats.route)
+    budget_violations[key] = budget_violations.get(key, 0) + 1
+    message = f"{method} {stats.route} ran {stats.queries} queries, budget is {stats.budget}"
+    if QUERY_BUDGET_MODE == "strict":
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: не буферизует ответ, поэтому годится и для потоков (SSE, NDJSON)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_stats(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if QUERY_COUNT_HEADER:
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(stats.queries).encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            _current.reset(token)
+            method, route = scope["method"], stats.route
+            key = (method, route, str(status_code))
+            requests_total[key] = requests_total.get(key, 0) + 1
+            request_latency.setdefault((method, route), Histogram(LATENCY_BUCKETS)).observe(
+                time.perf_counter() - started
+            )
+            request_queries.setdefault((method, route), Histogram(QUERY_COUNT_BUCKETS)).observe(stats.queries)
+        _check_budget(method, stats)
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+def _histogram_lines(name: str, histograms: dict) -> list:
+    lines = [f"# TYPE {name} histogram"]
+    for (method, route), h in sorted(histograms.items()):
+        labels = {"method": method, "route": route}
+        cumulative = 0
+        for bound, count in zip(h.buckets + ("+Inf",), h.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {h.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {h.count}")
+    return lines
+
+
+def _counter_lines(name: str, values: dict, label_names: tuple, kind: str = "counter") -> list:
+    lines = [f"# TYPE {name} {kind}"]
+    for key, value in sorted(values.items()):
+        key = key if isinstance(key, tuple) else (key,)
+        lines.append(f"{name}{_labels(dict(zip(label_names, key)))} {value}")
+    return lines
+
+
+def render() -> str:
+    lines = []
+    lines += _counter_lines("http_requests_total", requests_total, ("method", "route", "status"))
+    lines += _histogram_lines("http_request_duration_seconds", request_latency)
+    lines += _histogram_lines("http_request_db_queries", request_queries)
+    lines += _counter_lines("db_queries_total", db_queries, ("route",))
+    lines += _counter_lines("db_query_seconds_total", db_seconds, ("route",))
+    lines += _counter_lines("db_slow_queries_total", slow_queries, ("route",))
+    lines += _counter_lines("db_query_budget_exceeded_total", budget_violations, ("method", "route"))
+
+    collected = {}
+    for collect in _collectors:
+        for name, kind, labels, value in collect():
+            collected.setdefault((name, kind), []).append((labels, value))
+    for (name, kind), samples in collected.items():
+        lines.append(f"# TYPE {name} {kind}")
+        lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,82 @@
+"""hot path indexes
+
+Составные индексы и уникальные ограничения для горячих выборок main.py.
+Перед созданием ограничений удаляются дубли, которые могли появиться из-за
+гонок check-then-insert.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 17:40:59
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "DELETE FROM track_participants WHERE id NOT IN "
+        "(SELECT MIN(id) FROM track_participants GROUP BY track_id, user_id)"
+    )
+    # Ревью дублирующих решений переносим на оставшееся решение того же автора
+    op.execute(
+        "UPDATE reviews SET submission_id = ("
+        "SELECT MIN(s2.id) FROM submissions s1 JOIN submissions s2 "
+        "ON s2.assignment_id = s1.assignment_id AND s2.user_id = s1.user_id "
+        "WHERE s1.id = reviews.submission_id)"
+    )
+    op.execute(
+        "DELETE FROM submissions WHERE id NOT IN "
+        "(SELECT MIN(id) FROM submissions GROUP BY assignment_id, user_id)"
+    )
+    op.execute(
+        "DELETE FROM reviews WHERE id NOT IN "
+        "(SELECT MIN(id) FROM reviews GROUP BY submission_id, reviewer_id)"
+    )
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.create_index('ix_assignments_track_order', ['track_id', 'order'], unique=False)
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.create_index('ix_comments_assignment_created', ['assignment_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_reviews_reviewer_id'), ['reviewer_id'], unique=False)
+        batch_op.create_unique_constraint(batch_op.f('uq_reviews_submission_id_reviewer_id'), ['submission_id', 'reviewer_id'])
+
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.create_unique_constraint(batch_op.f('uq_submissions_assignment_id_user_id'), ['assignment_id', 'user_id'])
+
+    with op.batch_alter_table('track_participants', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_track_participants_user_id'), ['user_id'], unique=False)
+        batch_op.create_unique_constraint(batch_op.f('uq_track_participants_track_id_user_id'), ['track_id', 'user_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('track_participants', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('uq_track_participants_track_id_user_id'), type_='unique')
+        batch_op.drop_index(batch_op.f('ix_track_participants_user_id'))
+
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('uq_submissions_assignment_id_user_id'), type_='unique')
+
+    with op.batch_alter_table('reviews', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('uq_reviews_submission_id_reviewer_id'), type_='unique')
+        batch_op.drop_index(batch_op.f('ix_reviews_reviewer_id'))
+
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_assignment_created')
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.drop_index('ix_assignments_track_order')
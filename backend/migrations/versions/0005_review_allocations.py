@@ -0,0 +1,67 @@
+"""review allocations
+
+Очередь ревью, распределяемая после дедлайна, и счётчик полученных ревью
+у решений. Счётчик заполняется по существующим ревью.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 17:44:36
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('review_allocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('assignment_id', sa.Integer(), nullable=True),
+    sa.Column('reviewer_id', sa.Integer(), nullable=True),
+    sa.Column('submission_id', sa.Integer(), nullable=True),
+    sa.Column('position', sa.Integer(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['assignment_id'], ['assignments.id'], name=op.f('fk_review_allocations_assignment_id_assignments')),
+    sa.ForeignKeyConstraint(['reviewer_id'], ['users.id'], name=op.f('fk_review_allocations_reviewer_id_users')),
+    sa.ForeignKeyConstraint(['submission_id'], ['submissions.id'], name=op.f('fk_review_allocations_submission_id_submissions')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_review_allocations')),
+    sa.UniqueConstraint('reviewer_id', 'submission_id', name=op.f('uq_review_allocations_reviewer_id_submission_id'))
+    )
+    with op.batch_alter_table('review_allocations', schema=None) as batch_op:
+        batch_op.create_index('ix_review_allocations_queue', ['assignment_id', 'reviewer_id', 'position'], unique=False)
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reviews_allocated_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_index('ix_submissions_assignment_coverage', ['assignment_id', 'review_count'], unique=False)
+
+    op.execute(
+        "UPDATE submissions SET review_count = "
+        "(SELECT COUNT(*) FROM reviews WHERE reviews.submission_id = submissions.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_index('ix_submissions_assignment_coverage')
+        batch_op.drop_column('review_count')
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.drop_column('reviews_allocated_at')
+
+    with op.batch_alter_table('review_allocations', schema=None) as batch_op:
+        batch_op.drop_index('ix_review_allocations_queue')
+
+    op.drop_table('review_allocations')
@@ -0,0 +1,94 @@
+"""scheduled jobs
+
+Абсолютные дедлайны заданий и очередь задач планировщика. Для уже начатых
+треков дедлайны вычисляются, а переходы по ещё не распределённым заданиям
+ставятся в очередь — прошедшие выполнятся при первом запуске планировщика.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 17:50:21
+
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('scheduled_jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(), nullable=True),
+    sa.Column('target_id', sa.Integer(), nullable=True),
+    sa.Column('due_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_by', sa.String(), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_scheduled_jobs')),
+    sa.UniqueConstraint('kind', 'target_id', name=op.f('uq_scheduled_jobs_kind_target_id'))
+    )
+    with op.batch_alter_table('scheduled_jobs', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_scheduled_jobs_due_at'), ['due_at'], unique=False)
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('deadline_at', sa.DateTime(), nullable=True))
+
+    _backfill()
+
+
+def _backfill():
+    bind = op.get_bind()
+    tracks = sa.table('tracks', sa.column('id', sa.Integer), sa.column('started_at', sa.DateTime))
+    assignments = sa.table(
+        'assignments', sa.column('id', sa.Integer), sa.column('track_id', sa.Integer),
+        sa.column('deadline_days', sa.Integer), sa.column('deadline_at', sa.DateTime),
+        sa.column('reviews_allocated_at', sa.DateTime)
+    )
+    jobs = sa.table(
+        'scheduled_jobs', sa.column('kind', sa.String), sa.column('target_id', sa.Integer),
+        sa.column('due_at', sa.DateTime)
+    )
+    rows = bind.execute(sa.select(
+        assignments.c.id, assignments.c.deadline_days, assignments.c.reviews_allocated_at, tracks.c.started_at
+    ).join(tracks, tracks.c.id == assignments.c.track_id).where(tracks.c.started_at.isnot(None))).all()
+
+    now = datetime.utcnow()
+    deadlines = []
+    pending = []
+    for assignment_id, deadline_days, allocated_at, started_at in rows:
+        deadline = started_at + timedelta(days=deadline_days)
+        deadlines.append({"b_id": assignment_id, "deadline_at": deadline})
+        if allocated_at is None:
+            pending.append({"kind": "assignment_deadline", "target_id": assignment_id, "due_at": deadline})
+        warning_at = deadline - timedelta(days=3)
+        if warning_at > now:
+            pending.append({"kind": "deadline_warning", "target_id": assignment_id, "due_at": warning_at})
+
+    if deadlines:
+        bind.execute(
+            assignments.update().where(assignments.c.id == sa.bindparam('b_id')).values(deadline_at=sa.bindparam('deadline_at')),
+            deadlines
+        )
+    if pending:
+        bind.execute(jobs.insert(), pending)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.drop_column('deadline_at')
+
+    with op.batch_alter_table('scheduled_jobs', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_scheduled_jobs_due_at'))
+
+    op.drop_table('scheduled_jobs')
@@ -0,0 +1,38 @@
+"""track participant count
+
+Счётчик участников трека для условных UPDATE при записи. Заполняется по
+существующим участникам.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 18:05:12
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('tracks', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('participant_count', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute(
+        "UPDATE tracks SET participant_count = "
+        "(SELECT COUNT(*) FROM track_participants WHERE track_participants.track_id = tracks.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('tracks', schema=None) as batch_op:
+        batch_op.drop_column('participant_count')
@@ -0,0 +1,90 @@
+"""score rollups
+
+Агрегаты оценок (число, сумма, среднее, сумма квадратов отклонений) для
+решений, участников треков и заданий, и индекс лидерборда. Агрегаты
+заполняются по существующим ревью; то же делает `python scores.py rebuild`.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 18:07:17
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Откуда берутся оценки для строки каждой таблицы
+ROLLUP_SOURCES = {
+    "submissions": "FROM reviews r WHERE r.submission_id = submissions.id",
+    "assignments": (
+        "FROM reviews r JOIN submissions s ON s.id = r.submission_id "
+        "WHERE s.assignment_id = assignments.id"
+    ),
+    "track_participants": (
+        "FROM reviews r JOIN submissions s ON s.id = r.submission_id "
+        "JOIN assignments a ON a.id = s.assignment_id "
+        "WHERE a.track_id = track_participants.track_id AND s.user_id = track_participants.user_id"
+    ),
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_sum', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_mean', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_m2', sa.Float(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('score_sum', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_mean', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_m2', sa.Float(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('track_participants', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_sum', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_mean', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('score_m2', sa.Float(), server_default='0', nullable=False))
+        batch_op.create_index('ix_track_participants_leaderboard', ['track_id', 'score_mean', 'review_count', 'user_id'], unique=False)
+
+    for table, source in ROLLUP_SOURCES.items():
+        op.execute(
+            f"UPDATE {table} SET review_count = (SELECT COUNT(r.score) {source}), "
+            f"score_sum = (SELECT COALESCE(SUM(r.score), 0) {source}), "
+            f"score_m2 = (SELECT COALESCE(SUM(r.score * r.score), 0) {source})"
+        )
+        # score_m2 пока хранит сумму квадратов
+        op.execute(
+            f"UPDATE {table} SET score_mean = score_sum / review_count, "
+            f"score_m2 = score_m2 - score_sum * score_sum / review_count WHERE review_count > 0"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('track_participants', schema=None) as batch_op:
+        batch_op.drop_index('ix_track_participants_leaderboard')
+        batch_op.drop_column('score_m2')
+        batch_op.drop_column('score_mean')
+        batch_op.drop_column('score_sum')
+        batch_op.drop_column('review_count')
+
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_column('score_m2')
+        batch_op.drop_column('score_mean')
+        batch_op.drop_column('score_sum')
+
+    with op.batch_alter_table('assignments', schema=None) as batch_op:
+        batch_op.drop_column('score_m2')
+        batch_op.drop_column('score_mean')
+        batch_op.drop_column('score_sum')
+        batch_op.drop_column('review_count')
@@ -0,0 +1,41 @@
+"""submission status
+
+Статус проверки ссылки на репозиторий. Существующие решения получают
+pending и проверяются воркерами repo_check.py после запуска.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 18:19:30
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(), server_default='pending', nullable=False))
+        batch_op.add_column(sa.Column('status_detail', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('checked_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('repository_meta', sa.Text(), nullable=True))
+        batch_op.create_index('ix_submissions_status', ['status', 'checked_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('submissions', schema=None) as batch_op:
+        batch_op.drop_index('ix_submissions_status')
+        batch_op.drop_column('repository_meta')
+        batch_op.drop_column('checked_at')
+        batch_op.drop_column('status_detail')
+        batch_op.drop_column('status')
@@ -0,0 +1,45 @@
+"""notification available_at
+
+Курсор since у GET /notifications переходит с visible_at на available_at =
+max(visible_at, время записи). Существующим строкам он считается от момента
+миграции, так что клиенты один раз перечитают уже видимые уведомления.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 18:37:46
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('available_at', sa.DateTime(), nullable=True))
+        batch_op.drop_index(batch_op.f('ix_notifications_user_visible'))
+        batch_op.create_index('ix_notifications_user_available', ['user_id', 'available_at'], unique=False)
+
+    notifications = sa.table('notifications', sa.column('visible_at', sa.DateTime()), sa.column('available_at', sa.DateTime()))
+    now = datetime.utcnow()
+    op.execute(notifications.update().values(available_at=sa.case(
+        (notifications.c.visible_at > now, notifications.c.visible_at), else_=now
+    )))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('notifications', schema=None) as batch_op:
+        batch_op.drop_index('ix_notifications_user_available')
+        batch_op.create_index(batch_op.f('ix_notifications_user_visible'), ['user_id', 'visible_at'], unique=False)
+        batch_op.drop_column('available_at')
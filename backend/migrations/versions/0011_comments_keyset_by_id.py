@@ -0,0 +1,36 @@
+"""comments keyset by id
+
+Комментарии листаются и опрашиваются по id, а не по (created_at, id):
+created_at ставится до commit, и курсор по нему пропускал комментарии.
+Курсоры старого формата сервер отклоняет с 400.
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 18:55:47
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_comments_assignment_created'))
+        batch_op.create_index('ix_comments_assignment_id', ['assignment_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('comments', schema=None) as batch_op:
+        batch_op.drop_index('ix_comments_assignment_id')
+        batch_op.create_index(batch_op.f('ix_comments_assignment_created'), ['assignment_id', 'created_at'], unique=False)
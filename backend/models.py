@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -19,54 +19,146 @@ class Track(Base):
     criteria = Column(Text)  # JSON строка с критериями оценки
     created_at = Column(DateTime, default=datetime.utcnow)
     started_at = Column(DateTime, nullable=True)
+    # Меняется только условными UPDATE в participation.py
+    participant_count = Column(Integer, default=0, server_default="0", nullable=False)
     participants = relationship("TrackParticipant", back_populates="track")
     assignments = relationship("Assignment", back_populates="track")
 
 class TrackParticipant(Base):
     __tablename__ = "track_participants"
+    __table_args__ = (
+        UniqueConstraint("track_id", "user_id"),
+        Index("ix_track_participants_leaderboard", "track_id", "score_mean", "review_count", "user_id"),
+    )
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     track_id = Column(Integer, ForeignKey("tracks.id"))
     joined_at = Column(DateTime, default=datetime.utcnow)
+    # Оценки, полученные решениями участника в этом треке
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)
+    score_sum = Column(Float, default=0, server_default="0", nullable=False)
+    score_mean = Column(Float, default=0, server_default="0", nullable=False)
+    score_m2 = Column(Float, default=0, server_default="0", nullable=False)  # для дисперсии, см. scores.py
     user = relationship("User")
     track = relationship("Track", back_populates="participants")
 
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        Index("ix_assignments_track_order", "track_id", "order"),
+    )
     id = Column(Integer, primary_key=True)
     track_id = Column(Integer, ForeignKey("tracks.id"))
     title = Column(String)
     description = Column(Text)
     deadline_days = Column(Integer)  # дней на выполнение
     order = Column(Integer)  # порядок в треке
+    deadline_at = Column(DateTime, nullable=True)  # started_at трека + deadline_days, задаётся при старте
+    reviews_allocated_at = Column(DateTime, nullable=True)  # когда распределены ревью после дедлайна
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)
+    score_sum = Column(Float, default=0, server_default="0", nullable=False)
+    score_mean = Column(Float, default=0, server_default="0", nullable=False)
+    score_m2 = Column(Float, default=0, server_default="0", nullable=False)  # для дисперсии, см. scores.py
     track = relationship("Track", back_populates="assignments")
     submissions = relationship("Submission", back_populates="assignment")
 
 class Submission(Base):
     __tablename__ = "submissions"
+    __table_args__ = (
+        UniqueConstraint("assignment_id", "user_id"),
+        Index("ix_submissions_assignment_coverage", "assignment_id", "review_count"),
+        Index("ix_submissions_status", "status", "checked_at"),
+    )
     id = Column(Integer, primary_key=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     repository_url = Column(String)
     submitted_at = Column(DateTime, default=datetime.utcnow)
+    review_count = Column(Integer, default=0, server_default="0", nullable=False)  # сколько ревью получено
+    score_sum = Column(Float, default=0, server_default="0", nullable=False)
+    score_mean = Column(Float, default=0, server_default="0", nullable=False)
+    score_m2 = Column(Float, default=0, server_default="0", nullable=False)
+    # Проверка ссылки на репозиторий, см. repo_check.py: pending / valid / invalid / unreachable / error
+    status = Column(String, default="pending", server_default="pending", nullable=False)
+    status_detail = Column(String, nullable=True)
+    checked_at = Column(DateTime, nullable=True)
+    repository_meta = Column(Text, nullable=True)  # JSON с метаданными репозитория
     assignment = relationship("Assignment", back_populates="submissions")
     reviews = relationship("Review", back_populates="submission")
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        UniqueConstraint("submission_id", "reviewer_id"),
+    )
     id = Column(Integer, primary_key=True)
     submission_id = Column(Integer, ForeignKey("submissions.id"))
-    reviewer_id = Column(Integer, ForeignKey("users.id"))
+    reviewer_id = Column(Integer, ForeignKey("users.id"), index=True)
     score = Column(Float)
     comment = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
     submission = relationship("Submission", back_populates="reviews")
 
+class ReviewAllocation(Base):
+    """Решение, назначенное ревьюеру при распределении после дедлайна."""
+    __tablename__ = "review_allocations"
+    __table_args__ = (
+        UniqueConstraint("reviewer_id", "submission_id"),
+        Index("ix_review_allocations_queue", "assignment_id", "reviewer_id", "position"),
+    )
+    id = Column(Integer, primary_key=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"))
+    reviewer_id = Column(Integer, ForeignKey("users.id"))
+    submission_id = Column(Integer, ForeignKey("submissions.id"))
+    position = Column(Integer)  # порядок выдачи ревьюеру
+    completed_at = Column(DateTime, nullable=True)
+    submission = relationship("Submission")
+
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_assignment_id", "assignment_id", "id"),
+    )
     id = Column(Integer, primary_key=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     text = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (
+        UniqueConstraint("user_id", "assignment_id", "type"),
+        Index("ix_notifications_user_available", "user_id", "available_at"),
+    )
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    assignment_id = Column(Integer, ForeignKey("assignments.id"))
+    type = Column(String)  # deadline_warning / code_review
+    deadline = Column(DateTime)
+    visible_at = Column(DateTime)  # с какого момента уведомление показывается
+    available_at = Column(DateTime)  # max(visible_at, время записи) — по нему идёт курсор since
+    expires_at = Column(DateTime, nullable=True)  # после этого момента не показывается
+    assignment = relationship("Assignment")
+
+class ScheduledJob(Base):
+    """Отложенная задача планировщика; выполненные задачи удаляются."""
+    __tablename__ = "scheduled_jobs"
+    __table_args__ = (
+        UniqueConstraint("kind", "target_id"),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String)
+    target_id = Column(Integer)
+    due_at = Column(DateTime, index=True)
+    locked_by = Column(String, nullable=True)
+    locked_until = Column(DateTime, nullable=True)  # аренда воркера; после истечения задачу берёт другой
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    last_error = Column(Text, nullable=True)
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    jti = Column(String, primary_key=True)
+    expires_at = Column(DateTime, index=True)  # после истечения токена запись можно удалять
+    revoked_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,178 @@
+"""Материализованные уведомления.
+
+События считаются один раз — при старте трека, отправке решения и ревью —
+и хранятся по пользователям, поэтому GET /notifications делает одно чтение
+по индексу (user_id, available_at) вместо обхода всех треков и заданий.
+
+available_at — момент, с которого уведомление доступно клиенту: visible_at,
+но не раньше записи строки. Курсор since сравнивается с ним, а не с
+visible_at: предупреждение, записанное уже после своего visible_at (старт
+трека за два дня до дедлайна, rebuild), иначе оказалось бы позади курсора
+клиента и не пришло бы никогда.
+
+Пересборка из существующих данных:
+    python notifications.py rebuild
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import upsert_insert
+from models import Track, TrackParticipant, Assignment, Submission, Notification
+from progress import reviewed_by
+
+DEADLINE_WARNING = "deadline_warning"
+CODE_REVIEW = "code_review"
+
+# Предупреждение показывается, пока до дедлайна 0..2 полных дня
+DEADLINE_WARNING_DAYS = 2
+
+
+def warning_visible_at(deadline: datetime) -> datetime:
+    return deadline - timedelta(days=DEADLINE_WARNING_DAYS + 1)
+
+
+def _deadline_warning_row(user_id: int, assignment_id: int, deadline: datetime, now: datetime) -> dict:
+    visible_at = warning_visible_at(deadline)
+    return {
+        "user_id": user_id,
+        "assignment_id": assignment_id,
+        "type": DEADLINE_WARNING,
+        "deadline": deadline,
+        "visible_at": visible_at,
+        "available_at": max(visible_at, now),
+        "expires_at": deadline,
+    }
+
+
+def _code_review_row(user_id: int, assignment_id: int, deadline: datetime, now: datetime) -> dict:
+    return {
+        "user_id": user_id,
+        "assignment_id": assignment_id,
+        "type": CODE_REVIEW,
+        "deadline": deadline,
+        "visible_at": deadline,
+        "available_at": max(deadline, now),
+        "expires_at": None,
+    }
+
+
+async def on_track_started(db: AsyncSession, track: Track) -> list:
+    """Предупреждения о дедлайнах для всех участников и заданий трека.
+
+    Дедлайны заданий к этому моменту уже записаны (scheduler.schedule_track).
+    Возвращает id участников, чтобы вызывающий код мог разослать push-события.
+    """
+    user_ids = list(await db.scalars(select(TrackParticipant.user_id).filter(
+        TrackParticipant.track_id == track.id
+    )))
+    assignments = (await db.execute(select(Assignment.id, Assignment.deadline_at).filter(
+        Assignment.track_id == track.id
+    ))).all()
+    now = datetime.utcnow()
+    rows = [
+        _deadline_warning_row(user_id, assn.id, assn.deadline_at, now)
+        for user_id in user_ids
+        for assn in assignments
+    ]
+    if rows:
+        await db.execute(upsert_insert(db, Notification).on_conflict_do_nothing(
+            index_elements=["user_id", "assignment_id", "type"]
+        ), rows)
+    return user_ids
+
+
+async def on_submission(db: AsyncSession, user_id: int, assignment: Assignment):
+    """После дедлайна автору решения нужно провести код-ривью."""
+    await db.execute(upsert_insert(db, Notification).values(
+        **_code_review_row(user_id, assignment.id, assignment.deadline_at, datetime.utcnow())
+    ).on_conflict_do_nothing(index_elements=["user_id", "assignment_id", "type"]))
+
+
+async def on_review(db: AsyncSession, reviewer_id: int, assignment_id: int):
+    """Ревью по заданию проведено — напоминание больше не нужно."""
+    await db.execute(delete(Notification).filter(
+        Notification.user_id == reviewer_id,
+        Notification.assignment_id == assignment_id,
+        Notification.type == CODE_REVIEW
+    ))
+
+
+async def get_active(db: AsyncSession, user_id: int, since: datetime = None, now: datetime = None):
+    """Активные уведомления; since — наибольший available_at из уже полученных."""
+    now = now or datetime.utcnow()
+    query = select(Notification, Assignment.title).join(
+        Assignment, Assignment.id == Notification.assignment_id
+    ).filter(
+        Notification.user_id == user_id,
+        Notification.available_at <= now,
+        or_(Notification.expires_at.is_(None), Notification.expires_at > now)
+    )
+    if since is not None:
+        query = query.filter(Notification.available_at > since)
+
+    result = []
+    for notification, title in await db.execute(query.order_by(Notification.available_at, Notification.id)):
+        if notification.type == DEADLINE_WARNING:
+            days_left = (notification.deadline - now).days
+            message = f"Assignment '{title}' deadline in {days_left} days"
+        else:
+            message = f"Code review started for '{title}'"
+        result.append({
+            "id": notification.id,
+            "type": notification.type,
+            "message": message,
+            "assignment_id": notification.assignment_id,
+            "created_at": notification.visible_at,
+            "available_at": notification.available_at
+        })
+    return result
+
+
+async def rebuild(db: AsyncSession):
+    """Пересобирает таблицу уведомлений из треков, решений и ревью."""
+    await db.execute(delete(Notification))
+    now = datetime.utcnow()
+
+    warnings = await db.execute(select(
+        TrackParticipant.user_id, Assignment.id, Assignment.deadline_at
+    ).join(Assignment, Assignment.track_id == TrackParticipant.track_id).filter(
+        Assignment.deadline_at.isnot(None)
+    ))
+    rows = [
+        _deadline_warning_row(user_id, assignment_id, deadline, now)
+        for user_id, assignment_id, deadline in warnings
+    ]
+
+    reviews = await db.execute(select(
+        Submission.user_id, Assignment.id, Assignment.deadline_at
+    ).join(Assignment, Assignment.id == Submission.assignment_id).filter(
+        Assignment.deadline_at.isnot(None), ~reviewed_by(Submission.user_id, Submission.assignment_id)
+    ))
+    rows += [
+        _code_review_row(user_id, assignment_id, deadline, now)
+        for user_id, assignment_id, deadline in reviews
+    ]
+
+    if rows:
+        await db.execute(insert(Notification), rows)
+    await db.commit()
+    return len(rows)
+
+
+async def _main():
+    from database import AsyncSessionLocal, dispose_engines
+    try:
+        async with AsyncSessionLocal() as db:
+            print(f"Rebuilt {await rebuild(db)} notifications")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python notifications.py rebuild")
+    asyncio.run(_main())
@@ -0,0 +1,183 @@
+"""Запись на трек и выход из него.
+
+Число участников хранится в tracks.participant_count и меняется только
+условными UPDATE: место занимается, пока трек не начался и счётчик меньше
+квоты, поэтому при любом числе параллельных запросов участников не больше
+quota. Старт — ещё один условный UPDATE (started_at IS NULL, счётчик набрал
+квоту): его выполняет ровно один запрос, и только он ставит в очередь
+дедлайны и уведомления.
+
+Проверка на 1000 одновременных записях при квоте 50:
+    python participation.py stress 1000 50
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import upsert_insert
+from models import Track, TrackParticipant
+import notifications
+import scheduler
+
+
+class JoinError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def _rejection(db: AsyncSession, track_id: int, user_id: int) -> JoinError:
+    """Почему условный UPDATE не прошёл: трека нет, пользователь уже записан, трек начался или мест нет."""
+    track = await db.get(Track, track_id)
+    if track is None:
+        return JoinError(404, "Track not found")
+    # Участник занял одно из мест, поэтому на заполненном или начавшемся треке тоже получает отказ UPDATE
+    if await db.scalar(select(TrackParticipant.id).filter(
+        TrackParticipant.track_id == track_id, TrackParticipant.user_id == user_id
+    )):
+        return JoinError(400, "Already joined")
+    if track.started_at:
+        return JoinError(400, "Track already started")
+    return JoinError(400, "Track is full")
+
+
+async def join(db: AsyncSession, track_id: int, user_id: int, now: datetime = None) -> list:
+    """Записывает пользователя на трек; commit на вызывающей стороне.
+
+    Возвращает id участников, если эта запись начала трек, иначе [].
+    Транзакция начинается с записи, поэтому в SQLite она не упирается в
+    устаревший снимок, а в PostgreSQL строка трека блокируется до commit.
+    """
+    now = now or datetime.utcnow()
+    seat = await db.execute(update(Track).where(
+        Track.id == track_id,
+        Track.started_at.is_(None),
+        Track.participant_count < Track.quota
+    ).values(participant_count=Track.participant_count + 1))
+    if seat.rowcount == 0:
+        raise await _rejection(db, track_id, user_id)
+
+    # Уникальность (track_id, user_id) защищает от двойной записи при параллельных запросах
+    inserted = await db.execute(upsert_insert(db, TrackParticipant).values(
+        user_id=user_id, track_id=track_id, joined_at=now
+    ).on_conflict_do_nothing(index_elements=["track_id", "user_id"]))
+    if inserted.rowcount == 0:
+        # Откат возвращает занятое место
+        await db.rollback()
+        raise JoinError(400, "Already joined")
+
+    started = await db.execute(update(Track).where(
+        Track.id == track_id,
+        Track.started_at.is_(None),
+        Track.participant_count >= Track.quota
+    ).values(started_at=now))
+    if started.rowcount == 0:
+        return []
+
+    track = await db.get(Track, track_id)
+    await scheduler.schedule_track(db, track)
+    return await notifications.on_track_started(db, track)
+
+
+async def leave(db: AsyncSession, track_id: int, user_id: int):
+    """Снимает пользователя с ещё не начавшегося трека; commit на вызывающей стороне."""
+    released = await db.execute(update(Track).where(
+        Track.id == track_id,
+        Track.started_at.is_(None),
+        Track.participant_count > 0
+    ).values(participant_count=Track.participant_count - 1))
+    if released.rowcount == 0:
+        track = await db.get(Track, track_id)
+        if track is None:
+            raise JoinError(404, "Track not found")
+        if track.started_at:
+            raise JoinError(400, "Cannot leave started track")
+        raise JoinError(404, "Not a participant")
+
+    deleted = await db.execute(delete(TrackParticipant).where(
+        TrackParticipant.track_id == track_id,
+        TrackParticipant.user_id == user_id
+    ))
+    if deleted.rowcount == 0:
+        await db.rollback()
+        raise JoinError(404, "Not a participant")
+
+
+async def stress(n_users: int, quota: int, url: str = None):
+    """n_users одновременных записей на трек с квотой quota.
+
+    По умолчанию — временная база SQLite; url — пустая база, например PostgreSQL.
+    """
+    from sqlalchemy import insert
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from database import Base, async_url, make_async_engine
+    from models import Assignment, ScheduledJob, User
+
+    tmpdir = None
+    if url is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        url = f"sqlite+aiosqlite:///{os.path.join(tmpdir.name, 'stress.db')}"
+    engine = make_async_engine(async_url(url))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async with session_factory() as db:
+        db.add(Track(id=1, title="stress", quota=quota))
+        db.add(Assignment(id=1, track_id=1, title="stress", deadline_days=7, order=1))
+        await db.execute(insert(User), [{"id": i, "email": f"u{i}@stress"} for i in range(1, n_users + 1)])
+        await db.commit()
+
+    outcomes = {}
+    starts = []
+
+    async def attempt(user_id: int):
+        async with session_factory() as db:
+            try:
+                participant_ids = await join(db, 1, user_id)
+                await db.commit()
+            except JoinError as e:
+                outcomes[e.detail] = outcomes.get(e.detail, 0) + 1
+                return
+            outcomes["joined"] = outcomes.get("joined", 0) + 1
+            if participant_ids:
+                starts.append(len(participant_ids))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(attempt(i) for i in range(1, n_users + 1)), return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    errors = [r for r in results if isinstance(r, Exception)]
+
+    async with session_factory() as db:
+        track = await db.get(Track, 1)
+        participants = await db.scalar(select(func.count(TrackParticipant.id)).filter(TrackParticipant.track_id == 1))
+        jobs = await db.scalar(select(func.count(ScheduledJob.id)))
+    await engine.dispose()
+    if tmpdir is not None:
+        tmpdir.cleanup()
+
+    print(f"joins: {n_users} concurrent, quota {quota}, {elapsed:.2f} s")
+    print(f"outcomes: {outcomes}, errors: {len(errors)} {errors[:3]}")
+    print(f"participants: {participants}, counter: {track.participant_count}, "
+          f"starts: {len(starts)}, scheduled jobs: {jobs}")
+    ok = (not errors and len(starts) == 1 and participants == track.participant_count == quota
+          and track.started_at is not None and starts[0] == quota)
+    print("OK" if ok else "FAILED")
+    return ok
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] != ["stress"]:
+        sys.exit("usage: python participation.py stress [USERS] [QUOTA] [DATABASE_URL]")
+    ok = asyncio.run(stress(int(args[1]) if len(args) > 1 else 1000,
+                            int(args[2]) if len(args) > 2 else 50,
+                            args[3] if len(args) > 3 else None))
+    sys.exit(0 if ok else 1)
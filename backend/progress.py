@@ -0,0 +1,84 @@
+"""Прогресс пользователя по треку.
+
+Для каждого задания трека — сдано ли решение и провёл ли пользователь ревью
+по этому заданию. Всё считается одним запросом и кэшируется в cache.py
+с тегом progress_tag(user_id, track_id); тег сбрасывается при отправке
+решения и ревью.
+"""
+from sqlalchemy import and_, exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from cache import cache
+from models import Assignment, Submission, Review
+
+
+def reviewed_by(user_id, assignment_id):
+    """EXISTS: пользователь написал ревью на чьё-то решение этого задания.
+
+    Аргументы — значения или колонки, так что условие годится и для
+    коррелированных подзапросов.
+    """
+    reviewed_submission = aliased(Submission)
+    return exists().where(and_(
+        Review.reviewer_id == user_id,
+        Review.submission_id == reviewed_submission.id,
+        reviewed_submission.assignment_id == assignment_id
+    ))
+
+
+def progress_query(user_id: int, track_id: int):
+    own = aliased(Submission)
+    return select(
+        Assignment, own.id, reviewed_by(user_id, Assignment.id).label("reviewed")
+    ).outerjoin(own, and_(
+        own.assignment_id == Assignment.id,
+        own.user_id == user_id
+    )).filter(Assignment.track_id == track_id).order_by(Assignment.order, Assignment.id)
+
+
+async def load_progress(db: AsyncSession, user_id: int, track_id: int) -> list:
+    rows = await db.execute(progress_query(user_id, track_id))
+
+    result = []
+    seen = set()
+    for assn, submission_id, reviewed in rows:
+        if assn.id in seen:
+            continue
+        seen.add(assn.id)
+        result.append({
+            "id": assn.id,
+            "title": assn.title,
+            "description": assn.description,
+            "deadline_days": assn.deadline_days,
+            "order": assn.order,
+            "submitted": submission_id is not None,
+            "reviewed": bool(reviewed),
+        })
+    return result
+
+
+def progress_tag(user_id: int, track_id: int) -> str:
+    return f"progress:{user_id}:{track_id}"
+
+
+async def get_progress(db: AsyncSession, user_id: int, track_id: int) -> list:
+    return await cache.get_or_load(
+        "progress", {"user_id": user_id, "track_id": track_id},
+        lambda: load_progress(db, user_id, track_id),
+        tags=[progress_tag(user_id, track_id)]
+    )
+
+
+async def invalidate(user_id: int, track_id: int):
+    await cache.invalidate(progress_tag(user_id, track_id))
+
+
+def unlocked(progress: list) -> list:
+    """Первое задание открыто всегда, следующее — после сдачи и ревью предыдущего."""
+    result = []
+    for item in progress:
+        result.append(item)
+        if not (item["submitted"] and item["reviewed"]):
+            break
+    return result
@@ -0,0 +1,183 @@
+"""Проверка бюджетов SQL-запросов по эндпоинтам.
+
+Проходит основной сценарий (регистрация, треки, решения, ревью, комментарии)
+через TestClient на временной SQLite-базе и печатает, сколько запросов
+потребовал каждый маршрут. Завершается с кодом 1, если какой-то маршрут
+превысил бюджет из query_budget(...) — так N+1 ловится до выкладки:
+    python query_budget.py
+
+Отдельно проверяется, что GET /me/dashboard не дорожает с ростом числа
+треков пользователя: число запросов (X-Query-Count) при 1, 5 и 20 треках
+должно совпадать.
+
+Те же проверки под pytest — tests/test_query_budget.py и tests/test_dashboard.py.
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if __name__ == "__main__":
+    # Под pytest окружение задаёт tests/conftest.py
+    _tmpdir = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmpdir.name, 'budget.db')}"
+    os.environ["SCHEDULER_ENABLED"] = "0"
+    # Превышения собираются в metrics.budget_violations, сценарий доходит до конца
+    os.environ["QUERY_BUDGET_MODE"] = "warn"
+    os.environ["QUERY_COUNT_HEADER"] = "1"
+    os.environ["CACHE_URL"] = ""
+    os.environ["REPO_FETCHER"] = "fake"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+
+import metrics
+from database import get_engine
+from models import Assignment
+
+engine = get_engine()
+
+PARTICIPANTS = 4
+DASHBOARD_ENROLMENTS = (1, 5, 20)
+
+
+def run_scenario(client: TestClient, scheduler_run_due):
+    def call(method, url, **kwargs):
+        response = client.request(method, url, **kwargs)
+        assert response.status_code < 500, (method, url, response.status_code, response.text)
+        return response
+
+    headers = []
+    for i in range(PARTICIPANTS):
+        email = f"user{i}@budget.example.com"
+        call("POST", "/register", json={"email": email, "password": "password"})
+        tokens = call("POST", "/token", data={"username": email, "password": "password"}).json()
+        headers.append({"Authorization": f"Bearer {tokens['access_token']}"})
+    owner = headers[0]
+    refreshed = call("POST", "/token/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    headers[-1] = {"Authorization": f"Bearer {refreshed['access_token']}"}
+
+    track = {
+        "title": "Budget", "description": "d", "quota": PARTICIPANTS, "criteria": "c",
+        "assignments": [
+            {"title": f"Task {j}", "description": "d", "deadline_days": 1, "order": j} for j in range(1, 6)
+        ],
+    }
+    track_id = call("POST", "/tracks", headers=owner, json=track).json()["id"]
+    other_id = call("POST", "/tracks", headers=owner, json={**track, "title": "Other"}).json()["id"]
+    catalogue = "".join(json.dumps({**track, "title": f"Imported {i}"}) + "\n" for i in range(20))
+    call("POST", "/tracks/import", headers=owner, files={"file": ("tracks.jsonl", io.BytesIO(catalogue.encode()))})
+    call("GET", "/tracks", headers=owner)
+
+    call("POST", f"/tracks/{other_id}/join", headers=owner)
+    call("POST", f"/tracks/{other_id}/leave", headers=owner)
+    for h in headers:
+        call("POST", f"/tracks/{track_id}/join", headers=h)
+    assignments = call("GET", f"/tracks/{track_id}/assignments", headers=owner).json()
+    assignment_id = assignments[0]["id"]
+
+    for h in headers:
+        call("POST", f"/assignments/{assignment_id}/submit", headers=h, json={"repository_url": "https://example.com/r"})
+        call("POST", f"/assignments/{assignment_id}/comments", headers=h, json={"text": "progress"})
+    call("GET", f"/assignments/{assignment_id}/submission", headers=owner)
+    call("GET", f"/assignments/{assignment_id}/comments", headers=owner)
+    call("GET", f"/assignments/{assignment_id}/comments/export", headers=owner)
+
+    # «Перематываем» к дедлайну: задачи планировщика выполняются так же, как в фоне
+    with engine.begin() as conn:
+        conn.execute(update(Assignment).where(Assignment.id == assignment_id).values(
+            deadline_at=datetime.utcnow() - timedelta(minutes=1)
+        ))
+    client.portal.call(scheduler_run_due, datetime.utcnow() + timedelta(days=2))
+
+    for h in headers:
+        work = call("GET", f"/assignments/{assignment_id}/review", headers=h).json()
+        if "submission_id" in work:
+            call("POST", f"/submissions/{work['submission_id']}/review", headers=h, json={"score": 4, "comment": ""})
+    call("GET", f"/tracks/{track_id}/assignments", headers=owner)
+    call("GET", f"/tracks/{track_id}/leaderboard", headers=owner)
+    call("GET", "/notifications", headers=owner)
+    call("GET", "/tracks/export", headers=owner)
+    dashboard_queries = check_dashboard_scaling(call, headers)
+    call("POST", "/logout", headers=headers[1], json={})
+    return dashboard_queries
+
+
+def check_dashboard_scaling(call, headers) -> dict:
+    """Число запросов GET /me/dashboard при разном числе треков; треки стартуют, в них появляются задания."""
+    owner = headers[0]
+    imported = [t["id"] for t in call("GET", "/tracks", headers=owner, params={"limit": 200}).json()
+                if t["title"].startswith("Imported")]
+    # Основной трек сценария уже есть у пользователя
+    enrolled = 1
+    result = {}
+    for target in DASHBOARD_ENROLMENTS:
+        for track_id in imported[enrolled - 1:target - 1]:
+            for h in headers:
+                call("POST", f"/tracks/{track_id}/join", headers=h)
+        enrolled = max(enrolled, target)
+        etag = None
+        # Первый запрос прогревает кэш пользователя, считается второй
+        for _ in range(2):
+            response = call("GET", "/me/dashboard", headers=owner)
+            etag = response.headers["etag"]
+        assert len(response.json()["tracks"]) == target, response.json()
+        result[target] = int(response.headers["x-query-count"])
+        not_modified = call("GET", "/me/dashboard", headers={**owner, "If-None-Match": etag})
+        assert not_modified.status_code == 304, not_modified.status_code
+    return result
+
+
+def route_budgets() -> dict:
+    """(метод, путь) -> бюджет из query_budget(...)."""
+    import main as app_module
+
+    budgets = {}
+    # Маршруты API объявлены на main.router, app подключает его целиком
+    for route in app_module.router.routes:
+        dependant = getattr(route, "dependant", None)
+        for dependency in dependant.dependencies if dependant else ():
+            limit = getattr(dependency.call, "query_budget", None)
+            if limit is not None:
+                budgets.update({(method, route.path): limit for method in route.methods})
+    return budgets
+
+
+def measure() -> dict:
+    """Проходит сценарий; число запросов по маршрутам — в metrics.request_queries.
+
+    Возвращает число запросов GET /me/dashboard по числу треков пользователя.
+    """
+    # Схема — миграциями, как в рабочей базе и в tests/conftest.py
+    command.upgrade(Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")), "head")
+    import main as app_module
+
+    with TestClient(app_module.app) as client:
+        return run_scenario(client, app_module.job_scheduler.run_due)
+
+
+def main() -> int:
+    dashboard_queries = measure()
+    budgets = route_budgets()
+
+    for (method, route), histogram in sorted(metrics.request_queries.items()):
+        budget = budgets.get((method, route))
+        failed = (method, route) in metrics.budget_violations
+        print(f"{'FAIL' if failed else 'ok  '} {method:6} {route:45} max {histogram.max:3} queries, "
+              f"budget {budget if budget is not None else '-'}")
+
+    dashboard_constant = len(set(dashboard_queries.values())) == 1
+    print(f"{'ok  ' if dashboard_constant else 'FAIL'} GET    /me/dashboard by tracks enrolled: "
+          + ", ".join(f"{tracks} -> {queries} queries" for tracks, queries in dashboard_queries.items()))
+    return 1 if metrics.budget_violations or not dashboard_constant else 0
+
+
+if __name__ == "__main__":
+    code = main()
+    _tmpdir.cleanup()
+    sys.exit(code)
@@ -0,0 +1,334 @@
+"""Ограничение частоты запросов и контроль допуска.
+
+Лимиты — token bucket: ведро на (имя лимита, ключ) вмещает count токенов и
+пополняется со скоростью count / period в секунду, запрос тратит токен.
+Ключ — IP клиента или аккаунт (email при входе, id пользователя для
+записей). Вход ограничивается на пару (email, IP): чужие неудачные попытки
+с других адресов не блокируют владельца аккаунта; общий лимит на email
+намного выше и останавливает только распределённый перебор.
+
+Лимит задаётся строкой "count/period_seconds", пустая строка или "0"
+отключает его. При исчерпании — 429 с Retry-After.
+
+Бэкенды вёдер:
+    LocalBucketBackend   — в памяти процесса (по умолчанию);
+    MemorySharedBackend  — заменитель общего хранилища для тестов: состояние
+                           сериализуется, как при хранении в Redis;
+    RedisBucketBackend   — общие вёдра для нескольких воркеров (нужен пакет redis).
+
+AdmissionMiddleware сбрасывает нагрузку до обработки запроса: когда очередь
+пула потоков (bcrypt и threadpool Starlette) длиннее ADMISSION_QUEUE_LIMIT
+или пул соединений БД занят целиком, дорогие запросы (запись, выгрузки)
+получают 503 с Retry-After, а дешёвые чтения пропускаются, пока число
+запросов в работе не дошло до ADMISSION_MAX_IN_FLIGHT.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import anyio
+from fastapi import HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL", "")
+# Сколько вёдер держит локальный бэкенд; давно не использованные вытесняются
+RATE_LIMIT_KEYS = int(os.getenv("RATE_LIMIT_KEYS", "100000"))
+# За обратным прокси IP клиента берётся из последнего X-Forwarded-For
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "200"))
+# Доля ADMISSION_MAX_IN_FLIGHT, доступная дорогим запросам
+ADMISSION_EXPENSIVE_SHARE = float(os.getenv("ADMISSION_EXPENSIVE_SHARE", "0.5"))
+ADMISSION_QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", "32"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Потоки живут долго и не должны занимать места в лимите запросов в работе,
+# пробы балансировщика должны отвечать и под нагрузкой
+ADMISSION_EXEMPT = ("/metrics", "/notifications/stream", "/health/live", "/health/ready")
+
+
+class Limit:
+    def __init__(self, count: int, period: float):
+        self.count = count
+        self.period = period
+        self.rate = count / period
+
+    @classmethod
+    def parse(cls, value: str):
+        """"count/period_seconds" -> Limit; пустая строка или "0" — без лимита (None)."""
+        if not value or value == "0":
+            return None
+        count, _, period = value.partition("/")
+        return cls(int(count), float(period or 1))
+
+    def __repr__(self):
+        return f"Limit({self.count}/{self.period:g}s)"
+
+
+LOGIN_IP_LIMIT = Limit.parse(os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"))
+LOGIN_ACCOUNT_IP_LIMIT = Limit.parse(os.getenv("RATE_LIMIT_LOGIN_ACCOUNT_IP", "10/300"))
+LOGIN_ACCOUNT_LIMIT = Limit.parse(os.getenv("RATE_LIMIT_LOGIN_ACCOUNT", "200/300"))
+REGISTER_IP_LIMIT = Limit.parse(os.getenv("RATE_LIMIT_REGISTER_IP", "20/3600"))
+WRITE_USER_LIMIT = Limit.parse(os.getenv("RATE_LIMIT_WRITE_USER", "120/60"))
+
+
+def _refill(state, limit: Limit, now: float, cost: float):
+    """(tokens, updated_at) -> (новое состояние, разрешено, секунд до следующего токена)."""
+    tokens, updated = state if state is not None else (limit.count, now)
+    tokens = min(limit.count, tokens + max(0.0, now - updated) * limit.rate)
+    if tokens >= cost:
+        return (tokens - cost, now), True, 0.0
+    return (tokens, now), False, (cost - tokens) / limit.rate
+
+
+class BucketBackend:
+    async def take(self, key: str, limit: Limit, cost: float = 1) -> tuple:
+        """(разрешено, секунд до повтора)."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {}
+
+
+class LocalBucketBackend(BucketBackend):
+    def __init__(self, max_keys: int = RATE_LIMIT_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    async def take(self, key, limit, cost=1):
+        with self._lock:
+            state, allowed, retry_after = _refill(self._buckets.get(key), limit, time.monotonic(), cost)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            # Вытесненное ведро начнётся полным — то же, что простоявшее period секунд
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+    def stats(self):
+        return {"keys": len(self._buckets), "max_keys": self.max_keys}
+
+
+class MemorySharedBackend(BucketBackend):
+    """Заменитель общего хранилища: один словарь на все экземпляры с общим store."""
+
+    def __init__(self, store: dict = None):
+        self.store = {} if store is None else store
+
+    async def take(self, key, limit, cost=1):
+        raw = self.store.get(key)
+        state, allowed, retry_after = _refill(json.loads(raw) if raw else None, limit, time.time(), cost)
+        self.store[key] = json.dumps(state)
+        return allowed, retry_after
+
+    def stats(self):
+        return {"keys": len(self.store)}
+
+
+# Пополнение и списание одной командой на стороне Redis; время — часы Redis, общие для воркеров
+_TAKE_SCRIPT = """
+local count = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or count
+local updated = tonumber(state[2]) or now
+tokens = math.min(count, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(count / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketBackend(BucketBackend):
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_URL=redis://... requires the 'redis' package")
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key, limit, cost=1):
+        allowed, tokens = await self._take(keys=["ratelimit:" + key], args=[limit.count, limit.rate, cost])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / limit.rate
+
+
+def make_backend(url: str) -> BucketBackend:
+    if not url:
+        return LocalBucketBackend(RATE_LIMIT_KEYS)
+    if url == "memory://":
+        return MemorySharedBackend()
+    if url.startswith(("redis://", "rediss://")):
+        return RedisBucketBackend(url)
+    raise ValueError(f"Unsupported RATE_LIMIT_URL: {url}")
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+
+class RateLimiter:
+    def __init__(self, backend: BucketBackend, enabled: bool = RATE_LIMIT_ENABLED):
+        self.backend = backend
+        self.enabled = enabled
+        self._counters = {}  # имя -> [allowed, limited]
+
+    async def hit(self, name: str, key, limit: Limit, cost: float = 1):
+        """Тратит токен из ведра (name, key); при исчерпании — HTTPException 429."""
+        if not self.enabled or limit is None:
+            return
+        allowed, retry_after = await self.backend.take(f"{name}:{key}", limit, cost)
+        self._counters.setdefault(name, [0, 0])[0 if allowed else 1] += 1
+        if not allowed:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    def per_ip(self, name: str, limit: Limit):
+        """Зависимость FastAPI: лимит на IP клиента."""
+        async def check(request: Request):
+            await self.hit(name, client_ip(request), limit)
+        return check
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.stats(),
+            "limits": {name: {"allowed": allowed, "limited": limited}
+                       for name, (allowed, limited) in self._counters.items()},
+        }
+
+
+rate_limiter = RateLimiter(make_backend(RATE_LIMIT_URL))
+
+
+def classify(method: str, path: str) -> str:
+    if method in READ_METHODS and not path.endswith("/export"):
+        return CHEAP
+    return EXPENSIVE
+
+
+class AdmissionController:
+    """Решает, принять ли запрос, по числу запросов в работе и очередям пулов.
+
+    pressure — функция без аргументов, возвращающая {"threadpool_queue", "db_pool_in_use", "db_pool_size"}.
+    """
+
+    def __init__(self, pressure, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 expensive_share: float = ADMISSION_EXPENSIVE_SHARE, queue_limit: int = ADMISSION_QUEUE_LIMIT):
+        self.pressure = pressure
+        self.limits = {CHEAP: max_in_flight, EXPENSIVE: max(1, int(max_in_flight * expensive_share))}
+        self.queue_limit = queue_limit
+        self.in_flight = 0
+        self.admitted = {CHEAP: 0, EXPENSIVE: 0}
+        self.shed = {}  # (класс, причина) -> int
+
+    def overloaded(self) -> str:
+        """Причина перегрузки или None."""
+        pressure = self.pressure()
+        if pressure["threadpool_queue"] >= self.queue_limit:
+            return "threadpool_queue"
+        if pressure["db_pool_size"] and pressure["db_pool_in_use"] >= pressure["db_pool_size"]:
+            return "db_pool"
+        return None
+
+    def admit(self, kind: str) -> str:
+        """None, если запрос принят (in_flight увеличен), иначе причина отказа."""
+        if self.in_flight >= self.limits[kind]:
+            reason = "in_flight"
+        else:
+            # Дешёвые чтения не ждут пулов потоков и почти не держат соединение — их не сбрасываем
+            reason = self.overloaded() if kind == EXPENSIVE else None
+        if reason is not None:
+            self.shed[(kind, reason)] = self.shed.get((kind, reason), 0) + 1
+            return reason
+        self.in_flight += 1
+        self.admitted[kind] += 1
+        return None
+
+    def release(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "limits": self.limits,
+            "queue_limit": self.queue_limit,
+            "pressure": self.pressure(),
+            "admitted": self.admitted,
+            "shed": [{"class": kind, "reason": reason, "count": count}
+                     for (kind, reason), count in sorted(self.shed.items())],
+        }
+
+
+def pool_pressure(get_engine, password_hasher):
+    """Функция pressure для AdmissionController по пулу bcrypt, threadpool и пулу соединений get_engine()."""
+    def pressure() -> dict:
+        engine = get_engine()
+        pool = getattr(engine, "sync_engine", engine).pool
+        threadpool_queue = password_hasher.queued
+        try:
+            threadpool_queue += anyio.to_thread.current_default_thread_limiter().statistics().tasks_waiting
+        except RuntimeError:
+            # Вне event loop (например, при выдаче статистики из потока) threadpool недоступен
+            pass
+        size = pool.size() + max(0, getattr(pool, "_max_overflow", 0)) if hasattr(pool, "checkedout") else 0
+        return {
+            "threadpool_queue": threadpool_queue,
+            "db_pool_in_use": pool.checkedout() if size else 0,
+            "db_pool_size": size,
+        }
+
+    return pressure
+
+
+class AdmissionMiddleware:
+    """ASGI-middleware: отказ отдаётся до роутинга и не занимает ни потоков, ни соединений."""
+
+    def __init__(self, app, controller: AdmissionController, enabled: bool = ADMISSION_ENABLED):
+        self.app = app
+        self.controller = controller
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or scope["path"] in ADMISSION_EXEMPT:
+            await self.app(scope, receive, send)
+            return
+
+        reason = self.controller.admit(classify(scope["method"], scope["path"]))
+        if reason is not None:
+            response = JSONResponse(
+                {"detail": "Server is overloaded"},
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
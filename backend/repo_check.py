@@ -0,0 +1,443 @@
+"""Фоновая проверка ссылок на репозитории в решениях.
+
+submit_assignment только сохраняет решение со статусом pending и после
+commit ставит его id в очередь RepoChecker. Воркеры очереди:
+    1. нормализуют ссылку (normalize_url) — битая ссылка получает invalid;
+    2. получают метаданные репозитория через fetcher; результат кэшируется
+       по нормализованной ссылке на REPO_CHECK_CACHE_TTL секунд, так что
+       повторные отправки одной ссылки не ходят во внешний сервис, а
+       одновременные — ждут один запрос;
+    3. записывают status (valid / unreachable / error), status_detail,
+       checked_at и repository_meta условным UPDATE — только если ссылка
+       не поменялась, пока шла проверка.
+Запросов к одному хосту одновременно не больше REPO_CHECK_PER_HOST.
+
+Очередь живёт в памяти процесса. Что в неё не попало (переполнение,
+рестарт), подбирает периодический sweep по статусу pending; решения с
+error перепроверяются через REPO_CHECK_RETRY_SECONDS.
+
+Fetcher-ы: HttpFetcher (API GitHub и GitLab, для остальных хостов — HEAD
+по ссылке) и FakeFetcher — локальная замена без сети (REPO_FETCHER=fake).
+
+Ссылку присылает пользователь, поэтому HttpFetcher ходит только на порты 80
+и 443 и только на публичные адреса: имя хоста разрешается заранее, адреса
+loopback, частных сетей, link-local, зарезервированные и multicast
+отклоняются, а соединение идёт на уже проверенный адрес (повторное
+разрешение DNS не подменит его). Редиректы проходят ту же проверку на
+каждом шаге. Для хостов вне REPO_CHECK_TRUSTED_HOSTS сохраняется только
+найден репозиторий или нет — без метаданных и причин сбоя.
+
+Проверить ссылки вручную:
+    python repo_check.py check https://github.com/owner/repo ...
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sys
+from datetime import datetime, timedelta
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+
+from sqlalchemy import and_, or_, select, update
+
+from cache import Cache, cache
+from models import Submission
+
+logger = logging.getLogger(__name__)
+
+REPO_CHECK_ENABLED = os.getenv("REPO_CHECK_ENABLED", "1") == "1"
+REPO_CHECK_WORKERS = int(os.getenv("REPO_CHECK_WORKERS", "4"))
+REPO_CHECK_QUEUE_SIZE = int(os.getenv("REPO_CHECK_QUEUE_SIZE", "1000"))
+REPO_CHECK_PER_HOST = int(os.getenv("REPO_CHECK_PER_HOST", "2"))
+REPO_CHECK_CACHE_TTL = float(os.getenv("REPO_CHECK_CACHE_TTL", "600"))
+REPO_CHECK_TIMEOUT = float(os.getenv("REPO_CHECK_TIMEOUT", "10"))
+REPO_CHECK_SWEEP_SECONDS = float(os.getenv("REPO_CHECK_SWEEP_SECONDS", "60"))
+REPO_CHECK_RETRY_SECONDS = float(os.getenv("REPO_CHECK_RETRY_SECONDS", "900"))
+REPO_CHECK_SWEEP_BATCH = 500
+REPO_CHECK_MAX_REDIRECTS = 5
+REPO_FETCHER = os.getenv("REPO_FETCHER", "http")  # http | fake
+# Без токена API GitHub даёт 60 запросов в час с одного IP
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
+
+PENDING = "pending"
+VALID = "valid"
+INVALID = "invalid"
+UNREACHABLE = "unreachable"
+ERROR = "error"
+
+# Хосты, где ссылка на репозиторий — /owner/repo (у GitLab — /group/.../repo)
+KNOWN_HOSTS = ("github.com", "gitlab.com", "bitbucket.org")
+# Для остальных хостов результат проверки не раскрывается: только valid / unreachable
+REPO_CHECK_TRUSTED_HOSTS = tuple(
+    h.strip().lower() for h in os.getenv("REPO_CHECK_TRUSTED_HOSTS", ",".join(KNOWN_HOSTS)).split(",") if h.strip()
+)
+ALLOWED_PORTS = (80, 443)
+
+
+class UnsafeURL(ValueError):
+    """Ссылка ведёт туда, куда проверка не ходит: чужой порт, непубличный адрес."""
+
+
+def _is_public(address) -> bool:
+    address = getattr(address, "ipv4_mapped", None) or address
+    # is_global ложно для loopback, частных, link-local и зарезервированных сетей
+    return address.is_global and not address.is_multicast
+
+
+async def resolve_public(host: str, port: int):
+    """Адрес хоста для соединения; UnsafeURL, если хоть один из адресов не публичный."""
+    try:
+        addresses = [ipaddress.ip_address(host)]
+    except ValueError:
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        # У IPv6 link-local в ответе бывает зона: fe80::1%eth0
+        addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not addresses or not all(_is_public(a) for a in addresses):
+        raise UnsafeURL("Link points to a private or reserved address")
+    return addresses[0]
+
+
+def normalize_url(raw: str) -> str:
+    """Каноническая ссылка на репозиторий; ValueError, если это не ссылка на репозиторий."""
+    url = (raw or "").strip()
+    if "://" not in url:
+        url = "https://" + url
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise ValueError("Only http(s) links are supported")
+    if parts.username or parts.password:
+        raise ValueError("Link must not contain credentials")
+    host = (parts.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if "." not in host and ":" not in host:
+        raise ValueError("Link has no valid host")
+    try:
+        port = parts.port
+    except ValueError:
+        raise ValueError("Link has an invalid port")
+    if port is not None and port not in ALLOWED_PORTS:
+        raise UnsafeURL("Only ports 80 and 443 are allowed")
+    try:
+        literal = ipaddress.ip_address(host)
+    except ValueError:
+        pass
+    else:
+        if not _is_public(literal):
+            raise UnsafeURL("Link points to a private or reserved address")
+        if literal.version == 6:
+            host = f"[{host}]"
+
+    segments = [s for s in parts.path.split("/") if s]
+    if host in KNOWN_HOSTS:
+        # Ссылки на ветку, файл или коммит ведут в тот же репозиторий
+        if "-" in segments:
+            segments = segments[:segments.index("-")]
+        elif host != "gitlab.com":
+            segments = segments[:2]
+        if len(segments) < 2:
+            raise ValueError("Link must point to a repository: https://host/owner/repo")
+        if segments[-1].endswith(".git"):
+            segments[-1] = segments[-1][:-4]
+        # У известных хостов только https, порт по умолчанию
+        return f"https://{host}/{'/'.join(segments)}"
+
+    port = f":{port}" if port and port != (443 if parts.scheme == "https" else 80) else ""
+    path = "/".join(segments)
+    if path.endswith(".git"):
+        path = path[:-4]
+    return f"{parts.scheme}://{host}{port}/{path}".rstrip("/")
+
+
+class Fetcher:
+    async def fetch(self, url: str):
+        """Метаданные репозитория, None — не найден или закрыт; сбой сети — исключение."""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class HttpFetcher(Fetcher):
+    def __init__(self, timeout: float = REPO_CHECK_TIMEOUT, github_token: str = GITHUB_TOKEN):
+        import httpx
+        headers = {"User-Agent": "learning-platform-repo-check"}
+        self._github_headers = {"Accept": "application/vnd.github+json"}
+        if github_token:
+            self._github_headers["Authorization"] = f"Bearer {github_token}"
+        # Редиректы проходятся в _request: каждый шаг проверяется заново
+        self._client = httpx.AsyncClient(timeout=timeout, headers=headers, follow_redirects=False)
+
+    async def _request(self, method: str, url: str, headers: dict = None):
+        """Запрос на проверенный публичный адрес хоста; редиректы — с той же проверкой."""
+        import httpx
+
+        for _ in range(REPO_CHECK_MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ("http", "https") or parts.username or parts.password or not parts.hostname:
+                raise UnsafeURL("Redirect to an unsupported link")
+            try:
+                port = parts.port or (443 if parts.scheme == "https" else 80)
+            except ValueError:
+                raise UnsafeURL("Redirect to an unsupported link")
+            if port not in ALLOWED_PORTS:
+                raise UnsafeURL("Only ports 80 and 443 are allowed")
+            address = await resolve_public(parts.hostname, port)
+            # Соединение — на проверенный адрес; имя хоста уходит в Host и SNI, сертификат проверяется по нему
+            pinned = f"[{address}]" if address.version == 6 else str(address)
+            response = await self._client.request(
+                method, urlunsplit((parts.scheme, f"{pinned}:{port}", parts.path or "/", parts.query, "")),
+                headers={**(headers or {}), "Host": parts.netloc}, extensions={"sni_hostname": parts.hostname},
+            )
+            if not response.is_redirect:
+                return response
+            url = urljoin(url, response.headers["location"])
+        raise httpx.TooManyRedirects("Too many redirects", request=response.request)
+
+    async def _json(self, api_url: str, headers: dict = None):
+        response = await self._request("GET", api_url, headers)
+        # Закрытый репозиторий API отдаёт как несуществующий
+        if response.status_code in (404, 410):
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch(self, url):
+        parts = urlsplit(url)
+        path = parts.path.strip("/")
+        if parts.hostname == "github.com":
+            data = await self._json(f"https://api.github.com/repos/{path}", self._github_headers)
+            return data and {
+                "full_name": data["full_name"], "default_branch": data.get("default_branch"),
+                "description": data.get("description"), "archived": data.get("archived", False),
+                "pushed_at": data.get("pushed_at"),
+            }
+        if parts.hostname == "gitlab.com":
+            data = await self._json(f"https://gitlab.com/api/v4/projects/{quote(path, safe='')}")
+            return data and {
+                "full_name": data["path_with_namespace"], "default_branch": data.get("default_branch"),
+                "description": data.get("description"), "archived": data.get("archived", False),
+                "pushed_at": data.get("last_activity_at"),
+            }
+        response = await self._request("HEAD", url)
+        if response.status_code in (401, 403, 404, 410):
+            return None
+        response.raise_for_status()
+        return {"full_name": path}
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class FakeFetcher(Fetcher):
+    """Без сети: repos — {нормализованная ссылка: метаданные}.
+
+    Ссылки не из repos считаются найденными, если accept_unknown, иначе — не найденными.
+    """
+
+    def __init__(self, repos: dict = None, accept_unknown: bool = True):
+        self.repos = repos or {}
+        self.accept_unknown = accept_unknown
+        self.calls = []
+
+    async def fetch(self, url):
+        self.calls.append(url)
+        if url in self.repos:
+            return self.repos[url]
+        return {"full_name": urlsplit(url).path.strip("/")} if self.accept_unknown else None
+
+
+def make_fetcher(kind: str) -> Fetcher:
+    if kind == "http":
+        return HttpFetcher()
+    if kind == "fake":
+        return FakeFetcher()
+    raise ValueError(f"Unsupported REPO_FETCHER: {kind}")
+
+
+def sweep_query(retry_before: datetime, limit: int):
+    """Решения, которые надо (пере)проверить; оба условия — диапазоны ix_submissions_status."""
+    return select(Submission.id).filter(or_(
+        Submission.status == PENDING,
+        and_(Submission.status == ERROR, Submission.checked_at < retry_before)
+    )).limit(limit)
+
+
+class RepoChecker:
+    """Пул воркеров проверки решений; fetcher и время подменяются в тестах.
+
+    Без fetcher он создаётся из REPO_FETCHER при первой проверке: HTTP-клиент
+    не нужен ни при импорте, ни в мастер-процессе до fork.
+    """
+
+    def __init__(self, session_factory, fetcher: Fetcher = None, workers: int = REPO_CHECK_WORKERS,
+                 queue_size: int = REPO_CHECK_QUEUE_SIZE, per_host: int = REPO_CHECK_PER_HOST,
+                 cache_ttl: float = REPO_CHECK_CACHE_TTL, clock=datetime.utcnow):
+        self.session_factory = session_factory
+        self.fetcher = fetcher
+        self._own_fetcher = fetcher is None
+        self.workers = workers
+        self.per_host = per_host
+        self.clock = clock
+        # Метаданные кэшируются в том же бэкенде, что и ответы, но со своим TTL
+        self.meta_cache = Cache(cache.backend, ttl=cache_ttl)
+        self.queue = asyncio.Queue(queue_size)
+        self._queued = set()  # id в очереди: повторная отправка до проверки не ставит решение дважды
+        self._hosts = {}  # host -> asyncio.Semaphore
+        self._tasks = []
+        self.results = {}  # статус -> int
+        self.fetches = 0
+        self.dropped = 0
+
+    def enqueue(self, submission_id: int):
+        """Не ждёт: при переполнении решение подберёт sweep."""
+        if submission_id in self._queued:
+            return
+        try:
+            self.queue.put_nowait(submission_id)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        self._queued.add(submission_id)
+
+    async def _fetch(self, url: str):
+        host = urlsplit(url).hostname
+        semaphore = self._hosts.setdefault(host, asyncio.Semaphore(self.per_host))
+        async with semaphore:
+            self.fetches += 1
+            if self.fetcher is None:
+                self.fetcher = make_fetcher(REPO_FETCHER)
+            meta = await self.fetcher.fetch(url)
+        # «Не найден» тоже кэшируется, сбои сети — нет
+        return {"found": meta is not None, "meta": meta}
+
+    async def check(self, submission_id: int):
+        """Проверяет решение и сохраняет результат; возвращает статус или None, если решения нет."""
+        async with self.session_factory() as db:
+            url = await db.scalar(select(Submission.repository_url).filter(Submission.id == submission_id))
+        if url is None:
+            return None
+
+        meta = None
+        try:
+            normalized = normalize_url(url)
+        except ValueError as e:
+            status, detail = INVALID, str(e)
+        else:
+            trusted = urlsplit(normalized).hostname in REPO_CHECK_TRUSTED_HOSTS
+            try:
+                result = await self.meta_cache.get_or_load(
+                    "repo_meta", {"url": normalized}, lambda: self._fetch(normalized)
+                )
+            except UnsafeURL as e:
+                status, detail = INVALID, str(e)
+            except Exception as e:
+                logger.warning("Repository check for %s failed: %r", normalized, e)
+                if trusted:
+                    status, detail = ERROR, f"Fetch failed: {type(e).__name__}"
+                else:
+                    # Разные причины сбоя для произвольного хоста — готовый сканер портов и сети
+                    status, detail = UNREACHABLE, "Repository not found or private"
+            else:
+                if not result["found"]:
+                    status, detail = UNREACHABLE, "Repository not found or private"
+                elif trusted:
+                    status, detail, meta = VALID, None, {"url": normalized, **result["meta"]}
+                else:
+                    status, detail, meta = VALID, None, {"url": normalized}
+
+        async with self.session_factory() as db:
+            await db.execute(update(Submission).where(
+                Submission.id == submission_id, Submission.repository_url == url
+            ).values(
+                status=status, status_detail=detail, checked_at=self.clock(),
+                repository_meta=json.dumps(meta) if meta is not None else None
+            ))
+            await db.commit()
+        self.results[status] = self.results.get(status, 0) + 1
+        return status
+
+    async def _worker(self):
+        while True:
+            submission_id = await self.queue.get()
+            # Отправка во время проверки снова ставит решение в очередь
+            self._queued.discard(submission_id)
+            try:
+                await self.check(submission_id)
+            except Exception:
+                logger.exception("Repository check of submission %s failed", submission_id)
+            finally:
+                self.queue.task_done()
+
+    async def sweep(self) -> int:
+        """Ставит в очередь непроверенные решения и решения с ошибкой, у которых вышла пауза."""
+        retry_before = self.clock() - timedelta(seconds=REPO_CHECK_RETRY_SECONDS)
+        async with self.session_factory() as db:
+            ids = list(await db.scalars(sweep_query(retry_before, REPO_CHECK_SWEEP_BATCH)))
+        for submission_id in ids:
+            self.enqueue(submission_id)
+        return len(ids)
+
+    async def _sweeper(self):
+        while True:
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Repository check sweep failed")
+            await asyncio.sleep(REPO_CHECK_SWEEP_SECONDS)
+
+    async def drain(self):
+        """Ждёт, пока очередь опустеет (для тестов и симуляций)."""
+        await self.queue.join()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._own_fetcher and self.fetcher is not None:
+            await self.fetcher.close()
+            self.fetcher = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "fetches": self.fetches,
+            "results": self.results,
+            "cache": self.meta_cache.stats()["endpoints"].get("repo_meta", {}),
+        }
+
+
+async def _check(urls: list):
+    fetcher = make_fetcher(REPO_FETCHER)
+    try:
+        for url in urls:
+            try:
+                normalized = normalize_url(url)
+            except ValueError as e:
+                print(f"{INVALID:12} {url}: {e}")
+                continue
+            try:
+                meta = await fetcher.fetch(normalized)
+            except UnsafeURL as e:
+                print(f"{INVALID:12} {normalized}: {e}")
+                continue
+            print(f"{VALID if meta is not None else UNREACHABLE:12} {normalized} {json.dumps(meta) if meta else ''}")
+    finally:
+        await fetcher.close()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["check"] or len(sys.argv) < 3:
+        sys.exit("usage: python repo_check.py check URL [URL ...]")
+    asyncio.run(_check(sys.argv[2:]))
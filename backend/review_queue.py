@@ -0,0 +1,186 @@
+"""Распределение работ на ревью.
+
+После дедлайна решения задания распределяются между их авторами по кругу:
+каждый автор получает REVIEWS_PER_SUBMISSION чужих решений, и каждое решение
+получает столько же ревьюеров. Распределение делается один раз — задачей
+планировщика в момент дедлайна (или первым запросом, если она ещё не
+выполнилась) — и хранится в review_allocations, поэтому выдача
+следующей работы — одно чтение по индексу.
+
+Кто не сдавал решение или уже прошёл свою очередь, получает наименее
+проверенное решение (по счётчику submissions.review_count, его ведёт scores.py).
+
+Симуляция на N решениях (время распределения и равномерность покрытия):
+    python review_queue.py simulate 5000
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+from sqlalchemy import exists, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Assignment, Submission, Review, ReviewAllocation
+import scores
+
+REVIEWS_PER_SUBMISSION = int(os.getenv("REVIEWS_PER_SUBMISSION", "3"))
+
+
+def build_plan(submissions: list, per_submission: int, rng=random) -> list:
+    """submissions — [(submission_id, author_id)]; возвращает [(reviewer_id, submission_id, position)].
+
+    Кольцевой сдвиг по перемешанному списку: i-й автор проверяет решения
+    авторов i+1 .. i+k, где k = min(per_submission, n - 1). Своё решение
+    автору не достаётся, нагрузка и покрытие у всех ровно k.
+    """
+    order = list(submissions)
+    rng.shuffle(order)
+    n = len(order)
+    k = min(per_submission, n - 1)
+    return [
+        (order[i][1], order[(i + shift) % n][0], shift)
+        for i in range(n)
+        for shift in range(1, k + 1)
+    ]
+
+
+async def allocate(db: AsyncSession, assignment_id: int, now: datetime = None) -> bool:
+    """Распределяет ревью по заданию, если этого ещё не сделали.
+
+    Право на распределение забирается условным UPDATE: из параллельных
+    транзакций его получает ровно одна, остальные ждут её commit и видят
+    готовую очередь. Commit — на вызывающей стороне.
+    """
+    now = now or datetime.utcnow()
+    claimed = await db.execute(update(Assignment).where(
+        Assignment.id == assignment_id,
+        Assignment.reviews_allocated_at.is_(None)
+    ).values(reviews_allocated_at=now))
+    if claimed.rowcount == 0:
+        return False
+
+    submissions = (await db.execute(select(Submission.id, Submission.user_id).filter(
+        Submission.assignment_id == assignment_id
+    ).order_by(Submission.id))).all()
+    rows = [
+        {"assignment_id": assignment_id, "reviewer_id": reviewer_id, "submission_id": submission_id, "position": position}
+        for reviewer_id, submission_id, position in build_plan(submissions, REVIEWS_PER_SUBMISSION)
+    ]
+    if rows:
+        await db.execute(insert(ReviewAllocation), rows)
+        # Ревью, написанные до распределения, уже засчитаны
+        await db.execute(update(ReviewAllocation).where(
+            ReviewAllocation.assignment_id == assignment_id,
+            exists().where(
+                Review.submission_id == ReviewAllocation.submission_id,
+                Review.reviewer_id == ReviewAllocation.reviewer_id
+            )
+        ).values(completed_at=now))
+    return True
+
+
+def queue_query(assignment_id: int, reviewer_id: int):
+    return select(Submission).join(
+        ReviewAllocation, ReviewAllocation.submission_id == Submission.id
+    ).filter(
+        ReviewAllocation.assignment_id == assignment_id,
+        ReviewAllocation.reviewer_id == reviewer_id,
+        ReviewAllocation.completed_at.is_(None)
+    ).order_by(ReviewAllocation.position).limit(1)
+
+
+def least_reviewed_query(assignment_id: int, reviewer_id: int):
+    return select(Submission).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.user_id != reviewer_id,
+        ~exists().where(Review.submission_id == Submission.id, Review.reviewer_id == reviewer_id)
+    ).order_by(Submission.review_count, Submission.id).limit(1)
+
+
+async def next_submission(db: AsyncSession, assignment_id: int, reviewer_id: int):
+    """Следующая работа ревьюеру: сначала из его очереди, затем наименее проверенная."""
+    submission = await db.scalar(queue_query(assignment_id, reviewer_id))
+    if submission is None:
+        submission = await db.scalar(least_reviewed_query(assignment_id, reviewer_id))
+    return submission
+
+
+async def on_review(db: AsyncSession, submission_id: int, reviewer_id: int, now: datetime = None):
+    """Отмечает работу в очереди ревьюера; счётчик покрытия обновляет scores.on_review."""
+    await db.execute(update(ReviewAllocation).where(
+        ReviewAllocation.reviewer_id == reviewer_id,
+        ReviewAllocation.submission_id == submission_id
+    ).values(completed_at=now or datetime.utcnow()))
+
+
+def _coverage(counts) -> str:
+    counts = list(counts)
+    return (f"min={min(counts)} max={max(counts)} "
+            f"mean={statistics.mean(counts):.2f} stdev={statistics.pstdev(counts):.2f}")
+
+
+async def simulate(n: int, per_submission: int = REVIEWS_PER_SUBMISSION):
+    """Распределение на n решениях во временной in-memory базе."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from database import Base
+    from models import User, Track
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session = async_sessionmaker(engine, expire_on_commit=False)
+    async with session() as db:
+        db.add(Track(id=1, title="sim", quota=n, started_at=datetime(2000, 1, 1)))
+        db.add(Assignment(id=1, track_id=1, title="sim", deadline_days=1, order=1))
+        await db.execute(insert(User), [{"id": i, "email": f"u{i}@sim"} for i in range(1, n + 1)])
+        await db.execute(insert(Submission), [
+            {"id": i, "assignment_id": 1, "user_id": i, "repository_url": f"https://example.com/{i}"}
+            for i in range(1, n + 1)
+        ])
+        await db.commit()
+
+        started = time.perf_counter()
+        await allocate(db, 1)
+        await db.commit()
+        allocated = time.perf_counter() - started
+
+        # Каждый автор проходит свою очередь целиком
+        lookups = []
+        coverage = dict.fromkeys(range(1, n + 1), 0)
+        for reviewer_id in range(1, n + 1):
+            for _ in range(min(per_submission, n - 1)):
+                started = time.perf_counter()
+                submission = await next_submission(db, 1, reviewer_id)
+                lookups.append(time.perf_counter() - started)
+                db.add(Review(submission_id=submission.id, reviewer_id=reviewer_id, score=5))
+                await on_review(db, submission.id, reviewer_id)
+                await scores.on_review(db, submission, 1, 5)
+                coverage[submission.id] += 1
+            await db.commit()
+    await engine.dispose()
+
+    # Для сравнения: прежний случайный выбор среди ещё не проверенных работ
+    rng = random.Random(0)
+    random_coverage = dict.fromkeys(range(1, n + 1), 0)
+    for reviewer_id in range(1, n + 1):
+        picked = [i for i in rng.sample(range(1, n + 1), min(per_submission + 1, n)) if i != reviewer_id]
+        for submission_id in picked[:per_submission]:
+            random_coverage[submission_id] += 1
+
+    lookups.sort()
+    print(f"submissions: {n}, reviews per submission: {per_submission}")
+    print(f"allocation: {allocated * 1000:.1f} ms")
+    print(f"next_submission: p50={lookups[len(lookups) // 2] * 1000:.2f} ms "
+          f"p99={lookups[int(len(lookups) * 0.99)] * 1000:.2f} ms")
+    print(f"coverage (allocated): {_coverage(coverage.values())}")
+    print(f"coverage (random):    {_coverage(random_coverage.values())}")
+
+
+if __name__ == "__main__":
+    if not sys.argv[1:] or sys.argv[1] != "simulate":
+        sys.exit("usage: python review_queue.py simulate [submissions]")
+    asyncio.run(simulate(int(sys.argv[2]) if len(sys.argv) > 2 else 5000))
@@ -0,0 +1,287 @@
+"""Планировщик дедлайнов.
+
+При старте трека дедлайны заданий записываются в assignments.deadline_at, а
+переходы ставятся в очередь scheduled_jobs со временем срабатывания:
+    deadline_warning    — когда появляется предупреждение о дедлайне: push участникам;
+    assignment_deadline — в дедлайн: приём решений закрыт, ревью распределяются,
+                          участники получают push о начале код-ривью.
+
+Каждый воркер приложения крутит Scheduler.run(): забирает созревшие задачи
+условным UPDATE с арендой (locked_until), выполняет и удаляет задачу в одной
+транзакции с её результатом. Если воркер упал, задачу после истечения аренды
+возьмёт другой, поэтому после рестарта всё невыполненное подхватывается.
+Обработчики идемпотентны.
+
+Выполнить задачи, созревшие к заданному моменту («перемотка» времени):
+    python scheduler.py run-due [--now 2026-01-31T12:00:00]
+Проверка очереди под нагрузкой:
+    python scheduler.py bench 100000
+"""
+import asyncio
+import logging
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import upsert_insert
+from events import hub
+from models import Assignment, TrackParticipant, ScheduledJob
+import notifications
+import review_queue
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "30"))
+SCHEDULER_LEASE_SECONDS = float(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+# Пауза перед повтором упавшей задачи растёт с числом попыток
+RETRY_SECONDS = 60
+
+ASSIGNMENT_DEADLINE = "assignment_deadline"
+DEADLINE_WARNING = "deadline_warning"
+
+
+def assignment_deadline(started_at: datetime, deadline_days: int) -> datetime:
+    return started_at + timedelta(days=deadline_days)
+
+
+async def enqueue(db: AsyncSession, jobs: list):
+    """jobs — [{"kind", "target_id", "due_at"}]; уже стоящие в очереди пропускаются."""
+    if jobs:
+        await db.execute(upsert_insert(db, ScheduledJob).on_conflict_do_nothing(
+            index_elements=["kind", "target_id"]
+        ), jobs)
+
+
+async def schedule_track(db: AsyncSession, track):
+    """Фиксирует дедлайны заданий начавшегося трека и ставит переходы в очередь."""
+    assignments = (await db.execute(select(Assignment.id, Assignment.deadline_days).filter(
+        Assignment.track_id == track.id
+    ))).all()
+    if not assignments:
+        return
+    deadlines = {assn.id: assignment_deadline(track.started_at, assn.deadline_days) for assn in assignments}
+    await db.execute(update(Assignment), [
+        {"id": assignment_id, "deadline_at": deadline} for assignment_id, deadline in deadlines.items()
+    ])
+    jobs = []
+    for assignment_id, deadline in deadlines.items():
+        jobs.append({"kind": DEADLINE_WARNING, "target_id": assignment_id,
+                     "due_at": notifications.warning_visible_at(deadline)})
+        jobs.append({"kind": ASSIGNMENT_DEADLINE, "target_id": assignment_id, "due_at": deadline})
+    await enqueue(db, jobs)
+
+
+async def _participant_ids(db: AsyncSession, assignment_id: int) -> list:
+    return list(await db.scalars(select(TrackParticipant.user_id).join(
+        Assignment, Assignment.track_id == TrackParticipant.track_id
+    ).filter(Assignment.id == assignment_id)))
+
+
+async def on_deadline_warning(db: AsyncSession, assignment_id: int, now: datetime) -> list:
+    # Само уведомление уже лежит в notifications, клиентам нужен только сигнал перечитать
+    return [(await _participant_ids(db, assignment_id), {"type": "deadline_warning", "assignment_id": assignment_id})]
+
+
+async def on_assignment_deadline(db: AsyncSession, assignment_id: int, now: datetime) -> list:
+    await review_queue.allocate(db, assignment_id, now)
+    return [(await _participant_ids(db, assignment_id), {"type": "review_started", "assignment_id": assignment_id})]
+
+
+# Обработчик получает сессию, target_id и текущее время, возвращает [(user_ids, event)]
+# для публикации после commit
+HANDLERS = {
+    DEADLINE_WARNING: on_deadline_warning,
+    ASSIGNMENT_DEADLINE: on_assignment_deadline,
+}
+
+
+class Scheduler:
+    """Выполняет созревшие задачи из scheduled_jobs.
+
+    clock подменяется в тестах и симуляциях, чтобы «перематывать» время.
+    """
+
+    def __init__(self, session_factory, clock=datetime.utcnow, handlers: dict = None, worker_id: str = None,
+                 poll_seconds: float = SCHEDULER_POLL_SECONDS, lease_seconds: float = SCHEDULER_LEASE_SECONDS,
+                 batch_size: int = SCHEDULER_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.clock = clock
+        self.handlers = HANDLERS if handlers is None else handlers
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.processed = 0
+        self.failed = 0
+        self._task = None
+
+    def _available(self, now: datetime):
+        return or_(ScheduledJob.locked_until.is_(None), ScheduledJob.locked_until < now)
+
+    async def run_due(self, now: datetime = None) -> int:
+        """Выполняет все задачи, созревшие к now; возвращает число выполненных."""
+        done = 0
+        while True:
+            current = now or self.clock()
+            async with self.session_factory() as db:
+                job_ids = list(await db.scalars(select(ScheduledJob.id).filter(
+                    ScheduledJob.due_at <= current, self._available(current)
+                ).order_by(ScheduledJob.due_at).limit(self.batch_size)))
+            for job_id in job_ids:
+                if await self._run_job(job_id, current):
+                    done += 1
+            if len(job_ids) < self.batch_size:
+                return done
+
+    async def _run_job(self, job_id: int, now: datetime) -> bool:
+        async with self.session_factory() as db:
+            claimed = await db.execute(update(ScheduledJob).where(
+                ScheduledJob.id == job_id, ScheduledJob.due_at <= now, self._available(now)
+            ).values(
+                locked_by=self.worker_id,
+                locked_until=now + timedelta(seconds=self.lease_seconds),
+                attempts=ScheduledJob.attempts + 1
+            ))
+            await db.commit()
+            if claimed.rowcount == 0:
+                # Задачу уже взял другой воркер
+                return False
+
+            # rollback сбрасывает загруженные атрибуты, поэтому нужные поля копируем сразу
+            kind, target_id, attempts = (await db.execute(select(
+                ScheduledJob.kind, ScheduledJob.target_id, ScheduledJob.attempts
+            ).filter(ScheduledJob.id == job_id))).one()
+            try:
+                handler = self.handlers.get(kind)
+                if handler is None:
+                    raise LookupError(f"Unknown job kind {kind}")
+                events = await handler(db, target_id, now)
+                # Удаляем, только пока аренда наша — иначе задачу уже перехватили
+                deleted = await db.execute(delete(ScheduledJob).where(
+                    ScheduledJob.id == job_id, ScheduledJob.locked_by == self.worker_id
+                ))
+                if deleted.rowcount == 0:
+                    await db.rollback()
+                    return False
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                logger.warning("Scheduled job %s:%s failed (attempt %s): %r", kind, target_id, attempts, e)
+                await db.execute(update(ScheduledJob).where(
+                    ScheduledJob.id == job_id, ScheduledJob.locked_by == self.worker_id
+                ).values(
+                    locked_by=None,
+                    locked_until=None,
+                    due_at=now + timedelta(seconds=RETRY_SECONDS * attempts),
+                    last_error=repr(e)
+                ))
+                await db.commit()
+                self.failed += 1
+                return False
+
+        for user_ids, event in events or ():
+            hub.publish(user_ids, event)
+        self.processed += 1
+        return True
+
+    async def _next_delay(self) -> float:
+        async with self.session_factory() as db:
+            next_due = await db.scalar(select(func.min(ScheduledJob.due_at)).filter(
+                ScheduledJob.locked_until.is_(None)
+            ))
+        if next_due is None:
+            return self.poll_seconds
+        # Задачи с истёкшей арендой подбираются на очередном опросе
+        return min(self.poll_seconds, max(1.0, (next_due - self.clock()).total_seconds()))
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_due()
+                delay = await self._next_delay()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler error")
+                delay = self.poll_seconds
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+async def bench(n: int):
+    """Очередь из n отложенных задач во временной in-memory базе."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from database import Base
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    start = datetime(2030, 1, 1)
+    # Дедлайны равномерно на 100 дней вперёд
+    jobs = [{"kind": "noop", "target_id": i, "due_at": start + timedelta(seconds=i * 8640000 / n)} for i in range(n)]
+    started = time.perf_counter()
+    async with session_factory() as db:
+        await enqueue(db, jobs)
+        await db.commit()
+    enqueued = time.perf_counter() - started
+
+    async def noop(db, target_id, now):
+        return []
+
+    scheduler = Scheduler(session_factory, clock=lambda: start, handlers={"noop": noop})
+    started = time.perf_counter()
+    for _ in range(100):
+        await scheduler._next_delay()
+    next_due = (time.perf_counter() - started) / 100
+
+    # «Перематываем» на 1 день: созревает ~1% очереди
+    started = time.perf_counter()
+    done = await scheduler.run_due(start + timedelta(days=1))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+
+    print(f"pending jobs: {n}")
+    print(f"enqueue: {enqueued * 1000:.0f} ms")
+    print(f"next due lookup: {next_due * 1000:.2f} ms")
+    print(f"run_due: {done} jobs in {elapsed * 1000:.0f} ms ({done / elapsed:.0f} jobs/s)")
+
+
+async def _run_due(now: datetime):
+    from database import AsyncSessionLocal, dispose_engines
+    try:
+        done = await Scheduler(AsyncSessionLocal).run_due(now)
+        print(f"Executed {done} jobs")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["run-due"]:
+        now = datetime.fromisoformat(args[2]) if args[1:2] == ["--now"] else None
+        asyncio.run(_run_due(now))
+    elif args[:1] == ["bench"]:
+        asyncio.run(bench(int(args[1]) if len(args) > 1 else 100000))
+    else:
+        sys.exit("usage: python scheduler.py run-due [--now ISO_DATETIME] | bench [N]")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 from typing import Optional, List
 
@@ -10,18 +10,30 @@ class LoginRequest(BaseModel):
     username: str  # email
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 class UserResponse(BaseModel):
     id: int
     email: str
     class Config:
         from_attributes = True
 
+class AssignmentCreate(BaseModel):
+    title: str
+    description: str
+    deadline_days: int = Field(ge=0)
+    order: int
+
 class TrackCreate(BaseModel):
     title: str
     description: str
-    quota: int
+    quota: int = Field(ge=1)
     criteria: str
-    assignments: List[dict]  # [{"title": "...", "description": "...", "deadline_days": 7, "order": 1}]
+    assignments: List[AssignmentCreate]
 
 class TrackResponse(BaseModel):
     id: int
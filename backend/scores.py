@@ -0,0 +1,198 @@
+"""Агрегаты оценок за ревью.
+
+Для решения (submissions), участника трека (track_participants — оценки,
+полученные его решениями) и задания (assignments) хранятся review_count,
+score_sum, score_mean и score_m2 — сумма квадратов отклонений по Уэлфорду,
+дисперсия = score_m2 / review_count. Агрегаты обновляются атомарными UPDATE
+в транзакции ревью, поэтому параллельные ревью не теряют друг друга.
+
+Лидерборд трека читается по индексу ix_track_participants_leaderboard:
+топ — первые строки индекса, место пользователя — три подсчёта по
+диапазонам того же индекса.
+
+Пересчитать агрегаты из ревью одним потоковым проходом:
+    python scores.py rebuild
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Assignment, TrackParticipant, Submission, Review
+
+REBUILD_BATCH = 1000
+ROLLUP_MODELS = (Submission, TrackParticipant, Assignment)
+
+
+def _added(model, score: float) -> dict:
+    """Значения UPDATE для добавления оценки; в SET используются значения до обновления."""
+    delta = score - model.score_mean
+    return {
+        "review_count": model.review_count + 1,
+        "score_sum": model.score_sum + score,
+        "score_mean": model.score_mean + delta / (model.review_count + 1),
+        "score_m2": model.score_m2 + delta * delta * model.review_count / (model.review_count + 1),
+    }
+
+
+async def on_review(db: AsyncSession, submission: Submission, track_id: int, score: float):
+    """Учитывает новую оценку во всех агрегатах; commit на вызывающей стороне."""
+    score = float(score)
+    await db.execute(update(Submission).where(Submission.id == submission.id).values(**_added(Submission, score)))
+    await db.execute(update(TrackParticipant).where(
+        TrackParticipant.track_id == track_id,
+        TrackParticipant.user_id == submission.user_id
+    ).values(**_added(TrackParticipant, score)))
+    # Строку задания обновляют все ревью по нему — берём её блокировку последней
+    await db.execute(update(Assignment).where(Assignment.id == submission.assignment_id).values(
+        **_added(Assignment, score)
+    ))
+
+
+def variance(count: int, m2: float) -> float:
+    return m2 / count if count else 0.0
+
+
+def rollup_dict(row) -> dict:
+    return {
+        "review_count": row.review_count,
+        "score_sum": row.score_sum,
+        "score_mean": row.score_mean,
+        "score_variance": variance(row.review_count, row.score_m2),
+    }
+
+
+# Порядок лидерборда — убывание по всему индексу: средняя оценка, число оценок, id участника.
+# Одинаковое направление у всех колонок позволяет читать индекс с конца без сортировки.
+# Участники отдаются по user_id: лидерборд видят все, email в нём раскрывал бы адреса
+def leaderboard_query(track_id: int, limit: int):
+    return select(
+        TrackParticipant.user_id, TrackParticipant.review_count, TrackParticipant.score_sum,
+        TrackParticipant.score_mean, TrackParticipant.score_m2
+    ).filter(
+        TrackParticipant.track_id == track_id,
+        TrackParticipant.review_count > 0
+    ).order_by(
+        TrackParticipant.score_mean.desc(), TrackParticipant.review_count.desc(),
+        TrackParticipant.user_id.desc()
+    ).limit(limit)
+
+
+def rank_query(track_id: int, user_id: int, score_mean: float, review_count: int):
+    """Место участника: 1 + число тех, кто выше; каждое слагаемое — диапазон индекса."""
+    def ahead(*conditions):
+        return select(func.count()).select_from(TrackParticipant).filter(
+            TrackParticipant.track_id == track_id, TrackParticipant.review_count > 0, *conditions
+        ).scalar_subquery()
+
+    return select(1
+        + ahead(TrackParticipant.score_mean > score_mean)
+        + ahead(TrackParticipant.score_mean == score_mean, TrackParticipant.review_count > review_count)
+        + ahead(TrackParticipant.score_mean == score_mean, TrackParticipant.review_count == review_count,
+                TrackParticipant.user_id > user_id))
+
+
+async def top(db: AsyncSession, track_id: int, limit: int) -> list:
+    rows = await db.execute(leaderboard_query(track_id, limit))
+    return [
+        {"rank": rank, "user_id": row.user_id, **rollup_dict(row)}
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+
+async def rank_of(db: AsyncSession, track_id: int, user_id: int):
+    """Место и агрегаты участника или None, если его решения ещё не оценивали."""
+    row = (await db.execute(select(
+        TrackParticipant.review_count, TrackParticipant.score_sum,
+        TrackParticipant.score_mean, TrackParticipant.score_m2
+    ).filter(
+        TrackParticipant.track_id == track_id,
+        TrackParticipant.user_id == user_id
+    ))).first()
+    if row is None or row.review_count == 0:
+        return None
+    rank = await db.scalar(rank_query(track_id, user_id, row.score_mean, row.review_count))
+    return {"rank": rank, "user_id": user_id, **rollup_dict(row)}
+
+
+class Rollup:
+    """Агрегат в памяти, те же формулы, что и в UPDATE."""
+
+    def __init__(self):
+        self.review_count = 0
+        self.score_sum = 0.0
+        self.score_mean = 0.0
+        self.score_m2 = 0.0
+
+    def add(self, score: float):
+        delta = score - self.score_mean
+        self.review_count += 1
+        self.score_sum += score
+        self.score_mean += delta / self.review_count
+        self.score_m2 += delta * (score - self.score_mean)
+
+    def values(self) -> dict:
+        return {"review_count": self.review_count, "score_sum": self.score_sum,
+                "score_mean": self.score_mean, "score_m2": self.score_m2}
+
+
+async def rebuild(db: AsyncSession) -> dict:
+    """Пересчитывает все агрегаты из reviews одним потоковым проходом и одной транзакцией.
+
+    В памяти — по агрегату на решение, участника и задание, ревью читаются пачками.
+    """
+    submissions, participants, assignments = {}, {}, {}
+    reviews = await db.stream(select(
+        Review.score, Submission.id, Submission.user_id, Submission.assignment_id, Assignment.track_id
+    ).join(Submission, Submission.id == Review.submission_id).join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).filter(Review.score.isnot(None)).execution_options(yield_per=REBUILD_BATCH))
+    total = 0
+    async for score, submission_id, user_id, assignment_id, track_id in reviews:
+        submissions.setdefault(submission_id, Rollup()).add(score)
+        participants.setdefault((track_id, user_id), Rollup()).add(score)
+        assignments.setdefault(assignment_id, Rollup()).add(score)
+        total += 1
+
+    participant_ids = {
+        (track_id, user_id): participant_id
+        for participant_id, track_id, user_id in await db.execute(select(
+            TrackParticipant.id, TrackParticipant.track_id, TrackParticipant.user_id
+        ))
+    }
+
+    for model in ROLLUP_MODELS:
+        await db.execute(update(model).values(**Rollup().values()))
+    for model, rollups in (
+        (Submission, submissions.items()),
+        (Assignment, assignments.items()),
+        # Оценки решений тех, кто не участник трека, в лидерборд не попадают
+        (TrackParticipant, ((participant_ids[key], r) for key, r in participants.items() if key in participant_ids)),
+    ):
+        rows = [{"id": row_id, **rollup.values()} for row_id, rollup in rollups]
+        for i in range(0, len(rows), REBUILD_BATCH):
+            await db.execute(update(model), rows[i:i + REBUILD_BATCH])
+    await db.commit()
+    return {"reviews": total, "submissions": len(submissions), "participants": len(participants),
+            "assignments": len(assignments)}
+
+
+async def _rebuild():
+    from database import AsyncSessionLocal, dispose_engines
+    try:
+        async with AsyncSessionLocal() as db:
+            started = time.perf_counter()
+            stats = await rebuild(db)
+        print(f"Rebuilt rollups from {stats['reviews']} reviews: {stats['submissions']} submissions, "
+              f"{stats['participants']} participants, {stats['assignments']} assignments "
+              f"in {time.perf_counter() - started:.2f} s")
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python scores.py rebuild")
+    asyncio.run(_rebuild())
@@ -0,0 +1,185 @@
+"""Запуск в продакшене: gunicorn с воркерами uvicorn.
+
+Приложение загружается в мастер-процессе до fork (preload): импорт FastAPI,
+SQLAlchemy и моделей выполняется один раз, воркеры получают его готовым и
+делят эту память с мастером, пока не изменят её. Движок БД, пул соединений,
+планировщик и проверка ссылок создаются в lifespan каждого воркера.
+
+    python serve.py                  # WEB_CONCURRENCY воркеров на BIND
+    python serve.py measure [N]      # холодный старт и память N воркеров (Linux)
+
+Кэш ответов, SSE-хаб и вёдра лимитов по умолчанию живут в памяти процесса.
+Поэтому по умолчанию воркер один, а при WEB_CONCURRENCY > 1 запуск
+отказывается стартовать, пока CACHE_URL, EVENTS_URL и RATE_LIMIT_URL не
+указывают на общий Redis.
+
+Остановка — SIGTERM мастеру: воркеры DRAIN_SECONDS отвечают not ready на
+/health/ready, затем дожидаются текущих запросов (см. health.py);
+GRACEFUL_TIMEOUT должен быть больше DRAIN_SECONDS.
+"""
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BIND = os.getenv("BIND", "0.0.0.0:8000")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+WORKER_TIMEOUT = int(os.getenv("WORKER_TIMEOUT", "60"))
+# Перезапуск воркера после N запросов (0 — никогда) — страховка от роста памяти
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+# Разрешить несколько воркеров с состоянием в памяти процесса — только для замеров (measure)
+ALLOW_PER_WORKER_STATE = os.getenv("ALLOW_PER_WORKER_STATE", "0") == "1"
+
+
+def gunicorn_options(bind: str = BIND, workers: int = WEB_CONCURRENCY) -> dict:
+    return {
+        "bind": bind,
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": WORKER_TIMEOUT,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS // 10,
+        "accesslog": "-" if os.getenv("ACCESS_LOG", "0") == "1" else None,
+    }
+
+
+def per_worker_state() -> list:
+    """Переменные окружения компонентов, чьё состояние сейчас живёт в памяти процесса."""
+    import cache
+    import ratelimit
+    from events import hub
+
+    local = []
+    if not isinstance(cache.cache.backend, cache.RedisBackend):
+        local.append("CACHE_URL")
+    if not hub.shared:
+        local.append("EVENTS_URL")
+    if ratelimit.rate_limiter.enabled and not isinstance(ratelimit.rate_limiter.backend, ratelimit.RedisBucketBackend):
+        local.append("RATE_LIMIT_URL")
+    return local
+
+
+def run(options: dict):
+    from gunicorn.app.base import BaseApplication
+
+    if options["workers"] > 1 and not ALLOW_PER_WORKER_STATE:
+        local = per_worker_state()
+        if local:
+            # Воркеры разошлись бы: инвалидация кэша, события SSE и лимиты не выходят за процесс
+            sys.exit(f"WEB_CONCURRENCY={options['workers']} needs shared state: set "
+                     f"{', '.join(local)} to redis://... or run a single worker")
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import create_app
+            return create_app()
+
+    Application().run()
+
+
+def _memory_mb(pid: int) -> dict:
+    """RSS и PSS процесса; PSS делит общие страницы между процессами, поэтому их сумма — реальный расход."""
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmRSS"))
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        pss = next(int(line.split()[1]) for line in f if line.startswith("Pss:"))
+    return {"rss_mb": round(rss / 1024, 1), "pss_mb": round(pss / 1024, 1)}
+
+
+def _children(pid: int) -> list:
+    result = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except OSError:
+                continue
+            if ppid == pid:
+                result.append(int(entry))
+    return result
+
+
+def _wait_ready(url: str, timeout: float) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    raise TimeoutError(f"{url} is not ready after {timeout} s")
+
+
+def measure(workers: int, runs: int = 5):
+    """Импорт приложения в чистом процессе, время до готовности и память воркеров."""
+    code = (
+        "import time; started = time.perf_counter()\n"
+        "import main; main.create_app()\n"
+        "import json, sys\n"
+        "rss = next(int(l.split()[1]) for l in open('/proc/self/status') if l.startswith('VmRSS'))\n"
+        "print(json.dumps({'import_ms': (time.perf_counter() - started) * 1000, 'rss_mb': rss / 1024,"
+        " 'engine_created': 'aiosqlite' in sys.modules or 'asyncpg' in sys.modules}))\n"
+    )
+    imports = [json.loads(subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                                         check=True).stdout.strip().splitlines()[-1]) for _ in range(runs)]
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = {**os.environ, "BIND": f"127.0.0.1:{port}", "WEB_CONCURRENCY": str(workers), "DRAIN_SECONDS": "1",
+           "ALLOW_PER_WORKER_STATE": "1"}
+    started = time.perf_counter()
+    master = subprocess.Popen([sys.executable, __file__], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f"http://127.0.0.1:{port}/health/ready"
+        ready = _wait_ready(url, 60)
+        # Воркеры форкаются с уже загруженным приложением; ждём, пока мастер запустит всех
+        while len(_children(master.pid)) < workers and time.perf_counter() - started < 60:
+            time.sleep(0.05)
+        time.sleep(1)
+        worker_memory = [_memory_mb(pid) for pid in _children(master.pid)]
+        master_memory = _memory_mb(master.pid)
+    finally:
+        stop_started = time.perf_counter()
+        master.send_signal(signal.SIGTERM)
+        master.wait(GRACEFUL_TIMEOUT + 10)
+        stopped = time.perf_counter() - stop_started
+
+    report = {
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in imports)),
+        "import_rss_mb_median": round(statistics.median(r["rss_mb"] for r in imports), 1),
+        "engine_created_on_import": any(r["engine_created"] for r in imports),
+        "workers": workers,
+        "ready_s": round(ready, 2),
+        "master": master_memory,
+        "worker_memory": worker_memory,
+        "total_pss_mb": round(master_memory["pss_mb"] + sum(w["pss_mb"] for w in worker_memory), 1),
+        "shutdown_s": round(stopped, 2),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["measure"]:
+        measure(int(args[1]) if len(args) > 1 else WEB_CONCURRENCY)
+    elif not args:
+        run(gunicorn_options())
+    else:
+        sys.exit("usage: python serve.py | measure [WORKERS]")
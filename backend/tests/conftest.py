@@ -0,0 +1,45 @@
+"""Общее окружение тестов.
+
+Модули приложения читают настройки при импорте, поэтому окружение задаётся
+здесь, до первого импорта. По умолчанию база — временный файл SQLite;
+DATABASE_URL из окружения (пустая база, например PostgreSQL) имеет приоритет.
+Схема создаётся миграциями, как в рабочей базе.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+_tmpdir = tempfile.TemporaryDirectory()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir.name, 'test.db')}")
+os.environ["SCHEDULER_ENABLED"] = "0"
+os.environ["REPO_CHECK_ENABLED"] = "0"
+os.environ["REPO_FETCHER"] = "fake"
+os.environ["CACHE_URL"] = ""
+os.environ["EVENTS_URL"] = ""
+# Превышения бюджета собираются в metrics.budget_violations, сценарий доходит до конца
+os.environ["QUERY_BUDGET_MODE"] = "warn"
+os.environ["QUERY_COUNT_HEADER"] = "1"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest
+from alembic import command
+from alembic.config import Config
+
+
+@pytest.fixture(scope="session", autouse=True)
+def migrated():
+    command.upgrade(Config(os.path.join(BACKEND, "alembic.ini")), "head")
+    yield
+    from database import get_engine
+    get_engine().dispose()
+    _tmpdir.cleanup()
+
+
+@pytest.fixture(scope="session")
+def budget_scenario(migrated):
+    """Основной сценарий query_budget: один прогон на все тесты."""
+    import query_budget
+    return query_budget.measure()
@@ -0,0 +1,59 @@
+import asyncio
+
+from fastapi import HTTPException
+from jose import jwt
+from sqlalchemy import select
+
+import auth
+from database import AsyncSessionLocal
+from models import User, RevokedToken
+
+
+async def _tokens(email):
+    async with AsyncSessionLocal() as db:
+        user = User(email=email, hashed_password="x")
+        db.add(user)
+        await db.commit()
+    return auth.create_tokens(user)
+
+
+async def _in_session(call, *args):
+    async with AsyncSessionLocal() as db:
+        return await call(db, *args)
+
+
+def _jti(token):
+    return jwt.get_unverified_claims(token)["jti"]
+
+
+def test_concurrent_logout_of_same_tokens_succeeds():
+    async def scenario():
+        tokens = await _tokens("auth-logout@example.com")
+        # Оба запроса проверили токены до того, как другой их отозвал
+        results = await asyncio.gather(*(
+            _in_session(auth.revoke_tokens, tokens["access_token"], tokens["refresh_token"]) for _ in range(2)
+        ), return_exceptions=True)
+        async with AsyncSessionLocal() as db:
+            stored = set(await db.scalars(select(RevokedToken.jti).filter(
+                RevokedToken.jti.in_([_jti(tokens["access_token"]), _jti(tokens["refresh_token"])])
+            )))
+        return tokens, results, stored
+
+    tokens, results, stored = asyncio.run(scenario())
+    assert results == [None, None]
+    assert stored == {_jti(tokens["access_token"]), _jti(tokens["refresh_token"])}
+    assert all(auth.revocations.is_revoked(jti) for jti in stored)
+
+
+def test_refresh_token_is_exchanged_once():
+    async def scenario():
+        tokens = await _tokens("auth-refresh@example.com")
+        return await asyncio.gather(*(
+            _in_session(auth.rotate_refresh_token, tokens["refresh_token"]) for _ in range(2)
+        ), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    exchanged = [r for r in results if isinstance(r, dict)]
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(exchanged) == 1 and exchanged[0]["refresh_token"]
+    assert [e.status_code for e in rejected] == [401]
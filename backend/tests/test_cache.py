@@ -0,0 +1,128 @@
+import asyncio
+
+from cache import Cache, LocalLRUBackend, MemorySharedBackend
+
+
+def _loader(value, calls, delay=0):
+    async def load():
+        calls.append(value)
+        await asyncio.sleep(delay)
+        return value
+    return load
+
+
+def test_invalidation_reaches_other_instance_sharing_store():
+    async def scenario():
+        store = {}
+        first, second = Cache(MemorySharedBackend(store)), Cache(MemorySharedBackend(store))
+        calls = []
+        results = [
+            await first.get_or_load("comments", {"id": 5}, _loader("v1", calls), tags=["comments:5"]),
+            # Второй воркер видит значение, загруженное первым
+            await second.get_or_load("comments", {"id": 5}, _loader("unused", calls), tags=["comments:5"]),
+        ]
+        await second.invalidate("comments:5")
+        results.append(await first.get_or_load("comments", {"id": 5}, _loader("v2", calls), tags=["comments:5"]))
+        # Другой тег не затронут
+        results.append(await first.get_or_load("comments", {"id": 6}, _loader("w1", calls), tags=["comments:6"]))
+        await first.invalidate("comments:5")
+        results.append(await first.get_or_load("comments", {"id": 6}, _loader("unused", calls), tags=["comments:6"]))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert results == ["v1", "v1", "v2", "w1", "w1"]
+    assert calls == ["v1", "v2", "w1"]
+
+
+def test_concurrent_misses_share_one_load():
+    async def scenario():
+        cache = Cache(LocalLRUBackend())
+        calls = []
+        results = await asyncio.gather(*(
+            cache.get_or_load("tracks", {}, _loader("value", calls, delay=0.01), tags=["tracks"])
+            for _ in range(20)
+        ))
+        return results, calls, cache.stats()["endpoints"]["tracks"]
+
+    results, calls, stats = asyncio.run(scenario())
+    assert results == ["value"] * 20
+    assert calls == ["value"]
+    assert (stats["misses"], stats["stampede_waits"]) == (1, 19)
+
+
+def test_failed_load_is_not_cached_and_reaches_waiters():
+    async def scenario():
+        cache = Cache(LocalLRUBackend())
+
+        async def broken():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("db down")
+
+        results = await asyncio.gather(*(cache.get_or_load("tracks", {}, broken) for _ in range(3)),
+                                       return_exceptions=True)
+        calls = []
+        results.append(await cache.get_or_load("tracks", {}, _loader("value", calls)))
+        return results, calls
+
+    results, calls = asyncio.run(scenario())
+    assert [type(r) for r in results[:3]] == [RuntimeError] * 3
+    assert results[3] == "value"
+    assert calls == ["value"]
+
+
+def test_load_racing_invalidation_is_not_stored():
+    async def scenario():
+        cache = Cache(LocalLRUBackend())
+        calls = []
+
+        async def stale_load():
+            calls.append("stale")
+            # Запись и инвалидация случились, пока читались данные
+            await cache.invalidate("track:1")
+            return "stale"
+
+        first = await cache.get_or_load("track", {"id": 1}, stale_load, tags=["track:1"])
+        second = await cache.get_or_load("track", {"id": 1}, _loader("fresh", calls), tags=["track:1"])
+        third = await cache.get_or_load("track", {"id": 1}, _loader("unused", calls), tags=["track:1"])
+        return [first, second, third], calls, cache.backend.stats()["size"]
+
+    results, calls, size = asyncio.run(scenario())
+    # Устаревший результат отдан своему запросу, но не сохранён
+    assert results == ["stale", "fresh", "fresh"]
+    assert calls == ["stale", "fresh"]
+    assert size == 1
+
+
+def test_local_generations_are_bounded_and_never_resurrect_stale_entries():
+    async def scenario():
+        backend = LocalLRUBackend(max_size=100, max_generations=3)
+        cache = Cache(backend)
+        calls = []
+        await cache.get_or_load("track", {"id": 1}, _loader("old", calls), tags=["track:1"])
+        await cache.invalidate("track:1")
+        # Счётчик track:1 вытесняется другими тегами
+        for i in range(2, 10):
+            await cache.invalidate(f"track:{i}")
+        generations = backend.stats()["generations"]
+        value = await cache.get_or_load("track", {"id": 1}, _loader("new", calls), tags=["track:1"])
+        return generations, value, calls
+
+    generations, value, calls = asyncio.run(scenario())
+    assert generations == 3
+    assert value == "new"
+    assert calls == ["old", "new"]
+
+
+def test_local_entries_are_bounded():
+    async def scenario():
+        backend = LocalLRUBackend(max_size=2)
+        cache = Cache(backend)
+        calls = []
+        for key in ("a", "b", "a", "c", "a", "b"):
+            await cache.get_or_load("item", {"key": key}, _loader(key, calls))
+        return backend.stats()["size"], calls
+
+    size, calls = asyncio.run(scenario())
+    # b вытеснен как давно не читавшийся, a остался
+    assert size == 2
+    assert calls == ["a", "b", "c", "b"]
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import main
+from database import AsyncSessionLocal
+from models import User, Track, Assignment, Comment
+
+
+async def _setup():
+    async with AsyncSessionLocal() as db:
+        user = User(email="comments-reader@example.com", hashed_password="x")
+        track = Track(title="comments", description="d", quota=1, criteria="c")
+        assignment = Assignment(track=track, title="A", description="d", deadline_days=1, order=1)
+        db.add_all([user, track, assignment])
+        await db.commit()
+    return user, assignment.id
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_comments_are_paged_and_polled_by_id(client):
+    user, assignment_id = asyncio.run(_setup())
+    headers = {"Authorization": "Bearer " + auth.create_tokens(user)["access_token"]}
+    url = f"/assignments/{assignment_id}/comments"
+    posted = [client.post(url, headers=headers, json={"text": f"c{i}"}).json()["id"] for i in range(5)]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get(url, headers=headers, params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        seen += [c["id"] for c in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert (seen, pages) == (posted, 3)
+
+    # Опрос с последней позиции: новых нет, позиция та же
+    last = response.headers["X-Last-Cursor"]
+    response = client.get(url, headers=headers, params={"cursor": last})
+    assert response.json() == []
+    assert response.headers["X-Last-Cursor"] == last
+
+    # Комментарий с более ранним created_at, записанный уже после выдачи курсора, не теряется
+    async def late_comment():
+        async with AsyncSessionLocal() as db:
+            comment = Comment(assignment_id=assignment_id, user_id=user.id, text="late",
+                              created_at=datetime.utcnow() - timedelta(minutes=5))
+            db.add(comment)
+            await db.commit()
+        return comment.id
+
+    late = asyncio.run(late_comment())
+    new = client.post(url, headers=headers, json={"text": "new"}).json()["id"]
+    response = client.get(url, headers=headers, params={"cursor": last})
+    assert [c["id"] for c in response.json()] == [late, new]
+    assert client.get(url, headers=headers, params={"cursor": response.headers["X-Last-Cursor"]}).json() == []
@@ -0,0 +1,7 @@
+import query_budget
+
+
+def test_dashboard_query_count_does_not_grow_with_tracks(budget_scenario):
+    # budget_scenario — число запросов GET /me/dashboard при 1, 5 и 20 треках
+    assert set(budget_scenario) == set(query_budget.DASHBOARD_ENROLMENTS)
+    assert len(set(budget_scenario.values())) == 1, budget_scenario
@@ -0,0 +1,16 @@
+import pytest
+
+import explain_check
+
+
+@pytest.fixture(scope="module")
+def conn():
+    with explain_check.engine.connect() as connection:
+        explain_check.prepare(connection)
+        yield connection
+
+
+@pytest.mark.parametrize("name", list(explain_check.HOT_QUERIES))
+def test_hot_query_uses_index(conn, name):
+    plan = explain_check.explain(conn, explain_check.HOT_QUERIES[name])
+    assert not any(explain_check.is_full_scan(line) for line in plan), "\n".join(plan)
@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import auth
+import main
+import notifications
+from database import AsyncSessionLocal
+from models import User, Track, TrackParticipant, Assignment
+
+
+async def _start_track(user_id, title, deadline_in):
+    """Трек с одним заданием стартовал; дедлайн через deadline_in."""
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        track = Track(title=title, description="d", quota=1, criteria="c", started_at=now)
+        assignment = Assignment(track=track, title=title, description="d", deadline_days=1, order=1,
+                                deadline_at=now + deadline_in)
+        db.add_all([track, assignment, TrackParticipant(track=track, user_id=user_id)])
+        await db.flush()
+        await notifications.on_track_started(db, track)
+        await db.commit()
+        return assignment.id
+
+
+async def _user():
+    async with AsyncSessionLocal() as db:
+        user = User(email="notifications-since@example.com", hashed_password="x")
+        db.add(user)
+        await db.commit()
+        return user
+
+
+def test_since_cursor_returns_notifications_written_after_it():
+    user = asyncio.run(_user())
+    headers = {"Authorization": "Bearer " + auth.create_tokens(user)["access_token"]}
+    with TestClient(main.app) as client:
+        first = asyncio.run(_start_track(user.id, "notif-first", timedelta(days=2, hours=12)))
+        initial = client.get("/notifications", headers=headers).json()
+        assert [n["assignment_id"] for n in initial] == [first]
+        since = max(n["available_at"] for n in initial)
+
+        # Трек начался за день до дедлайна: предупреждение показывается с прошлого дня,
+        # но записано только сейчас — позже курсора клиента
+        second = asyncio.run(_start_track(user.id, "notif-second", timedelta(days=1)))
+        polled = client.get("/notifications", headers=headers, params={"since": since}).json()
+        assert [n["assignment_id"] for n in polled] == [second]
+        created_at, available_at = (datetime.fromisoformat(polled[0][f]) for f in ("created_at", "available_at"))
+        assert created_at < datetime.fromisoformat(since) < available_at
+
+        since = polled[0]["available_at"]
+        assert client.get("/notifications", headers=headers, params={"since": since}).json() == []
@@ -0,0 +1,48 @@
+import asyncio
+
+from sqlalchemy import update
+
+import participation
+from database import AsyncSessionLocal
+from models import Track, User
+
+
+def test_concurrent_joins_fill_quota_and_start_once():
+    # 1000 одновременных записей при квоте 50: ровно 50 участников и один старт
+    assert asyncio.run(participation.stress(1000, 50))
+
+
+def test_second_join_is_reported_as_already_joined():
+    async def attempt(track_id, user_id):
+        async with AsyncSessionLocal() as db:
+            try:
+                await participation.join(db, track_id, user_id)
+                await db.commit()
+                return "joined"
+            except participation.JoinError as e:
+                return e.detail
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            track = Track(title="rejoin", description="d", quota=2, criteria="c")
+            users = [User(email=f"rejoin-{i}@example.com", hashed_password="x") for i in range(3)]
+            db.add_all([track, *users])
+            await db.commit()
+        first, second, third = (user.id for user in users)
+        results = [await attempt(track.id, first), await attempt(track.id, first)]
+        # Место второго участника занято, но трек ещё не начался
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Track).filter(Track.id == track.id).values(participant_count=2))
+            await db.commit()
+        results += [await attempt(track.id, first), await attempt(track.id, third)]
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Track).filter(Track.id == track.id).values(participant_count=1))
+            await db.commit()
+        results += [await attempt(track.id, second), await attempt(track.id, first), await attempt(track.id, third)]
+        return results
+
+    assert asyncio.run(scenario()) == [
+        "joined", "Already joined",
+        "Already joined", "Track is full",
+        "joined", "Already joined", "Track already started",
+    ]
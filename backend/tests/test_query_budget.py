@@ -0,0 +1,14 @@
+import pytest
+
+import metrics
+import query_budget
+
+BUDGETS = query_budget.route_budgets()
+
+
+@pytest.mark.parametrize("method,route", sorted(BUDGETS), ids=lambda value: value)
+def test_route_within_query_budget(budget_scenario, method, route):
+    histogram = metrics.request_queries.get((method, route))
+    assert histogram is not None, "маршрут не вызывался в сценарии"
+    assert (method, route) not in metrics.budget_violations
+    assert histogram.max <= BUDGETS[method, route]
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import ratelimit
+from ratelimit import Limit, LocalBucketBackend
+
+OWNER = {"username": "ratelimit-owner@example.com", "password": "owner-password"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # Свои вёдра и маленькие лимиты; IP клиента — из X-Forwarded-For
+    monkeypatch.setattr(main.rate_limiter, "backend", LocalBucketBackend())
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_PROXY", True)
+    monkeypatch.setattr(ratelimit, "LOGIN_ACCOUNT_IP_LIMIT", Limit(3, 300))
+    monkeypatch.setattr(ratelimit, "LOGIN_ACCOUNT_LIMIT", Limit(6, 300))
+    with TestClient(main.app) as client:
+        client.post("/register", json={"email": OWNER["username"], "password": OWNER["password"]})
+        yield client
+
+
+def _login(client, ip, password="wrong-password"):
+    return client.post("/token", data={"username": OWNER["username"], "password": password},
+                       headers={"X-Forwarded-For": ip})
+
+
+def test_failures_from_other_ip_do_not_lock_owner_out(client):
+    assert [_login(client, "203.0.113.9").status_code for _ in range(4)] == [401, 401, 401, 429]
+    assert _login(client, "198.51.100.7", OWNER["password"]).status_code == 200
+    # Имя аккаунта сравнивается без учёта регистра: заглавные буквы не дают нового ведра
+    response = client.post("/token", data={"username": OWNER["username"].upper(), "password": "x"},
+                           headers={"X-Forwarded-For": "203.0.113.9"})
+    assert response.status_code == 429
+
+
+def test_account_ceiling_stops_distributed_guessing(client):
+    assert [_login(client, f"203.0.113.{i}").status_code for i in range(6)] == [401] * 6
+    response = _login(client, "203.0.113.100")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    # Общий потолок на email действует и на владельца
+    assert _login(client, "198.51.100.7", OWNER["password"]).status_code == 429
@@ -0,0 +1,191 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select
+
+import scheduler
+from database import AsyncSessionLocal, dispose_engines
+from models import ScheduledJob
+
+# Задачи тестов — в прошлом, задолго до задач основного сценария: они не пересекаются
+T0 = datetime(1990, 1, 1)
+
+
+class Clock:
+    def __init__(self, now=T0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+
+    async def drop():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(ScheduledJob).filter(ScheduledJob.due_at < datetime(2000, 1, 1)))
+            await db.commit()
+    asyncio.run(drop())
+
+
+async def _enqueue(kind, *target_ids, due_at=T0):
+    async with AsyncSessionLocal() as db:
+        await scheduler.enqueue(db, [{"kind": kind, "target_id": t, "due_at": due_at} for t in target_ids])
+        await db.commit()
+
+
+async def _jobs(kind):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(
+            ScheduledJob.target_id, ScheduledJob.due_at, ScheduledJob.attempts, ScheduledJob.locked_by
+        ).filter(ScheduledJob.kind == kind).order_by(ScheduledJob.target_id))).all()
+
+
+def _recorder(calls):
+    async def handler(db, target_id, now):
+        calls.append((target_id, now))
+        return []
+    return handler
+
+
+def test_due_job_fires_once_and_rerun_is_idempotent():
+    async def scenario():
+        calls = []
+        clock = Clock()
+        runner = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"once": _recorder(calls)})
+        await _enqueue("once", 1, due_at=T0 + timedelta(hours=1))
+        await _enqueue("once", 2, due_at=T0 + timedelta(hours=2))
+
+        assert await runner.run_due() == 0
+        clock.advance(hours=1)
+        assert await runner.run_due() == 1
+        assert await runner.run_due() == 0
+        # Повторная постановка той же задачи ничего не дублирует
+        await _enqueue("once", 2, due_at=T0 + timedelta(hours=2))
+        clock.advance(hours=1)
+        assert await runner.run_due() == 1
+        assert await runner.run_due() == 0
+        return calls, await _jobs("once")
+
+    calls, left = asyncio.run(scenario())
+    assert calls == [(1, T0 + timedelta(hours=1)), (2, T0 + timedelta(hours=2))]
+    assert left == []
+
+
+def test_concurrent_runners_run_each_job_once():
+    async def scenario():
+        calls = []
+        handlers = {"shared": _recorder(calls)}
+        runners = [scheduler.Scheduler(AsyncSessionLocal, clock=Clock(), handlers=handlers,
+                                       worker_id=name, batch_size=10) for name in "abc"]
+        await _enqueue("shared", *range(50))
+        done = await asyncio.gather(*(runner.run_due() for runner in runners))
+        return done, sorted(target_id for target_id, _ in calls), await _jobs("shared")
+
+    done, calls, left = asyncio.run(scenario())
+    assert sum(done) == 50
+    assert calls == list(range(50))
+    assert left == []
+
+
+def test_expired_lease_is_picked_up_by_another_runner():
+    async def scenario():
+        calls = []
+        release = asyncio.Event()
+        clock = Clock()
+
+        async def stuck(db, target_id, now):
+            calls.append("a")
+            await release.wait()
+            return []
+
+        a = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"lease": stuck},
+                                worker_id="a", lease_seconds=60)
+        b = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"lease": _recorder(calls)},
+                                worker_id="b", lease_seconds=60)
+        await _enqueue("lease", 1)
+
+        first = asyncio.create_task(a.run_due())
+        while not calls:
+            await asyncio.sleep(0.01)
+        # Пока аренда действует, задачу не берёт никто
+        assert await b.run_due() == 0
+        clock.advance(seconds=61)
+        assert await b.run_due() == 1
+        # Зависший воркер просыпается: задача уже не его, результат откатывается
+        release.set()
+        assert await first == 0
+        return calls, await _jobs("lease"), a.processed, b.processed
+
+    calls, left, a_done, b_done = asyncio.run(scenario())
+    assert calls == ["a", (1, T0 + timedelta(seconds=61))]
+    assert left == []
+    assert (a_done, b_done) == (0, 1)
+
+
+def test_failed_handler_is_retried_with_backoff():
+    async def scenario():
+        attempts = []
+        clock = Clock()
+
+        async def flaky(db, target_id, now):
+            attempts.append(now)
+            if len(attempts) < 3:
+                raise RuntimeError("boom")
+            return []
+
+        runner = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"flaky": flaky})
+        await _enqueue("flaky", 1)
+
+        assert await runner.run_due() == 0
+        after_first = await _jobs("flaky")
+        clock.advance(seconds=scheduler.RETRY_SECONDS - 1)
+        assert await runner.run_due() == 0
+        clock.advance(seconds=1)
+        assert await runner.run_due() == 0
+        after_second = await _jobs("flaky")
+        clock.advance(seconds=2 * scheduler.RETRY_SECONDS)
+        assert await runner.run_due() == 1
+        return attempts, after_first, after_second, runner.failed, await _jobs("flaky")
+
+    attempts, after_first, after_second, failed, left = asyncio.run(scenario())
+    retry = timedelta(seconds=scheduler.RETRY_SECONDS)
+    assert attempts == [T0, T0 + retry, T0 + 3 * retry]
+    # Пауза растёт с числом попыток, аренда снимается
+    assert after_first == [(1, T0 + retry, 1, None)]
+    assert after_second == [(1, T0 + 3 * retry, 2, None)]
+    assert failed == 2
+    assert left == []
+
+
+def test_state_survives_restart():
+    async def first_process():
+        async def boom(db, target_id, now):
+            raise RuntimeError("boom")
+
+        clock = Clock()
+        await _enqueue("restart", 1, 2)
+        await _enqueue("restart", 3, due_at=T0 + timedelta(days=1))
+        runner = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"restart": boom})
+        assert await runner.run_due() == 0
+        await dispose_engines()
+
+    async def second_process():
+        calls = []
+        clock = Clock(T0 + timedelta(days=1))
+        runner = scheduler.Scheduler(AsyncSessionLocal, clock=clock, handlers={"restart": _recorder(calls)})
+        done = await runner.run_due()
+        return done, sorted(target_id for target_id, _ in calls), await _jobs("restart")
+
+    asyncio.run(first_process())
+    done, calls, left = asyncio.run(second_process())
+    # Отложенные повторы и ещё не созревшая задача выполняются новым процессом
+    assert done == 3
+    assert calls == [1, 2, 3]
+    assert left == []
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import json
+
+from sqlalchemy import event, select
+
+import tracks_io
+from database import AsyncSessionLocal, get_async_engine
+from models import Track, Assignment
+
+
+def _track(title, quota=5, assignments=("a",)):
+    return json.dumps({
+        "title": title, "description": "d", "quota": quota, "criteria": "c",
+        "assignments": [{"title": a, "description": "x", "deadline_days": 7, "order": i}
+                        for i, a in enumerate(assignments)],
+    }).encode() + b"\n"
+
+
+async def _import(data, chunk_size):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement.split(None, 3)[2])
+
+    engine = get_async_engine().sync_engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        async with AsyncSessionLocal() as db:
+            report = await tracks_io.import_tracks(
+                db, tracks_io.read_records(io.BytesIO(data), "jsonl"), chunk_size=chunk_size)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    async with AsyncSessionLocal() as db:
+        tracks = (await db.scalars(select(Track).filter(Track.title.like("io-%")).order_by(Track.id))).all()
+        assignments = {}
+        for a in await db.scalars(select(Assignment).filter(Assignment.track_id.in_([t.id for t in tracks]))):
+            assignments.setdefault(a.track_id, []).append(a.title)
+    return report, statements, [(t.title, sorted(assignments.get(t.id, []))) for t in tracks]
+
+
+def test_mixed_file_reports_rows_and_inserts_chunk_in_one_statement():
+    data = b"".join([
+        _track("io-same", assignments=("one",)),
+        b"{not json\n",
+        _track("io-same", assignments=("two", "three")),
+        _track("io-bad-quota", quota=0),
+        b"\xff\xfe\n",
+        _track("io-empty", assignments=()),
+    ])
+    report, statements, stored = asyncio.run(_import(data, chunk_size=100))
+
+    assert (report["tracks"], report["assignments"], report["failed"]) == (3, 3, 3)
+    errors = {e["row"]: e["errors"] for e in report["errors"]}
+    assert sorted(errors) == [2, 4, 5]
+    assert errors[2][0].startswith("invalid JSON")
+    assert errors[4] == ["quota: Input should be greater than or equal to 1"]
+    assert errors[5][0].startswith("invalid UTF-8")
+
+    # Пачка — один INSERT треков и один INSERT заданий
+    assert statements.count("tracks") == 1
+    assert statements.count("assignments") == 1
+    # Одинаковые треки получили разные id, у каждого свои задания
+    assert sorted(stored) == [("io-empty", []), ("io-same", ["one"]), ("io-same", ["three", "two"])]
@@ -0,0 +1,316 @@
+"""Массовый импорт и экспорт треков.
+
+Импорт принимает JSONL (по треку на строку, в формате TrackCreate) или CSV
+(по заданию на строку; подряд идущие строки с одним track_ref — один трек).
+Записи проверяются пачками по IMPORT_CHUNK_SIZE, валидные вставляются
+двумя запросами (треки — одним многострочным INSERT, затем задания),
+каждая пачка — в своей транзакции. Ошибки возвращаются по номерам строк,
+остальные треки импортируются.
+
+Экспорт — NDJSON: строки с type = track (вместе с заданиями, в формате
+импорта), submission и review. Строки track можно загрузить обратно импортом.
+HTTP отдаёт только треки; решения и ревью выгружает лишь командная строка.
+
+    python tracks_io.py import catalogue.jsonl
+    python tracks_io.py import catalogue.csv
+    python tracks_io.py export > dump.ndjson
+    python tracks_io.py bench 10000 20
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Track, Assignment, Submission, Review
+from schemas import TrackCreate
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "500"))
+# В отчёте хранится не больше стольких ошибок, остальные только считаются
+IMPORT_MAX_ERRORS = 1000
+EXPORT_BATCH = 500
+
+CSV_TRACK_FIELDS = ["title", "description", "quota", "criteria"]
+CSV_COLUMNS = ["track_ref"] + CSV_TRACK_FIELDS + ["assignment_title", "assignment_description", "deadline_days", "order"]
+
+
+def read_jsonl(lines):
+    """[(номер строки, dict | ошибка)] из строк JSONL; пустые строки и не-треки пропускаются.
+
+    Строки — bytes или str; bytes декодируются по одной, так что строка
+    не в UTF-8 становится ошибкой этой строки.
+    """
+    for row, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as e:
+                yield row, f"invalid UTF-8: {e.reason} at byte {e.start}"
+                continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield row, f"invalid JSON: {e}"
+            continue
+        if not isinstance(record, dict):
+            yield row, "expected a JSON object"
+        elif record.get("type", "track") == "track":
+            yield row, record
+
+
+def _decoded_lines(binary_file):
+    # По строке, а не блоками TextIOWrapper: ошибка декодирования всплывает на своей строке
+    for line in binary_file:
+        yield line.decode("utf-8")
+
+
+def read_csv(text_file):
+    """Собирает треки из CSV; номер строки — первая строка трека.
+
+    После ошибки декодирования или разбора CSV дальше файл не читается:
+    граница следующей записи неизвестна. Ошибка приписывается треку, который
+    собирался в этот момент, иначе — строке, где она случилась.
+    """
+    reader = csv.DictReader(text_file)
+    record, ref, record_row = None, None, None
+    previous_line = 0
+    try:
+        missing = set(CSV_COLUMNS) - set(reader.fieldnames or ())
+        if missing:
+            yield 1, f"missing columns: {', '.join(sorted(missing))}"
+            return
+
+        # line_num указывает на последнюю физическую строку записи, а поля могут быть многострочными
+        previous_line = reader.line_num
+        for values in reader:
+            if record is None or values["track_ref"] != ref:
+                if record is not None:
+                    yield record_row, record
+                ref, record_row = values["track_ref"], previous_line + 1
+                record = {field: values[field] for field in CSV_TRACK_FIELDS}
+                record["assignments"] = []
+            # Трек без заданий — строка с пустым assignment_title
+            if values["assignment_title"]:
+                record["assignments"].append({
+                    "title": values["assignment_title"],
+                    "description": values["assignment_description"],
+                    "deadline_days": values["deadline_days"],
+                    "order": values["order"],
+                })
+            previous_line = reader.line_num
+    except UnicodeDecodeError as e:
+        error = f"invalid UTF-8 after line {previous_line}: {e.reason}; the rest of the file is skipped"
+    except csv.Error as e:
+        error = f"invalid CSV after line {previous_line}: {e}; the rest of the file is skipped"
+    else:
+        if record is not None:
+            yield record_row, record
+        return
+    yield (record_row if record is not None else previous_line + 1), error
+
+
+def read_records(binary_file, fmt: str):
+    if fmt == "csv":
+        return read_csv(_decoded_lines(binary_file))
+    return read_jsonl(binary_file)
+
+
+def _format_errors(error: ValidationError) -> list:
+    return [f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()]
+
+
+class ImportReport:
+    def __init__(self):
+        self.tracks = 0
+        self.assignments = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row: int, errors: list):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "errors": errors})
+
+    def to_dict(self) -> dict:
+        return {"tracks": self.tracks, "assignments": self.assignments, "failed": self.failed,
+                "errors": self.errors}
+
+
+async def _insert_chunk(db: AsyncSession, tracks: list) -> int:
+    """Вставляет пачку проверенных треков; возвращает число заданий.
+
+    Треки вставляются одним многострочным INSERT: RETURNING без порядка
+    параметров, поэтому id сопоставляются с треками по содержимому. Треки
+    с одинаковым содержимым взаимозаменяемы, им достаются id по очереди.
+    """
+    rows = [{"title": t.title, "description": t.description, "quota": t.quota, "criteria": t.criteria}
+            for _, t in tracks]
+    ids = {}
+    for track_id, *content in await db.execute(insert(Track).returning(
+        Track.id, Track.title, Track.description, Track.quota, Track.criteria
+    ), rows):
+        ids.setdefault(tuple(content), []).append(track_id)
+    assignments = []
+    for row, (_, t) in zip(rows, tracks):
+        track_id = ids[tuple(row.values())].pop()
+        assignments.extend(
+            {"track_id": track_id, "title": a.title, "description": a.description,
+             "deadline_days": a.deadline_days, "order": a.order}
+            for a in t.assignments
+        )
+    if assignments:
+        await db.execute(insert(Assignment), assignments)
+    await db.commit()
+    return len(assignments)
+
+
+async def import_tracks(db: AsyncSession, records, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """records — итератор [(номер строки, dict | текст ошибки)]."""
+    report = ImportReport()
+    chunk = []
+
+    async def flush():
+        try:
+            report.assignments += await _insert_chunk(db, chunk)
+            report.tracks += len(chunk)
+        except Exception as e:
+            await db.rollback()
+            for row, _ in chunk:
+                report.error(row, [f"database error: {e.__class__.__name__}"])
+        chunk.clear()
+
+    for row, record in records:
+        if isinstance(record, str):
+            report.error(row, [record])
+            continue
+        try:
+            chunk.append((row, TrackCreate.model_validate(record)))
+        except ValidationError as e:
+            report.error(row, _format_errors(e))
+            continue
+        if len(chunk) >= chunk_size:
+            await flush()
+    if chunk:
+        await flush()
+    return report.to_dict()
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _line(record: dict) -> str:
+    return json.dumps(record, default=_json_default) + "\n"
+
+
+async def export_lines(db: AsyncSession, activity: bool = True):
+    """NDJSON-строки выгрузки; в памяти одновременно не больше EXPORT_BATCH строк таблицы.
+
+    activity=False — только треки с заданиями, без решений и ревью.
+
+    Identity map сессии держит объекты по слабым ссылкам, поэтому отданные
+    пачки освобождаются сами.
+    """
+    tracks = await db.stream_scalars(select(Track).order_by(Track.id).execution_options(yield_per=EXPORT_BATCH))
+    async for batch in tracks.partitions():
+        assignments = {}
+        for assn in await db.scalars(select(Assignment).filter(
+            Assignment.track_id.in_([t.id for t in batch])
+        ).order_by(Assignment.track_id, Assignment.order, Assignment.id)):
+            assignments.setdefault(assn.track_id, []).append({
+                "id": assn.id, "title": assn.title, "description": assn.description,
+                "deadline_days": assn.deadline_days, "order": assn.order,
+            })
+        yield "".join(_line({
+            "type": "track", "id": t.id, "title": t.title, "description": t.description, "quota": t.quota,
+            "criteria": t.criteria, "created_at": t.created_at, "started_at": t.started_at,
+            "assignments": assignments.get(t.id, []),
+        }) for t in batch)
+    if not activity:
+        return
+
+    submissions = await db.stream_scalars(select(Submission).order_by(Submission.id).execution_options(yield_per=EXPORT_BATCH))
+    async for batch in submissions.partitions():
+        yield "".join(_line({
+            "type": "submission", "id": s.id, "assignment_id": s.assignment_id, "user_id": s.user_id,
+            "repository_url": s.repository_url, "submitted_at": s.submitted_at,
+        }) for s in batch)
+
+    reviews = await db.stream_scalars(select(Review).order_by(Review.id).execution_options(yield_per=EXPORT_BATCH))
+    async for batch in reviews.partitions():
+        yield "".join(_line({
+            "type": "review", "id": r.id, "submission_id": r.submission_id, "reviewer_id": r.reviewer_id,
+            "score": r.score, "comment": r.comment, "created_at": r.created_at,
+        }) for r in batch)
+
+
+async def bench(n_tracks: int, n_assignments: int):
+    """Импорт и экспорт n_tracks треков во временной in-memory базе."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from database import Base
+
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    data = io.BytesIO("".join(json.dumps({
+        "title": f"Track {i}", "description": "d", "quota": 10, "criteria": "c",
+        "assignments": [
+            {"title": f"Task {j}", "description": "d", "deadline_days": 7, "order": j}
+            for j in range(1, n_assignments + 1)
+        ],
+    }) + "\n" for i in range(n_tracks)).encode("utf-8"))
+
+    async with session_factory() as db:
+        started = time.perf_counter()
+        report = await import_tracks(db, read_records(data, "jsonl"))
+        imported = time.perf_counter() - started
+
+        started = time.perf_counter()
+        size = 0
+        async for chunk in export_lines(db):
+            size += len(chunk)
+        exported = time.perf_counter() - started
+    await engine.dispose()
+
+    print(f"import: {report['tracks']} tracks, {report['assignments']} assignments, "
+          f"{report['failed']} failed in {imported:.2f} s ({report['tracks'] / imported:.0f} tracks/s)")
+    print(f"export: {size / 1e6:.1f} MB in {exported:.2f} s")
+
+
+async def _main(args):
+    from database import AsyncSessionLocal, dispose_engines
+    try:
+        async with AsyncSessionLocal() as db:
+            if args[0] == "import":
+                fmt = "csv" if args[1].endswith(".csv") else "jsonl"
+                with open(args[1], "rb") as f:
+                    print(json.dumps(await import_tracks(db, read_records(f, fmt)), indent=2))
+            else:
+                async for chunk in export_lines(db):
+                    sys.stdout.write(chunk)
+    finally:
+        await dispose_engines()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args[:1] == ["import"] and len(args) == 2 or args == ["export"]:
+        asyncio.run(_main(args))
+    elif args[:1] == ["bench"]:
+        asyncio.run(bench(int(args[1]) if len(args) > 1 else 10000, int(args[2]) if len(args) > 2 else 20))
+    else:
+        sys.exit("usage: python tracks_io.py import FILE.jsonl|FILE.csv | export | bench [TRACKS] [ASSIGNMENTS]")
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react'
 import { BrowserRouter, Routes, Route, Navigate } from 'react-router-dom'
+import { logout } from './api'
 import Login from './components/Login'
 import TrackList from './components/TrackList'
 import TrackDetail from './components/TrackDetail'
@@ -12,11 +13,22 @@ function App() {
     if (token) setUser({ token })
   }, [])
 
+  const handleLogout = async () => {
+    try {
+      await logout()
+    } catch (err) {
+      console.error(err)
+    }
+    localStorage.removeItem('token')
+    localStorage.removeItem('refresh_token')
+    setUser(null)
+  }
+
   return (
     <BrowserRouter>
       <Routes>
         <Route path="/login" element={!user ? <Login setUser={setUser} /> : <Navigate to="/tracks" />} />
-        <Route path="/tracks" element={user ? <TrackList /> : <Navigate to="/login" />} />
+        <Route path="/tracks" element={user ? <TrackList onLogout={handleLogout} /> : <Navigate to="/login" />} />
         <Route path="/tracks/:id" element={user ? <TrackDetail /> : <Navigate to="/login" />} />
         <Route path="/" element={<Navigate to={user ? "/tracks" : "/login"} />} />
       </Routes>
@@ -14,13 +14,40 @@ api.interceptors.request.use((config) => {
   return config
 })
 
+const refreshTokens = async () => {
+  const res = await axios.post(`${API_URL}/token/refresh`, {
+    refresh_token: localStorage.getItem('refresh_token'),
+  })
+  localStorage.setItem('token', res.data.access_token)
+  localStorage.setItem('refresh_token', res.data.refresh_token)
+  return res.data.access_token
+}
+
+// Access-токен короткоживущий: на 401 один раз обновляем пару токенов и повторяем запрос
+let refreshing = null
+api.interceptors.response.use((response) => response, async (error) => {
+  const original = error.config
+  if (error.response?.status === 401 && !original._retry && original.url !== '/token'
+      && localStorage.getItem('refresh_token')) {
+    original._retry = true
+    refreshing = refreshing || refreshTokens().finally(() => { refreshing = null })
+    try {
+      await refreshing
+    } catch {
+      return Promise.reject(error)
+    }
+    return api(original)
+  }
+  return Promise.reject(error)
+})
+
 export const register = (email, password) =>
   api.post('/register', { email, password })
 
 export const login = (email, password) =>
   api.post('/token', new URLSearchParams({ username: email, password }))
 
-export const getTracks = () => api.get('/tracks')
+export const getTracks = (cursor) => api.get('/tracks', { params: cursor ? { cursor } : {} })
 
 export const createTrack = (track) => api.post('/tracks', track)
 
@@ -39,10 +66,43 @@ export const getReviewAssignment = (assignmentId) =>
 export const submitReview = (submissionId, score, comment) =>
   api.post(`/submissions/${submissionId}/review`, { score, comment })
 
-export const getComments = (assignmentId) => api.get(`/assignments/${assignmentId}/comments`)
+export const getComments = (assignmentId, cursor) =>
+  api.get(`/assignments/${assignmentId}/comments`, { params: cursor ? { cursor } : {} })
 
 export const createComment = (assignmentId, text) =>
   api.post(`/assignments/${assignmentId}/comments`, { text })
 
 export const getNotifications = () => api.get('/notifications')
 
+export const getDashboard = () => api.get('/me/dashboard')
+
+
+export const logout = () =>
+  api.post('/logout', { refresh_token: localStorage.getItem('refresh_token') })
+
+// EventSource не передаёт заголовки, поэтому токен уходит в query.
+// Если сервер закрыл поток (например, истёк токен), обновляем токен и переподключаемся.
+export const streamNotifications = (listeners) => {
+  let source = null
+  let closed = false
+  const open = () => {
+    source = new EventSource(`${API_URL}/notifications/stream?token=${encodeURIComponent(localStorage.getItem('token'))}`)
+    Object.entries(listeners).forEach(([type, listener]) => source.addEventListener(type, listener))
+    source.onerror = async () => {
+      if (closed || source.readyState !== EventSource.CLOSED) return
+      try {
+        await refreshTokens()
+        open()
+      } catch (err) {
+        console.error(err)
+      }
+    }
+  }
+  open()
+  return {
+    close: () => {
+      closed = true
+      source.close()
+    },
+  }
+}
@@ -15,6 +15,7 @@ export default function Login({ setUser }) {
       }
       const res = await login(email, password)
       localStorage.setItem('token', res.data.access_token)
+      localStorage.setItem('refresh_token', res.data.refresh_token)
       setUser({ token: res.data.access_token })
     } catch (err) {
       setError(err.response?.data?.detail || 'Error')
@@ -1,6 +1,6 @@
-import { useState, useEffect } from 'react'
+import { useState, useEffect, useRef } from 'react'
 import { useParams } from 'react-router-dom'
-import { getAssignments, submitAssignment, getReviewAssignment, submitReview, getComments, createComment, getNotifications } from '../api'
+import { getDashboard, submitAssignment, getReviewAssignment, submitReview, getComments, createComment, streamNotifications } from '../api'
 
 export default function TrackDetail() {
   const { id } = useParams()
@@ -13,42 +13,86 @@ export default function TrackDetail() {
   const [comments, setComments] = useState([])
   const [newComment, setNewComment] = useState('')
   const [notifications, setNotifications] = useState([])
+  const selectedRef = useRef(null)
+  // Позиция последнего загруженного комментария: дальше запрашиваются только новые
+  const commentsCursorRef = useRef(null)
 
   useEffect(() => {
-    loadAssignments()
-    loadNotifications()
-    const interval = setInterval(loadNotifications, 60000) // каждую минуту
-    return () => clearInterval(interval)
+    loadDashboard()
+    // Сервер присылает события, опрос остаётся только как редкий fallback
+    const interval = setInterval(loadDashboard, 600000) // каждые 10 минут
+    const reload = loadDashboard
+    const source = streamNotifications({
+      track_started: reload,
+      submission: reload,
+      review: reload,
+      deadline_warning: reload,
+      review_started: reload,
+      comment: (e) => {
+        const assignmentId = JSON.parse(e.data).assignment_id
+        if (selectedRef.current?.id === assignmentId) {
+          loadNewComments(assignmentId)
+        }
+      },
+    })
+    return () => {
+      clearInterval(interval)
+      source.close()
+    }
   }, [id])
 
   useEffect(() => {
+    selectedRef.current = selectedAssignment
     if (selectedAssignment) {
       loadComments(selectedAssignment.id)
     }
   }, [selectedAssignment])
 
-  const loadAssignments = async () => {
+  // Задания трека и уведомления приходят одним запросом GET /me/dashboard
+  const loadDashboard = async () => {
     try {
-      const res = await getAssignments(id)
-      setAssignments(res.data)
+      const res = await getDashboard()
+      const track = res.data.tracks.find(t => t.id === Number(id))
+      setAssignments(track ? track.assignments : [])
+      setNotifications(res.data.notifications)
     } catch (err) {
       console.error(err)
     }
   }
 
+  // Читает страницы начиная с cursor, пока сервер отдаёт X-Next-Cursor
+  const fetchComments = async (assignmentId, cursor) => {
+    let items = []
+    let res
+    do {
+      res = await getComments(assignmentId, cursor)
+      items = items.concat(res.data)
+      cursor = res.headers['x-next-cursor']
+    } while (cursor)
+    return { items, lastCursor: res.headers['x-last-cursor'] || null }
+  }
+
   const loadComments = async (assignmentId) => {
     try {
-      const res = await getComments(assignmentId)
-      setComments(res.data)
+      const { items, lastCursor } = await fetchComments(assignmentId, null)
+      commentsCursorRef.current = lastCursor
+      setComments(items)
     } catch (err) {
       console.error(err)
     }
   }
 
-  const loadNotifications = async () => {
+  const loadNewComments = async (assignmentId) => {
     try {
-      const res = await getNotifications()
-      setNotifications(res.data)
+      const { items, lastCursor } = await fetchComments(assignmentId, commentsCursorRef.current)
+      commentsCursorRef.current = lastCursor || commentsCursorRef.current
+      if (items.length > 0) {
+        // Событие SSE и собственная отправка могут запросить одну и ту же дельту
+        setComments(prev => {
+          const seen = new Set(prev.map(c => c.id))
+          return prev.concat(items.filter(c => !seen.has(c.id)))
+        })
+      }
     } catch (err) {
       console.error(err)
     }
@@ -59,7 +103,7 @@ export default function TrackDetail() {
       await submitAssignment(selectedAssignment.id, repositoryUrl)
       alert('Submitted!')
       setRepositoryUrl('')
-      loadAssignments()
+      loadDashboard()
     } catch (err) {
       alert(err.response?.data?.detail || 'Error')
     }
@@ -81,7 +125,7 @@ export default function TrackDetail() {
       setReviewData(null)
       setScore('')
       setReviewComment('')
-      loadAssignments()
+      loadDashboard()
     } catch (err) {
       alert(err.response?.data?.detail || 'Error')
     }
@@ -91,7 +135,7 @@ export default function TrackDetail() {
     try {
       await createComment(selectedAssignment.id, newComment)
       setNewComment('')
-      loadComments(selectedAssignment.id)
+      loadNewComments(selectedAssignment.id)
     } catch (err) {
       alert(err.response?.data?.detail || 'Error')
     }
@@ -2,8 +2,9 @@ import { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
 import { getTracks, joinTrack, leaveTrack } from '../api'
 
-export default function TrackList() {
+export default function TrackList({ onLogout }) {
   const [tracks, setTracks] = useState([])
+  const [nextCursor, setNextCursor] = useState(null)
   const navigate = useNavigate()
 
   useEffect(() => {
@@ -14,6 +15,17 @@ export default function TrackList() {
     try {
       const res = await getTracks()
       setTracks(res.data)
+      setNextCursor(res.headers['x-next-cursor'] || null)
+    } catch (err) {
+      console.error(err)
+    }
+  }
+
+  const loadMore = async () => {
+    try {
+      const res = await getTracks(nextCursor)
+      setTracks([...tracks, ...res.data])
+      setNextCursor(res.headers['x-next-cursor'] || null)
     } catch (err) {
       console.error(err)
     }
@@ -39,7 +51,10 @@ export default function TrackList() {
 
   return (
     <div className="container">
-      <h1>Tracks</h1>
+      <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
+        <h1>Tracks</h1>
+        <button onClick={onLogout}>Logout</button>
+      </div>
       {tracks.map(track => (
         <div key={track.id} style={{ background: 'white', padding: '20px', margin: '10px 0', borderRadius: '5px' }}>
           <h2>{track.title}</h2>
@@ -58,6 +73,7 @@ export default function TrackList() {
           </div>
         </div>
       ))}
+      {nextCursor && <button onClick={loadMore}>Load more</button>}
     </div>
   )
 }